@@ -0,0 +1,178 @@
+# admission.py
+"""
+Admission control: an adaptive in-flight limit with a short FIFO queue.
+
+The limit follows how long callers wait for a pooled DB connection (AIMD:
++1 per interval while the wait stays under target, cut in proportion to the
+overshoot when it doesn't). Requests come in three priorities:
+
+  critical – never shed, not counted
+  normal   – up to the limit; over it, waits up to `queue_timeout_s` in a
+             bounded FIFO queue for a slot to free up, then 503
+  low      – only up to `low_share` of the limit and only while the
+             reporting pool is not backed up; never queued
+
+main.py owns the configuration and metrics and hands them in. The queue is
+driven from the event loop: admit() and release() must run on it.
+"""
+import asyncio
+import collections
+import threading
+import time
+
+from starlette.responses import JSONResponse
+
+
+class AdmissionController:
+    def __init__(self, max_limit: int, min_limit: int, target_wait_s: float, pool_wait,
+                 low_share: float = 0.5, low_max_wait_s: float = 1.0, adjust_s: float = 0.5, max_queue: int = 0):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.target_wait_s = target_wait_s
+        self.pool_wait = pool_wait      # lane -> recent seconds spent waiting for a connection
+        self.low_share = low_share
+        self.low_max_wait_s = low_max_wait_s
+        self.adjust_s = adjust_s
+        self.max_queue = max_queue
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self._waiters = collections.deque()     # futures of queued normal requests, oldest first
+        self._next_adjust = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def queued(self):
+        return sum(1 for w in self._waiters if not w.done())
+
+    def _adjust(self, now):
+        if now < self._next_adjust:
+            return
+        self._next_adjust = now + self.adjust_s
+        wait = self.pool_wait("interactive")
+        if wait > self.target_wait_s:
+            # 2x the target wait halves the limit; a small overshoot trims 10%
+            self.limit = max(self.min_limit, self.limit * max(0.5, min(0.9, self.target_wait_s / wait)))
+        else:
+            self.limit = min(self.max_limit, self.limit + 1)
+
+    def try_admit(self, priority: str):
+        with self._lock:
+            self._adjust(time.monotonic())
+            if priority == "low":
+                admitted = (self.in_flight < self.limit * self.low_share
+                            and self.pool_wait("reporting") < self.low_max_wait_s)
+            else:
+                # No overtaking the queue
+                admitted = self.in_flight < self.limit and not self.queued
+            if admitted:
+                self.in_flight += 1
+            return admitted
+
+    async def admit(self, priority: str, timeout: float = 0.0):
+        """try_admit(), but a normal request may queue up to `timeout` s for a slot."""
+        if self.try_admit(priority):
+            return True
+        if priority == "low" or timeout <= 0 or self.queued >= self.max_queue:
+            return False
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            return await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            return False
+        except asyncio.CancelledError:
+            # Caller went away; a slot handed over meanwhile is freed again
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            try:
+                self._waiters.remove(waiter)
+            except ValueError:
+                pass
+
+    def release(self):
+        """Free a slot, or hand it straight to the oldest waiter while under the limit."""
+        with self._lock:
+            while self._waiters and self.in_flight - 1 < self.limit:
+                waiter = self._waiters.popleft()
+                if not waiter.done():
+                    waiter.set_result(True)     # the slot changes hands; in_flight stays
+                    return
+            self.in_flight -= 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "limit": round(self.limit, 1),
+                "in_flight": self.in_flight,
+                "queued": self.queued,
+                "interactive_wait_s": round(self.pool_wait("interactive"), 4),
+                "reporting_wait_s": round(self.pool_wait("reporting"), 4),
+            }
+
+
+class AdmissionMiddleware:
+    """Fast 503s for normal / low priority work once the adaptive limit is reached.
+
+    critical: {(method, path)} never shed; low_prefixes: path prefixes of
+    low-priority work. `shed` counts 503s by priority and reason ("limit":
+    refused outright, "timeout": queued and no slot freed up in time).
+    """
+
+    def __init__(self, app, controller, critical, low_prefixes, shed,
+                 queue_timeout_s: float = 0.0, retry_after_s: int = 5, enabled: bool = True):
+        self.app = app
+        self.controller = controller
+        self.critical = critical
+        self.low_prefixes = tuple(low_prefixes)
+        self.shed = shed
+        self.queue_timeout_s = queue_timeout_s
+        self.retry_after_s = retry_after_s
+        self.enabled = enabled
+
+    def priority(self, method: str, path: str):
+        if (method, path) in self.critical:
+            return "critical"
+        if path.startswith(self.low_prefixes):
+            return "low"
+        return "normal"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled:
+            await self.app(scope, receive, send)
+            return
+        priority = self.priority(scope.get("method", "GET"), scope.get("path", ""))
+        if priority == "critical":
+            await self.app(scope, receive, send)
+            return
+        started = time.monotonic()
+        if not await self.controller.admit(priority, self.queue_timeout_s):
+            timed_out = time.monotonic() - started >= self.queue_timeout_s > 0
+            self.shed.inc(priority=priority, reason="timeout" if timed_out else "limit")
+            response = JSONResponse(
+                {"detail": "Server busy. Please retry shortly."}, status_code=503,
+                headers={"Retry-After": str(self.retry_after_s)},
+            )
+            await response(scope, receive, send)
+            return
+
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                self.controller.release()
+
+        async def send_wrapper(message):
+            await send(message)
+            # Background tasks (emails, Sheets) run after the last chunk; they
+            # are not the caller's latency and must not hold a slot
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                release()
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            release()
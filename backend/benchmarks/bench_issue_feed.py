@@ -0,0 +1,155 @@
+# bench_issue_feed.py
+"""
+Student issue feed: the old single OR-filter query against main.feed_statement().
+
+  * legacy   – `sub_location = hostel OR category IN (...) OR owner_id = me`
+               ordered by a CASE on priority (what GET /issues used to run)
+  * branched – main.feed_statement(): disjoint UNION ALL branches, each an
+               ordered scan of an ix_issues_feed* index, merged without a sort
+
+Both are timed for the full feed and for a first page (?limit=), and the
+EXPLAIN (ANALYZE, BUFFERS) of each is printed, plus the plan of the
+escalation UPDATE (run inside a rolled-back transaction).
+
+--seed N inserts N synthetic issues (title prefix "[bench-feed]") first;
+--cleanup deletes them afterwards. Run against a scratch database:
+
+    DATABASE_URL=postgresql://localhost:5433/campusfix DB_SSLMODE=disable \\
+        python benchmarks/bench_issue_feed.py --seed 200000 --cleanup
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault("MAIL_PASSWORD", "unused")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import case, or_, select, text  # noqa: E402
+
+import main  # noqa: E402
+from main import Issue  # noqa: E402
+
+TITLE_PREFIX = "[bench-feed]"
+
+SEED_SQL = """
+INSERT INTO issues (title, description, category, sub_location, specific_location,
+                    priority, status, created_at, owner_id, comment_count)
+SELECT :prefix || ' ' || g,
+       repeat(md5(g::text), 4),
+       (ARRAY['Electrical','Plumbing','Mess','Academic','Internet','Cleanliness','Furniture',
+              'Security','Sports','Transport','Library','Medical'])[1 + abs(hashint4(g)) % 12],
+       'Hostel ' || (1 + abs(hashint4(g + 1000000000)) % :hostels),
+       'Room ' || (g % 400),
+       (ARRAY['High','Medium','Low'])[1 + abs(hashint4(-g)) % 3],
+       (ARRAY['Pending','In Progress','Solved','Defected','Duplicate'])[1 + abs(hashint4(g - 1000000000)) % 5],
+       now() - make_interval(mins => abs(hashint4(g + 2000000)) % 1051200),
+       u.ids[1 + abs(hashint4(g + 3000000)) % cardinality(u.ids)],
+       0
+FROM generate_series(1, :n) AS g,
+     (SELECT array_agg(id ORDER BY id) AS ids FROM users) AS u
+"""
+
+
+def legacy_statement(user, limit=None):
+    stmt = select(*main.FEED_COLUMNS).order_by(
+        case((Issue.priority == "High", 1), (Issue.priority == "Medium", 2), else_=3),
+        Issue.created_at.desc(),
+    )
+    if user.role == "student":
+        stmt = stmt.where(or_(
+            Issue.sub_location == user.hostel,
+            Issue.category.in_(["Mess", "Academic"]),
+            Issue.owner_id == user.id,
+        ))
+    return stmt.limit(limit) if limit else stmt
+
+
+def compiled(stmt):
+    return str(stmt.compile(dialect=main.engine.dialect, compile_kwargs={"literal_binds": True}))
+
+
+def explain(conn, sql):
+    rows = conn.execute(text("EXPLAIN (ANALYZE, BUFFERS, COSTS OFF) " + sql)).scalars().all()
+    return "\n".join(rows)
+
+
+def timed(conn, sql, repeat):
+    samples, rows = [], 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows = len(conn.execute(text(sql)).all())
+        samples.append(time.perf_counter() - started)
+    return {"rows": rows, "median_ms": round(statistics.median(samples) * 1000, 2),
+            "min_ms": round(min(samples) * 1000, 2)}
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", type=int, default=0, help="synthetic issues to insert first")
+    parser.add_argument("--hostels", type=int, default=12)
+    parser.add_argument("--hostel", default="Hostel 3", help="hostel of the simulated student")
+    parser.add_argument("--limit", type=int, default=50, help="page size for the paged runs")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--cleanup", action="store_true", help="delete the seeded issues at the end")
+    parser.add_argument("--no-explain", action="store_true")
+    args = parser.parse_args()
+
+    main.apply_schema_patches()     # priority_rank + feed indexes
+    engine = main.DB_LANES["background"]
+    with engine.connect() as conn:
+        if args.seed:
+            started = time.perf_counter()
+            conn.execute(text(SEED_SQL), {"prefix": TITLE_PREFIX, "n": args.seed, "hostels": args.hostels})
+            print(f"seeded {args.seed} issues in {time.perf_counter() - started:.1f}s", flush=True)
+        conn.execute(text("ANALYZE issues"))
+        total = conn.execute(text("SELECT count(*) FROM issues")).scalar()
+        owner_id = conn.execute(text("SELECT id FROM users ORDER BY id LIMIT 1")).scalar()
+        student = main.User(id=owner_id, role="student", hostel=args.hostel)
+        admin = main.User(id=owner_id, role="admin", hostel=None)
+
+        cases = {
+            "student_full": (legacy_statement(student), main.feed_statement(student)),
+            "student_page": (legacy_statement(student, args.limit), main.feed_statement(student, args.limit)),
+            "admin_page": (legacy_statement(admin, args.limit), main.feed_statement(admin, args.limit)),
+        }
+        # Second page: continue after the last row of the first
+        first_page = conn.execute(main.feed_statement(student, args.limit)).all()
+        if first_page:
+            after = main.decode_feed_cursor(main.encode_feed_cursor(first_page[-1]))
+            cases["student_page2"] = (
+                legacy_statement(student, args.limit).offset(args.limit),
+                main.feed_statement(student, args.limit, after),
+            )
+
+        results = {"issues": total}
+        for name, (legacy, branched) in cases.items():
+            legacy_sql, branched_sql = compiled(legacy), compiled(branched)
+            results[name] = {"legacy": timed(conn, legacy_sql, args.repeat),
+                             "branched": timed(conn, branched_sql, args.repeat)}
+            print(json.dumps({name: results[name]}), flush=True)
+            if not args.no_explain:
+                print(f"\n--- {name} / legacy ---\n{explain(conn, legacy_sql)}")
+                print(f"\n--- {name} / branched ---\n{explain(conn, branched_sql)}\n", flush=True)
+
+        if not args.no_explain:
+            escalation = (
+                "UPDATE issues SET priority = 'High' WHERE priority <> 'High' "
+                "AND created_at < now() - interval '3 days' AND status IN ('Pending', 'In Progress')"
+            )
+            # The lanes are AUTOCOMMIT (and this one holds a single connection):
+            # borrow an interactive one in a real transaction so it can be undone
+            with main.engine.connect().execution_options(isolation_level="READ COMMITTED") as tx_conn:
+                trans = tx_conn.begin()
+                print(f"\n--- escalation UPDATE ---\n{explain(tx_conn, escalation)}\n")
+                trans.rollback()
+
+        if args.cleanup:
+            conn.execute(text("DELETE FROM issues WHERE title LIKE :p"), {"p": TITLE_PREFIX + "%"})
+            print("seeded issues removed")
+
+
+if __name__ == "__main__":
+    main_()
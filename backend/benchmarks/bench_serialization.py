@@ -0,0 +1,118 @@
+# bench_serialization.py
+"""
+Microbenchmark: serialising a 1,000-issue feed.
+
+Compares the old path (jsonable_encoder + json.dumps, what the default
+JSONResponse does) against orjson, and reports wire size raw / gzip / brotli.
+Runs standalone — no database or app import needed.
+
+    python benchmarks/bench_serialization.py --issues 1000 --repeat 20
+"""
+import argparse
+import gzip
+import json
+import random
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+
+IST = timezone(timedelta(hours=5, minutes=30))
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    from fastapi.encoders import jsonable_encoder
+except ImportError:
+    jsonable_encoder = None
+
+CATEGORIES = ["Electrical", "Plumbing", "Mess", "Academic", "Internet", "Cleanliness"]
+HOSTELS = [f"Hostel {n}" for n in range(1, 7)]
+STATUSES = ["Pending", "In Progress", "Solved", "Defected", "Duplicate"]
+WORDS = "fan light tap leak wifi slow room corridor broken smell water power socket door window".split()
+
+
+def sentence(rng, n):
+    return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + "."
+
+
+def make_feed(n, rng):
+    now = datetime.now(IST)
+    feed = []
+    for i in range(1, n + 1):
+        created = now - timedelta(minutes=rng.randint(0, 60 * 24 * 90))
+        feed.append({
+            "id": i,
+            "title": sentence(rng, 5),
+            "description": sentence(rng, 40),
+            "category": rng.choice(CATEGORIES),
+            "sub_location": rng.choice(HOSTELS),
+            "specific_location": f"Room {rng.randint(100, 450)}",
+            "priority": rng.choice(["High", "Medium", "Low"]),
+            "status": rng.choice(STATUSES),
+            "image_data": None,
+            "created_at": created,
+            "owner_id": rng.randint(1, 3000),
+            "owner_name": f"Student {rng.randint(1, 3000)}",
+            "owner_credit_score": round(rng.uniform(-3, 15), 1),
+            "rating": None,
+            "review": None,
+            "comments": [
+                {"id": i * 10 + c, "text": sentence(rng, 12), "created_at": created + timedelta(hours=c + 1),
+                 "user_name": f"Student {rng.randint(1, 3000)}"}
+                for c in range(rng.randint(0, 4))
+            ],
+        })
+    return feed
+
+
+def timeit(fn, repeat):
+    samples = []
+    out = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return out, statistics.median(samples)
+
+
+def main(args):
+    feed = make_feed(args.issues, random.Random(42))
+    results = {"issues": args.issues, "repeat": args.repeat, "serialise_ms": {}, "wire_bytes": {}}
+
+    def stdlib_path():
+        data = jsonable_encoder(feed) if jsonable_encoder else feed
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+    label = "jsonable_encoder+json" if jsonable_encoder else "json(default=str)"
+    body, ms = timeit(stdlib_path, args.repeat)
+    results["serialise_ms"][label] = round(ms, 2)
+
+    if orjson:
+        body, ms = timeit(lambda: orjson.dumps(feed), args.repeat)
+        results["serialise_ms"]["orjson"] = round(ms, 2)
+
+    results["wire_bytes"]["raw"] = len(body)
+    _, ms = timeit(lambda: gzip.compress(body, 6), args.repeat)
+    results["wire_bytes"]["gzip-6"] = len(gzip.compress(body, 6))
+    results["serialise_ms"]["gzip-6 (compress only)"] = round(ms, 2)
+    if brotli:
+        _, ms = timeit(lambda: brotli.compress(body, quality=4), args.repeat)
+        results["wire_bytes"]["brotli-4"] = len(brotli.compress(body, quality=4))
+        results["serialise_ms"]["brotli-4 (compress only)"] = round(ms, 2)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--issues", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    main(parser.parse_args())
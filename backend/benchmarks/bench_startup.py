@@ -0,0 +1,103 @@
+# bench_startup.py
+"""
+Cold-start measurement for the backend.
+
+Reports, each as the median of --runs fresh processes:
+  * import_s          – `import main` in a clean interpreter
+  * first_health_s    – uvicorn launch → first 200 from /health
+  * first_ready_s     – uvicorn launch → first 200 from /ready (null if the
+                        DB never became reachable within --ready-timeout)
+and which heavy integrations were imported eagerly.
+
+    DATABASE_URL=postgresql://... python benchmarks/bench_startup.py --runs 5
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ["reportlab", "gspread", "oauth2client", "firebase_admin", "fastapi_mail", "pytz"]
+
+IMPORT_PROBE = (
+    "import sys, time, json; t = time.perf_counter(); import main; "
+    "print(json.dumps({'import_s': time.perf_counter() - t, "
+    f"'eager': [m for m in {HEAVY!r} if m in sys.modules]}}))"
+)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_import():
+    out = subprocess.check_output([sys.executable, "-c", IMPORT_PROBE], cwd=BACKEND, text=True, stderr=subprocess.DEVNULL)
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def measure_serve(ready_timeout):
+    port = free_port()
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=BACKEND, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    first_health = first_ready = None
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=1.0) as client:
+            deadline = started + 60
+            while first_health is None and time.perf_counter() < deadline:
+                try:
+                    if client.get("/health").status_code == 200:
+                        first_health = time.perf_counter() - started
+                except httpx.HTTPError:
+                    time.sleep(0.01)
+            deadline = time.perf_counter() + ready_timeout
+            while first_ready is None and time.perf_counter() < deadline:
+                try:
+                    if client.get("/ready").status_code == 200:
+                        first_ready = time.perf_counter() - started
+                        break
+                except httpx.HTTPError:
+                    pass
+                time.sleep(0.05)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+    return first_health, first_ready
+
+
+def median(values):
+    values = [v for v in values if v is not None]
+    return round(statistics.median(values), 3) if values else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--ready-timeout", type=float, default=15.0)
+    args = parser.parse_args()
+    if not os.getenv("DATABASE_URL"):
+        sys.exit("DATABASE_URL must be set (an unreachable URL still measures import / liveness)")
+
+    imports = [measure_import() for _ in range(args.runs)]
+    serves = [measure_serve(args.ready_timeout) for _ in range(args.runs)]
+    print(json.dumps({
+        "runs": args.runs,
+        "import_s": median(r["import_s"] for r in imports),
+        "eager_heavy_modules": imports[0]["eager"],
+        "first_health_s": median(h for h, _ in serves),
+        "first_ready_s": median(r for _, r in serves),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# loadtest_mess_rate.py
+"""
+Post-meal spike load test for POST /mess/rate.
+
+Registers (or reuses) a pool of synthetic students, logs them in once and then
+hammers /mess/rate from many concurrent clients for a fixed duration. Every
+student votes for every mess repeatedly, so the run exercises both the first
+vote (INSERT) and the re-vote (UPDATE + delta) paths.
+
+    python benchmarks/loadtest_mess_rate.py --base-url http://localhost:8000 \\
+        --students 300 --concurrency 64 --duration 60
+
+Prints a JSON summary (throughput, latency percentiles, status counts).
+
+Start the server with RATE_LIMIT_ENABLED=false: every client shares one IP,
+so the per-IP bucket would otherwise cap the run at 20 requests/s.
+
+Reference run: one uvicorn worker, local PG 16 and this script all on a
+single CPU core, 300 students, 30 s:
+
+    concurrency 16:  161 ok/s, p50 57 ms, p95 300 ms, p99 490 ms, no errors
+    concurrency 64:  124 ok/s, p50 336 ms, p95 1.55 s, 26 x 503 (load shedding)
+
+That box tops out well short of "several hundred per second"; the target
+needs more cores / workers and has not been demonstrated.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import httpx
+
+MESSES = ["Mess A", "Mess B", "Mess C", "Mess D"]
+
+
+def percentile(sorted_vals, pct):
+    if not sorted_vals:
+        return 0.0
+    k = min(len(sorted_vals) - 1, int(round(pct / 100.0 * (len(sorted_vals) - 1))))
+    return sorted_vals[k]
+
+
+async def get_token(client: httpx.AsyncClient, idx: int, password: str):
+    email = f"loadtest.student{idx}@example.com"
+    await client.post("/register", json={
+        "full_name": f"Load Test {idx}", "email": email, "password": password,
+        "role": "student", "hostel": f"Hostel {idx % 6 + 1}",
+    })
+    res = await client.post("/login", data={"username": email, "password": password})
+    res.raise_for_status()
+    return res.json()["access_token"]
+
+
+async def worker(client, tokens, deadline, latencies, statuses):
+    while time.perf_counter() < deadline:
+        token = random.choice(tokens)
+        payload = {
+            "mess_name": random.choice(MESSES),
+            "hygiene": random.randint(1, 5),
+            "taste": random.randint(1, 5),
+            "quality": random.randint(1, 5),
+            "review": random.choice(["", "Dal was cold", "Good paneer today", "Rice was stale"]),
+            "suggestions": "",
+            "image_data": "",
+        }
+        start = time.perf_counter()
+        try:
+            res = await client.post("/mess/rate", json=payload, headers={"Authorization": f"Bearer {token}"})
+            statuses[res.status_code] = statuses.get(res.status_code, 0) + 1
+        except httpx.HTTPError as exc:
+            statuses[type(exc).__name__] = statuses.get(type(exc).__name__, 0) + 1
+        latencies.append(time.perf_counter() - start)
+
+
+async def main(args):
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=30.0, limits=limits) as client:
+        sem = asyncio.Semaphore(16)
+
+        async def login(i):
+            async with sem:
+                return await get_token(client, i, args.password)
+
+        tokens = await asyncio.gather(*(login(i) for i in range(args.students)))
+
+        latencies, statuses = [], {}
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(*(worker(client, tokens, deadline, latencies, statuses) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    ok = statuses.get(200, 0)
+    print(json.dumps({
+        "endpoint": "POST /mess/rate",
+        "students": args.students,
+        "concurrency": args.concurrency,
+        "duration_s": round(elapsed, 2),
+        "requests": len(latencies),
+        "ok_per_s": round(ok / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "statuses": {str(k): v for k, v in statuses.items()},
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--students", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=60.0)
+    parser.add_argument("--password", default="loadtest-password")
+    asyncio.run(main(parser.parse_args()))
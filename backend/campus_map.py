@@ -0,0 +1,133 @@
+# campus_map.py
+"""
+Campus gazetteer + the grid behind the issue map.
+
+Issues only name a place in free text (sub_location: a hostel, mess or
+department from the report form; specific_location: room, floor, corner), so
+coordinates come from a gazetteer of those places.
+
+Every located issue also gets a grid cell: its Web Mercator position at
+GRID_ZOOM with the x / y bits interleaved (Morton / Z-order). Any aligned
+square block of cells is then one contiguous range of cell numbers, so a
+btree on the cell answers "issues in this part of the map" with a few range
+scans, and the cluster a row falls into at zoom z is just `cell >> bits`.
+Pure Python, no GIS extension needed in Postgres.
+"""
+import json
+import math
+import os
+
+# Approximate building centres on the NIT Agartala campus (the map's default
+# centre is Aryabhatta Hostel). CAMPUS_GAZETTEER_PATH may point at a JSON
+# file {"place": [lat, lng], ...} with surveyed values; its entries win, and
+# keys of the form "Place / specific location" pin down a single block or
+# wing. Places not listed (e.g. "Other") stay off the map.
+GAZETTEER = {
+    # hostels
+    "Aryabhatta": (23.8436, 91.4217),
+    "RNT": (23.8429, 91.4232),
+    "Gargi": (23.8447, 91.4241),
+    "Bhaskara": (23.8421, 91.4205),
+    # messes
+    "1st Year Mess": (23.8425, 91.4224),
+    "Veg Mess": (23.8433, 91.4228),
+    "Eastern Mess": (23.8441, 91.4236),
+    "Northern Mess": (23.8452, 91.4222),
+    "Southern Mess": (23.8417, 91.4214),
+    # academic area
+    "Electrical Dept": (23.8398, 91.4191),
+    "ECE Dept": (23.8402, 91.4183),
+    "CSE Dept": (23.8394, 91.4178),
+    "Civil/Mechanical Dept": (23.8389, 91.4196),
+    "Library": (23.8405, 91.4202),
+    "Admin Block": (23.8411, 91.4188),
+}
+
+GRID_ZOOM = 24          # grid resolution: 2^24 cells per axis, ~2 m at this latitude
+CLUSTER_PX = 64         # a cluster covers a 64 x 64 px square of the screen
+MAX_CLUSTER_ZOOM = 22   # 256 px tiles * 2^22 / 64 px = one grid cell per cluster
+MAX_LAT = 85.05112878   # Web Mercator limit
+
+
+def _key(name: str) -> str:
+    return " ".join(name.split()).casefold()
+
+
+def load_gazetteer():
+    places = {_key(name): coords for name, coords in GAZETTEER.items()}
+    path = os.getenv("CAMPUS_GAZETTEER_PATH")
+    if path:
+        with open(path, encoding="utf-8") as fh:
+            for name, (lat, lng) in json.load(fh).items():
+                places[_key(name)] = (float(lat), float(lng))
+    return places
+
+
+_PLACES = load_gazetteer()
+
+
+def locate(sub_location, specific_location=None):
+    """(lat, lng) for an issue's place, or None when the gazetteer has no entry."""
+    if not sub_location:
+        return None
+    if specific_location:
+        coords = _PLACES.get(_key(f"{sub_location} / {specific_location}"))
+        if coords:
+            return coords
+    return _PLACES.get(_key(sub_location))
+
+
+def _interleave(x: int, y: int) -> int:
+    # x in the even bits, y in the odd ones
+    cell = 0
+    for bit in range(GRID_ZOOM):
+        cell |= ((x >> bit) & 1) << (2 * bit) | ((y >> bit) & 1) << (2 * bit + 1)
+    return cell
+
+
+def grid_xy(lat: float, lng: float):
+    """Web Mercator grid coordinates of a point at GRID_ZOOM."""
+    size = 1 << GRID_ZOOM
+    lat = max(-MAX_LAT, min(MAX_LAT, lat))
+    x = (lng + 180.0) / 360.0
+    s = math.sin(math.radians(lat))
+    y = 0.5 - math.log((1 + s) / (1 - s)) / (4 * math.pi)
+    return min(size - 1, max(0, int(x * size))), min(size - 1, max(0, int(y * size)))
+
+
+def grid_cell(lat: float, lng: float) -> int:
+    return _interleave(*grid_xy(lat, lng))
+
+
+def cluster_shift(zoom: int) -> int:
+    """Grid-axis bits dropped to get one cluster cell at `zoom`."""
+    zoom = max(0, min(MAX_CLUSTER_ZOOM, zoom))
+    return GRID_ZOOM - zoom - int(math.log2(256 // CLUSTER_PX))
+
+
+def cell_ranges(west: float, south: float, east: float, north: float, zoom: int, max_cells: int = 1024):
+    """Cover a bounding box with cluster cells.
+
+    Returns (shift, ranges): `shift` grid bits per axis are dropped, so a row's
+    cluster is map_cell >> (2 * shift); `ranges` are half-open [lo, hi) spans
+    of map_cell, adjacent cells merged. The cells get coarser (as if zoomed
+    out) until the box needs at most `max_cells` of them.
+    """
+    x0, y0 = grid_xy(north, west)     # y grows southwards
+    x1, y1 = grid_xy(south, east)
+    shift = cluster_shift(zoom)
+    while ((x1 >> shift) - (x0 >> shift) + 1) * ((y1 >> shift) - (y0 >> shift) + 1) > max_cells:
+        shift += 1
+    clusters = sorted(
+        _interleave(cx, cy)
+        for cx in range(x0 >> shift, (x1 >> shift) + 1)
+        for cy in range(y0 >> shift, (y1 >> shift) + 1)
+    )
+    bits = 2 * shift
+    ranges = []
+    for k in clusters:
+        if ranges and ranges[-1][1] == k << bits:
+            ranges[-1][1] = (k + 1) << bits
+        else:
+            ranges.append([k << bits, (k + 1) << bits])
+    return shift, [tuple(r) for r in ranges]
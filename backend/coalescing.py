@@ -0,0 +1,180 @@
+# coalescing.py
+"""
+Single-flight coalescing of identical concurrent GETs, plus a micro-cache.
+
+The first request for a key becomes the leader and runs the route; requests
+for the same key arriving meanwhile await the leader's response instead of
+running it again. 200s are then served from a short micro-cache. A leader
+that fails outright (exception, client gone before the response) settles
+its flight with None and each waiter runs the route itself; a leader's
+non-200 response is shared with its waiters but never cached.
+
+Keys are path + sorted query + permission scope: "public" routes share one
+response between all callers, "user" routes are per caller. A caller that
+has just written, or is pinned to the primary, bypasses both layers.
+
+main.py owns the configuration (routes, TTL, metrics) and hands it in.
+"""
+import asyncio
+import time
+from urllib.parse import parse_qsl, urlencode
+
+
+class RequestCoalescer:
+    def __init__(self, micro_ttl_s: float, max_entries: int, requests):
+        self.micro_ttl_s = micro_ttl_s
+        self.max_entries = max_entries
+        self.requests = requests    # metrics counter: route, result
+        self._flights = {}      # key -> Future of the leader's response (None if it failed)
+        self._micro = {}        # key -> (expires_at, response)
+        self._writers = {}      # caller -> time of last successful write
+        self._tally = {}        # route -> [shared, total]
+
+    def count(self, route: str, result: str):
+        self.requests.inc(route=route, result=result)
+        tally = self._tally.setdefault(route, [0, 0])
+        tally[0] += result in ("coalesced", "micro_cache")
+        tally[1] += 1
+
+    def ratios(self):
+        return [({"route": route, "state": "shared"}, shared / total) for route, (shared, total) in self._tally.items() if total]
+
+    def note_write(self, caller: str):
+        now = time.monotonic()
+        if len(self._writers) >= self.max_entries:
+            self._writers = {c: t for c, t in self._writers.items() if now - t < self.micro_ttl_s}
+        self._writers[caller] = now
+
+    def wrote_recently(self, caller: str):
+        wrote = self._writers.get(caller)
+        return wrote is not None and time.monotonic() - wrote < self.micro_ttl_s
+
+    def cached(self, key: str):
+        entry = self._micro.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            self._micro.pop(key, None)
+            return None
+        return entry[1]
+
+    def store(self, key: str, response: dict):
+        now = time.monotonic()
+        if len(self._micro) >= self.max_entries:
+            self._micro = {k: e for k, e in self._micro.items() if e[0] > now}
+            if len(self._micro) >= self.max_entries:
+                self._micro.clear()
+        self._micro[key] = (now + self.micro_ttl_s, response)
+
+    def flight(self, key: str):
+        """The leader's pending response for key, or None when nobody is running it."""
+        return self._flights.get(key)
+
+    def lead(self, key: str):
+        flight = self._flights[key] = asyncio.get_running_loop().create_future()
+        return flight
+
+    def settle(self, key: str, flight, response):
+        self._flights.pop(key, None)
+        flight.set_result(response)
+        if response is not None and response["status"] == 200:
+            self.store(key, response)
+
+
+class CoalescingMiddleware:
+    """Runs identical concurrent GETs on the configured routes once and shares the response.
+
+    routes: {path: "public" | "user"}; caller(scope) names the caller;
+    pinned() is true while the current request must read the primary.
+    """
+
+    def __init__(self, app, coalescer, routes: dict, caller, pinned=lambda: False, enabled: bool = True):
+        self.app = app
+        self.coalescer = coalescer
+        self.routes = routes
+        self.caller = caller
+        self.pinned = pinned
+        self.enabled = enabled
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled:
+            await self.app(scope, receive, send)
+            return
+        method, path = scope.get("method", "GET"), scope.get("path", "")
+        if method != "GET":
+            await self._write(scope, receive, send)
+            return
+        kind = self.routes.get(path)
+        if kind is None:
+            await self.app(scope, receive, send)
+            return
+        coalescer = self.coalescer
+        caller = self.caller(scope)
+
+        if coalescer.wrote_recently(caller) or self.pinned():
+            coalescer.count(path, "bypass")
+            await self.app(scope, receive, send)
+            return
+
+        query = urlencode(sorted(parse_qsl(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True)))
+        key = f"{path}?{query}|{caller if kind == 'user' else '*'}"
+
+        response = coalescer.cached(key)
+        if response is not None:
+            coalescer.count(path, "micro_cache")
+            await self._replay(scope, send, response)
+            return
+
+        flight = coalescer.flight(key)
+        if flight is not None:
+            response = await asyncio.shield(flight)
+            if response is not None:
+                coalescer.count(path, "coalesced")
+                await self._replay(scope, send, response)
+                return
+            # The leader failed outright; do the work ourselves
+            coalescer.count(path, "bypass")
+            await self.app(scope, receive, send)
+            return
+
+        flight = coalescer.lead(key)
+        coalescer.count(path, "leader")
+        captured = {"status": 500, "headers": [], "body": []}
+
+        async def capture_send(message):
+            if message["type"] == "http.response.start":
+                captured["status"] = message["status"]
+                captured["headers"] = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                captured["body"].append(message.get("body", b""))
+                if not message.get("more_body", False) and not flight.done():
+                    # Waiters get the response as soon as it is complete,
+                    # not after the leader's background tasks
+                    coalescer.settle(key, flight, {
+                        "status": captured["status"], "headers": captured["headers"],
+                        "body": b"".join(captured["body"]), "route": scope.get("route"),
+                    })
+            await send(message)
+
+        try:
+            await self.app(scope, receive, capture_send)
+        finally:
+            if not flight.done():
+                coalescer.settle(key, flight, None)
+
+    @staticmethod
+    async def _replay(scope, send, response):
+        # Metrics label by route template; borrow the leader's
+        if response["route"] is not None:
+            scope["route"] = response["route"]
+        # A fresh header list each time: outer middlewares (compression) edit it in place
+        await send({"type": "http.response.start", "status": response["status"], "headers": list(response["headers"])})
+        await send({"type": "http.response.body", "body": response["body"]})
+
+    async def _write(self, scope, receive, send):
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                self.coalescer.note_write(self.caller(scope))
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
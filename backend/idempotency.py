@@ -0,0 +1,241 @@
+# idempotency.py
+"""
+Idempotency-Key support for retried writes.
+
+A request carrying `Idempotency-Key` on one of the configured routes:
+  * first time: runs normally; a 2xx response is recorded for `ttl` seconds
+  * retried with the same key and body: the recorded response is replayed
+    (with `Idempotent-Replayed: true`) and nothing runs again
+  * retried while the first is still running: waits up to `wait_s` for it,
+    then replays, or answers 409 if it is still running
+  * same key, different body: 422
+Keys are scoped to the caller and route. Non-2xx outcomes are not recorded,
+so a retry after a failure runs again. A claimed key whose request never
+finishes (crashed worker) frees itself after `lock_ttl` seconds.
+
+main.py owns the configuration (routes, TTLs, metrics) and hands it in.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import threading
+import time
+
+from starlette.responses import JSONResponse
+
+
+class MemoryIdempotencyStore:
+    shared = False
+
+    def __init__(self, ttl: float, lock_ttl: float, max_keys: int = 50000, clock=time.monotonic):
+        self.ttl = ttl
+        self.lock_ttl = lock_ttl
+        self.max_keys = max_keys
+        self.clock = clock
+        self._data = {}     # key -> (expires_at, fingerprint, record or None while running)
+        self._lock = threading.Lock()
+
+    def begin(self, key: str, fingerprint: str):
+        """("new", None) | ("running", None) | ("done", record) | ("mismatch", None)"""
+        now = self.clock()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] <= now:
+                entry = None
+            if entry is None:
+                if len(self._data) >= self.max_keys:
+                    self._sweep(now)
+                self._data[key] = (now + self.lock_ttl, fingerprint, None)
+                return "new", None
+            if entry[1] != fingerprint:
+                return "mismatch", None
+            return ("running", None) if entry[2] is None else ("done", entry[2])
+
+    def finish(self, key: str, fingerprint: str, record: dict):
+        with self._lock:
+            self._data[key] = (self.clock() + self.ttl, fingerprint, record)
+
+    def release(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[2] is None:
+                del self._data[key]
+
+    def _sweep(self, now):
+        for key in [k for k, entry in self._data.items() if entry[0] <= now]:
+            del self._data[key]
+        while len(self._data) >= self.max_keys:
+            del self._data[next(iter(self._data))]
+
+
+class RedisIdempotencyStore:
+    """Same contract on Redis: SET NX claims the key, so only one worker runs it."""
+    shared = True
+
+    def __init__(self, client, ttl: float, lock_ttl: float, prefix: str):
+        self.r = client
+        self.ttl = ttl
+        self.lock_ttl = lock_ttl
+        self.prefix = prefix + "idem:"
+
+    def begin(self, key: str, fingerprint: str):
+        claim = json.dumps({"f": fingerprint})
+        if self.r.set(self.prefix + key, claim, nx=True, px=int(self.lock_ttl * 1000)):
+            return "new", None
+        raw = self.r.get(self.prefix + key)
+        if raw is None:     # expired between the two calls; let the caller retry
+            return "running", None
+        entry = json.loads(raw)
+        if entry["f"] != fingerprint:
+            return "mismatch", None
+        return ("running", None) if "r" not in entry else ("done", entry["r"])
+
+    def finish(self, key: str, fingerprint: str, record: dict):
+        self.r.set(self.prefix + key, json.dumps({"f": fingerprint, "r": record}), px=int(self.ttl * 1000))
+
+    def release(self, key: str):
+        raw = self.r.get(self.prefix + key)
+        if raw is not None and "r" not in json.loads(raw):
+            self.r.delete(self.prefix + key)
+
+
+class IdempotencyMiddleware:
+    """Replays the recorded response for a retried Idempotency-Key instead of running it again.
+
+    routes: [(method, compiled path regex)]; caller(scope) names who is
+    asking (keys are scoped to it). `requests` counts keyed requests by
+    outcome, `errors` store failures (the request then runs unprotected).
+    """
+
+    def __init__(self, app, store, routes, caller, requests, errors,
+                 wait_s: float = 15.0, poll_s: float = 0.05, max_key_len: int = 255):
+        self.app = app
+        self.store = store
+        self.routes = routes
+        self.caller = caller
+        self.requests = requests
+        self.errors = errors
+        self.wait_s = wait_s
+        self.poll_s = poll_s
+        self.max_key_len = max_key_len
+
+    async def _store_call(self, fn, *args):
+        if self.store.shared:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    def client_key(self, scope):
+        raw = None
+        for key, value in scope.get("headers", []):
+            if key == b"idempotency-key":
+                raw = value.decode("latin-1").strip()
+                break
+        if raw is None:
+            return None
+        method, path = scope.get("method"), scope.get("path", "")
+        if not any(method == m and pattern.match(path) for m, pattern in self.routes):
+            return None
+        return raw
+
+    async def __call__(self, scope, receive, send):
+        client_key = self.client_key(scope) if scope["type"] == "http" else None
+        if client_key is None:
+            await self.app(scope, receive, send)
+            return
+        if not client_key or len(client_key) > self.max_key_len:
+            await JSONResponse({"detail": "Invalid Idempotency-Key"}, status_code=400)(scope, receive, send)
+            return
+
+        # Buffer the body: it is both fingerprinted and replayed to the route
+        chunks, more = [], True
+        while more:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunks.append(message.get("body", b""))
+            more = message.get("more_body", False)
+        body = b"".join(chunks)
+
+        key = f"{self.caller(scope)}:{scope['method']}:{scope['path']}:{client_key}"
+        fingerprint = hashlib.sha256(body).hexdigest()
+
+        deadline = time.monotonic() + self.wait_s
+        while True:
+            try:
+                state, record = await self._store_call(self.store.begin, key, fingerprint)
+            except Exception:
+                # Store down: run the request unprotected rather than fail it
+                self.errors.inc(op="idempotency")
+                state, record, key = "new", None, None
+            if state != "running":
+                break
+            if time.monotonic() >= deadline:
+                self.requests.inc(outcome="conflict")
+                await JSONResponse(
+                    {"detail": "A request with this Idempotency-Key is still in progress"},
+                    status_code=409, headers={"Retry-After": "1"},
+                )(scope, receive, send)
+                return
+            await asyncio.sleep(self.poll_s)
+
+        if state == "mismatch":
+            self.requests.inc(outcome="mismatch")
+            await JSONResponse(
+                {"detail": "Idempotency-Key was already used with a different request body"}, status_code=422,
+            )(scope, receive, send)
+            return
+        if state == "done":
+            self.requests.inc(outcome="replayed")
+            headers = [(k.encode("latin-1"), v.encode("latin-1")) for k, v in record["headers"]]
+            await send({"type": "http.response.start", "status": record["status"],
+                        "headers": headers + [(b"idempotent-replayed", b"true")]})
+            await send({"type": "http.response.body", "body": base64.b64decode(record["body"])})
+            return
+
+        self.requests.inc(outcome="executed")
+        delivered = False
+
+        async def replay_receive():
+            nonlocal delivered
+            if not delivered:
+                delivered = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        response = {"status": 500, "headers": [], "body": []}
+        settled = key is None
+
+        async def settle(recorded: bool):
+            nonlocal settled
+            if settled:
+                return
+            settled = True
+            try:
+                if recorded:
+                    await self._store_call(self.store.finish, key, fingerprint, {
+                        "status": response["status"],
+                        "headers": [(k.decode("latin-1"), v.decode("latin-1")) for k, v in response["headers"]],
+                        "body": base64.b64encode(b"".join(response["body"])).decode("ascii"),
+                    })
+                else:
+                    await self._store_call(self.store.release, key)
+            except Exception:
+                self.errors.inc(op="idempotency")
+
+        async def capture_send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                response["body"].append(message.get("body", b""))
+                if not message.get("more_body", False):
+                    # Record before the client sees the last byte, so its
+                    # immediate retry already finds the response
+                    await settle(200 <= response["status"] < 300)
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, capture_send)
+        finally:
+            await settle(False)
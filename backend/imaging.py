@@ -0,0 +1,70 @@
+# imaging.py
+"""
+Image transcoding for uploads, run inside main.py's process pool.
+
+Kept separate from main.py on purpose: pool workers import only this module
+(Pillow), not the whole app with its engines and integrations.
+"""
+import io
+
+from PIL import Image, ImageOps
+
+# Refuse decompression bombs well before they eat the worker's memory
+Image.MAX_IMAGE_PIXELS = 50_000_000
+
+ACCEPTED_FORMATS = {"JPEG", "PNG", "WEBP", "GIF", "BMP", "MPO"}
+
+
+class UnsupportedImage(ValueError):
+    pass
+
+
+def _encode(img, fmt: str, quality: int):
+    out = io.BytesIO()
+    if fmt == "webp":
+        img.save(out, "WEBP", quality=quality, method=4)
+    else:
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        img.save(out, "JPEG", quality=quality, optimize=True, progressive=True)
+    return out.getvalue()
+
+
+def transcode(path: str, max_side: int, thumb_side: int, fmt: str, quality: int):
+    """Decode the upload at `path`, return bounded image + thumbnail bytes.
+
+    EXIF orientation is applied to the pixels and the metadata is dropped
+    (nothing is passed through to save()), so GPS tags never leave the server.
+    """
+    try:
+        with Image.open(path) as src:
+            if src.format not in ACCEPTED_FORMATS:
+                raise UnsupportedImage(f"Unsupported image format: {src.format}")
+            src.seek(0)     # first frame of GIF / MPO
+            img = ImageOps.exif_transpose(src)
+            img.load()
+    except Image.DecompressionBombError as exc:
+        raise UnsupportedImage(str(exc))
+    except UnsupportedImage:
+        raise
+    except Exception:
+        raise UnsupportedImage("Not a readable image")
+
+    keep_alpha = fmt == "webp" and img.mode in ("RGBA", "LA", "P")
+    img = img.convert("RGBA" if keep_alpha else "RGB")
+
+    img.thumbnail((max_side, max_side), Image.LANCZOS)
+    data = _encode(img, fmt, quality)
+    width, height = img.size
+
+    thumb = img.copy()
+    thumb.thumbnail((thumb_side, thumb_side), Image.LANCZOS)
+    thumb_data = _encode(thumb, fmt, max(quality - 15, 40))
+
+    return {
+        "content_type": "image/webp" if fmt == "webp" else "image/jpeg",
+        "width": width,
+        "height": height,
+        "data": data,
+        "thumb": thumb_data,
+    }
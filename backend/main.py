@@ -1,8 +1,26 @@
 # main.py
 import uvicorn
 import os
+import asyncio
+import contextvars
 import csv
+import importlib.util
 import io
+import itertools
+import json
+import logging
+import math
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager, contextmanager
+from http.cookies import SimpleCookie
 import httpx  # Required for Chatbot
 from datetime import datetime, timedelta, timezone
 # IST (UTC + 5:30)
@@ -10,41 +28,61 @@ IST = timezone(timedelta(hours=5, minutes=30))
 from typing import Optional, List
 from enum import Enum
 from dotenv import load_dotenv
-from sqlalchemy import text
 from fastapi.encoders import jsonable_encoder
 
-# --- GOOGLE SHEETS IMPORTS ---
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
-
-# --- PDF GENERATION IMPORTS ---
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image, PageBreak
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
+# Heavy integrations (gspread/oauth2client, ReportLab, fastapi_mail,
+# firebase_admin) are imported on first use, not here, to keep cold starts fast.
 
-from fastapi import FastAPI, Depends, HTTPException, BackgroundTasks, Query, Response
+from fastapi import FastAPI, Depends, HTTPException, BackgroundTasks, Query, Response, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.responses import StreamingResponse, JSONResponse
-from pydantic import BaseModel, EmailStr
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, ForeignKey, case, func, or_, Float
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+from multipart.multipart import MultipartParser, parse_options_header
+from pydantic import BaseModel, ConfigDict, EmailStr, ValidationError
+from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, ForeignKey, case, func, or_, Float, UniqueConstraint, LargeBinary, SmallInteger, Computed, BigInteger
+from sqlalchemy import and_, column, event, select, text, true, tuple_, union_all, values
+from sqlalchemy.exc import IntegrityError, OperationalError, SQLAlchemyError
 from sqlalchemy.orm import declarative_base
-from sqlalchemy.orm import sessionmaker, Session, relationship
+from sqlalchemy.orm import sessionmaker, Session, relationship, deferred
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.pool import QueuePool
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 
-# --- IMPORTS FOR NOTIFICATIONS ---
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
-import firebase_admin
-from firebase_admin import credentials
+# Local modules (mechanisms; main.py configures them)
+from admission import AdmissionController, AdmissionMiddleware
+from campus_map import cell_ranges, grid_cell, locate
+from coalescing import CoalescingMiddleware, RequestCoalescer
+from idempotency import IdempotencyMiddleware, MemoryIdempotencyStore, RedisIdempotencyStore
+from ratelimit import MemoryRateLimiter, RateLimitMiddleware, RedisRateLimiter, rate_limit_detail, rate_rule, retry_after
+from sentiment import analyse_review
+
+# --- FAST JSON / COMPRESSION (optional speedups) ---
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse as FastJSONResponse
+except ImportError:   # orjson missing → plain JSON, same output
+    orjson = None
+
+    class FastJSONResponse(JSONResponse):
+        def render(self, content) -> bytes:
+            return super().render(jsonable_encoder(content))
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 # ==========================================
 # 1. CONFIGURATION & DATABASE
 # ==========================================
 load_dotenv()
 
+logger = logging.getLogger("campusfix")
+
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = "HS256"
 if not SECRET_KEY:
@@ -62,47 +100,397 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise RuntimeError("❌ DATABASE_URL is missing from environment variables!")
 
-# Fix postgres:// to postgresql://
-if DATABASE_URL.startswith("postgres://"):
-    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
+# Local Postgres (benchmarks, dev) can opt out of the Supabase-specific
+# rewrites below: DB_SESSION_POOLER=false, DB_SSLMODE=disable.
+DB_SESSION_POOLER = os.getenv("DB_SESSION_POOLER", "true").lower() != "false"
+DB_SSLMODE = os.getenv("DB_SSLMODE", "require")
+
+def normalize_database_url(url: str):
+    """Apply the Supabase rewrites to a primary or replica URL."""
+    # Fix postgres:// to postgresql://
+    if url.startswith("postgres://"):
+        url = url.replace("postgres://", "postgresql://", 1)
+
+    # ✅ FORCE SESSION POOLER (Port 6543)
+    # Supabase has 46 connections available in Session Mode
+    if DB_SESSION_POOLER and ":5432" in url:
+        print("⚡ Switching to Session Pooler (Port 6543)...")
+        url = url.replace(":5432", ":6543")
+
+    # Add SSL requirement
+    if "?" not in url:
+        url += f"?sslmode={DB_SSLMODE}"
+    elif "sslmode" not in url:
+        url += f"&sslmode={DB_SSLMODE}"
+    return url
+
+DATABASE_URL = normalize_database_url(DATABASE_URL)
+
+# Optional read replicas, comma-separated (see READ REPLICAS below)
+DATABASE_REPLICA_URLS = [
+    normalize_database_url(u.strip())
+    for u in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if u.strip()
+]
 
-# ✅ FORCE SESSION POOLER (Port 6543)
-# Supabase has 46 connections available in Session Mode
-if ":5432" in DATABASE_URL:
-    print("⚡ Switching to Session Pooler (Port 6543)...")
-    DATABASE_URL = DATABASE_URL.replace(":5432", ":6543")
+print("☁️ Connecting to Supabase PostgreSQL...")
 
-# Add SSL requirement
-if "?" not in DATABASE_URL:
-    DATABASE_URL += "?sslmode=require"
-elif "sslmode" not in DATABASE_URL:
-    DATABASE_URL += "&sslmode=require"
+# ==========================================
+# METRICS (Prometheus text format, served at /metrics)
+# ==========================================
+# Tiny in-process registry: no extra dependency, values are per worker process.
+
+def _fmt_labels(labels: dict):
+    if not labels:
+        return ""
+    parts = []
+    for k, v in sorted(labels.items()):
+        v = str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{k}="{v}"')
+    return "{" + ",".join(parts) + "}"
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._lock = threading.Lock()
+        METRICS.append(self)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help_text):
+        super().__init__(name, help_text)
+        self._values = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_fmt_labels(dict(k))} {v}" for k, v in items]
+
+class Gauge(Counter):
+    """Settable value; `fn` makes it computed at scrape time instead."""
+    kind = "gauge"
+
+    def __init__(self, name, help_text, fn=None):
+        super().__init__(name, help_text)
+        self._fn = fn
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[tuple(sorted(labels.items()))] = value
+
+    def samples(self):
+        if self._fn:
+            for labels, value in self._fn():
+                self.set(value, **labels)
+        return super().samples()
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets):
+        super().__init__(name, help_text)
+        self.buckets = sorted(buckets)
+        self._series = {}   # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for idx, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[idx] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def samples(self):
+        out = []
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        for key, series in items:
+            labels = dict(key)
+            for bound, n in zip(self.buckets, series):
+                out.append(f"{self.name}_bucket{_fmt_labels({**labels, 'le': bound})} {n}")
+            out.append(f"{self.name}_bucket{_fmt_labels({**labels, 'le': '+Inf'})} {series[-1]}")
+            out.append(f"{self.name}_sum{_fmt_labels(labels)} {series[-2]}")
+            out.append(f"{self.name}_count{_fmt_labels(labels)} {series[-1]}")
+        return out
+
+METRICS = []
+
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+
+HTTP_LATENCY = Histogram("campusfix_http_request_duration_seconds", "Request latency by route template.", LATENCY_BUCKETS)
+HTTP_REQUESTS = Counter("campusfix_http_requests_total", "Requests by route template and status code.")
+HTTP_IN_FLIGHT = Gauge("campusfix_http_requests_in_flight", "Requests currently being handled.")
+SQL_PER_REQUEST = Histogram("campusfix_sql_statements_per_request", "SQL statements executed per request.", [0, 1, 2, 3, 5, 10, 20, 50, 100, 250])
+POOL_WAIT = Histogram("campusfix_db_pool_checkout_wait_seconds", "Time spent waiting for a pooled DB connection.", [0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30])
+POOL_TIMEOUTS = Counter("campusfix_db_pool_checkout_timeouts_total", "Checkouts that gave up after pool_timeout.")
+BG_QUEUE_DEPTH = Gauge("campusfix_background_tasks_pending", "Background jobs queued but not finished, by queue.")
+BG_TASKS = Counter("campusfix_background_tasks_total", "Finished background jobs by queue and outcome.")
+
+# Per-request scratchpad; a mutable dict so the threadpool copy of the
+# context (sync routes / dependencies) writes into the same object.
+REQUEST_STATS = contextvars.ContextVar("request_stats", default=None)
+
+class DecayingAverage:
+    """EWMA of samples that also fades toward 0 when no samples arrive.
+
+    Without the fade, a lane that stops being used while congested would look
+    congested forever.
+    """
 
-print("☁️ Connecting to Supabase PostgreSQL...")
+    def __init__(self, alpha: float = 0.2, tau_s: float = 5.0):
+        self.alpha = alpha
+        self.tau_s = tau_s
+        self._value = 0.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _faded(self, now):
+        return self._value * math.exp(-(now - self._updated) / self.tau_s)
+
+    def add(self, sample: float):
+        with self._lock:
+            now = time.monotonic()
+            value = self._faded(now)
+            self._value = value + self.alpha * (sample - value)
+            self._updated = now
+
+    def value(self):
+        with self._lock:
+            return self._faded(time.monotonic())
+
+# Recent checkout wait per lane; admission control sheds load from it
+POOL_PRESSURE = {}
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long callers wait for a connection, per lane."""
+
+    lane = "interactive"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except Exception as exc:
+            if type(exc).__name__ == "TimeoutError":
+                POOL_TIMEOUTS.inc(lane=self.lane)
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            POOL_WAIT.observe(waited, lane=self.lane)
+            pressure = POOL_PRESSURE.get(self.lane)
+            if pressure is None:
+                pressure = POOL_PRESSURE.setdefault(self.lane, DecayingAverage())
+            pressure.add(waited)
+
+    def recreate(self):
+        # engine.dispose() rebuilds the pool; keep the lane label
+        pool = super().recreate()
+        pool.lane = self.lane
+        return pool
+
+# ==========================================
+# CONNECTION POOL LANES
+# ==========================================
+# Each lane is its own engine + pool, so a long all-time PDF report or a
+# Sheets sync can only exhaust its own connections, never the interactive
+# API's. Size / timeout per lane: DB_POOL_<LANE>_SIZE, DB_POOL_<LANE>_TIMEOUT.
+# Keep the sum within the Supabase pooler budget (46 connections in total).
+DB_LANE_DEFAULTS = {
+    "interactive": (5, 10),    # student / admin API calls: fail fast
+    "reporting": (2, 60),      # PDF / CSV reports, exports, analytics scans
+    "background": (1, 120),    # Sheets sync, image writes, maintenance jobs
+}
+
+def create_lane_engine(lane: str, pool_size: int, pool_timeout: int, url: Optional[str] = None):
+    lane_engine = create_engine(
+        url or DATABASE_URL,
+        poolclass=TimedQueuePool,
+        pool_size=pool_size,      # Conservative for Render free tier
+        max_overflow=0,           # No bursts (prevents crashes)
+        pool_timeout=pool_timeout,
+        pool_recycle=300,         # Recycle every 5 mins
+        pool_pre_ping=True,       # Check health before use
+        connect_args={
+            "sslmode": DB_SSLMODE,
+            "keepalives": 1,
+            "keepalives_idle": 30,
+            "keepalives_interval": 10,
+            "keepalives_count": 5,
+            "connect_timeout": 10,
+            "application_name": f"campusfix-{lane}",
+        },
+        # ✅ CRITICAL FIX for Transaction Mode
+        execution_options={
+            "isolation_level": "AUTOCOMMIT"
+        }
+    )
+    lane_engine.pool.lane = lane
+    return lane_engine
+
+# ✅ CREATE ENGINES WITH OPTIMAL SETTINGS
+DB_LANES = {}
+for _lane, (_size, _timeout) in DB_LANE_DEFAULTS.items():
+    DB_LANES[_lane] = create_lane_engine(
+        _lane,
+        int(os.getenv(f"DB_POOL_{_lane.upper()}_SIZE", _size)),
+        int(os.getenv(f"DB_POOL_{_lane.upper()}_TIMEOUT", _timeout)),
+    )
 
-# ✅ CREATE ENGINE WITH OPTIMAL SETTINGS
-engine = create_engine(
-    DATABASE_URL,
-    pool_size=5,              # Conservative for Render free tier
-    max_overflow=0,           # No bursts (prevents crashes)
-    pool_timeout=30,
-    pool_recycle=300,         # Recycle every 5 mins
-    pool_pre_ping=True,       # Check health before use
-    connect_args={
-        "sslmode": "require",
-        "keepalives": 1,
-        "keepalives_idle": 30,
-        "keepalives_interval": 10,
-        "keepalives_count": 5,
-        "connect_timeout": 10, 
-    },
-    # ✅ CRITICAL FIX for Transaction Mode
-    execution_options={
-        "isolation_level": "AUTOCOMMIT"
+# The interactive lane is the default engine everything else refers to
+engine = DB_LANES["interactive"]
+
+# Read replicas are extra lanes ("replica-0", "replica-1", ...) so they show up
+# in pool stats / metrics and are disposed with the rest. Nothing writes to them.
+REPLICA_LANES = []
+for _i, _url in enumerate(DATABASE_REPLICA_URLS):
+    _name = f"replica-{_i}"
+    DB_LANES[_name] = create_lane_engine(
+        _name,
+        int(os.getenv("DB_POOL_REPLICA_SIZE", "3")),
+        int(os.getenv("DB_POOL_REPLICA_TIMEOUT", "5")),
+        url=_url,
+    )
+    REPLICA_LANES.append(_name)
+if REPLICA_LANES:
+    print(f"📚 {len(REPLICA_LANES)} read replica(s) configured")
+
+# ==========================================
+# SQL PROFILER (N+1 detection, slow-query capture)
+# ==========================================
+# Off by default. SQL_PROFILE=1 profiles every request; otherwise an admin can
+# profile a single request by sending `X-SQL-Profile: 1`. Results are kept in
+# memory and served at GET /admin/sql-profile.
+SQL_PROFILE_ALL = os.getenv("SQL_PROFILE", "").lower() in ("1", "true", "yes")
+SQL_SLOW_MS = float(os.getenv("SQL_SLOW_MS", "100"))
+SQL_N_PLUS_ONE_MIN = int(os.getenv("SQL_N_PLUS_ONE_MIN", "5"))
+SQL_SLOW_QUERIES = deque(maxlen=int(os.getenv("SQL_SLOW_BUFFER", "200")))
+SQL_REQUEST_PROFILES = deque(maxlen=50)
+
+_IN_LIST_RE = re.compile(r"\(%\(\w+\)s(?:, %\(\w+\)s)*\)")
+_WS_RE = re.compile(r"\s+")
+
+def _statement_shape(statement: str):
+    """Whitespace-collapsed SQL with IN-lists folded, so repeats compare equal."""
+    return _IN_LIST_RE.sub("(...)", _WS_RE.sub(" ", statement).strip())
+
+def _params_shape(parameters):
+    if isinstance(parameters, dict):
+        return {k: type(v).__name__ for k, v in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (dict, list, tuple)):
+            return f"executemany x{len(parameters)}"
+        return [type(v).__name__ for v in parameters]
+    return type(parameters).__name__
+
+def _call_site():
+    """Innermost frame of this module that isn't the profiler/middleware itself."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        code = frame.f_code
+        if code.co_filename == __file__ and code.co_name not in _PROFILER_FRAMES:
+            return f"{code.co_name}:{frame.f_lineno}"
+        frame = frame.f_back
+    return "<outside app>"
+
+_PROFILER_FRAMES = {"_before_execute", "_after_execute", "_call_site", "get_db", "__call__", "send_wrapper", "record"}
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = REQUEST_STATS.get()
+    if stats is not None:
+        stats["sql"] += 1
+    if SQL_PROFILE_ALL or (stats is not None and stats.get("profile") is not None):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start")
+    if not starts:
+        return
+    duration_ms = (time.perf_counter() - starts.pop()) * 1000
+    stats = REQUEST_STATS.get()
+    entry = {
+        "shape": _statement_shape(statement),
+        "params": _params_shape(parameters),
+        "ms": round(duration_ms, 2),
+        "site": _call_site(),
+    }
+    if stats is not None and stats.get("profile") is not None:
+        stats["profile"].append(entry)
+    if duration_ms >= SQL_SLOW_MS:
+        SQL_SLOW_QUERIES.append({**entry, "at": datetime.now(IST).isoformat(), "path": stats.get("path") if stats else None})
+
+def summarise_sql_profile(statements: list):
+    """Group a request's statements by shape and flag repeated shapes as N+1."""
+    groups = {}
+    for st in statements:
+        g = groups.setdefault(st["shape"], {"shape": st["shape"], "count": 0, "total_ms": 0.0, "sites": set()})
+        g["count"] += 1
+        g["total_ms"] += st["ms"]
+        g["sites"].add(st["site"])
+    shapes = sorted(groups.values(), key=lambda g: g["total_ms"], reverse=True)
+    for g in shapes:
+        g["total_ms"] = round(g["total_ms"], 2)
+        g["sites"] = sorted(g["sites"])
+        g["n_plus_one"] = g["count"] >= SQL_N_PLUS_ONE_MIN
+    return {
+        "statements": len(statements),
+        "db_ms": round(sum(st["ms"] for st in statements), 2),
+        "n_plus_one": [g["shape"] for g in shapes if g["n_plus_one"]],
+        "shapes": shapes,
     }
-)
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+for _lane_engine in DB_LANES.values():
+    event.listen(_lane_engine, "before_cursor_execute", _before_execute)
+    event.listen(_lane_engine, "after_cursor_execute", _after_execute)
+
+def lane_pool_stats():
+    stats = {}
+    for lane, lane_engine in DB_LANES.items():
+        pool = lane_engine.pool
+        size = pool.size()
+        checked_out = pool.checkedout()
+        stats[lane] = {
+            "size": size,
+            "checked_out": checked_out,
+            "idle": pool.checkedin(),
+            "saturation": round(checked_out / size, 3) if size else 0,
+            "timeout_s": pool._timeout,
+        }
+    return stats
+
+def _pool_stats():
+    return [
+        ({"lane": lane, "state": state}, value)
+        for lane, lane_stats in lane_pool_stats().items()
+        for state, value in lane_stats.items() if state != "timeout_s"
+    ]
+
+DB_POOL = Gauge("campusfix_db_pool_connections", "Connection pool occupancy per lane (saturation = checked_out / size).", fn=_pool_stats)
+
+LANE_SESSIONS = {
+    lane: sessionmaker(autocommit=False, autoflush=False, bind=lane_engine)
+    for lane, lane_engine in DB_LANES.items()
+}
+SessionLocal = LANE_SESSIONS["interactive"]
 Base = declarative_base()
 
 def get_db():
@@ -112,16 +500,457 @@ def get_db():
     finally:
         db.close()
 
+def get_report_db():
+    """Session on the reporting lane (heavy reads: reports, exports)."""
+    db = LANE_SESSIONS["reporting"]()
+    try:
+        yield db
+    finally:
+        db.close()
+
+def background_session():
+    """Session on the background lane, for work that runs off the request path."""
+    return LANE_SESSIONS["background"]()
+
+def begin_transaction(db: Session):
+    """Run the rest of this session in a real READ COMMITTED transaction.
+
+    The lanes are AUTOCOMMIT. Auth shares the request's session and may have
+    queried already; that connection is released first, since execution
+    options on an established connection are silently ignored.
+    """
+    if db.in_transaction():
+        db.commit()
+    db.connection(execution_options={"isolation_level": "READ COMMITTED"})
+
+# ==========================================
+# READ REPLICAS (optional, read-your-writes)
+# ==========================================
+# With DATABASE_REPLICA_URLS set, read-only routes take their session from
+# get_read_db() / get_report_read_db(). They fall back to the primary when:
+#   * the client wrote something in the last READ_YOUR_WRITES_S seconds
+#     (ReadYourWritesMiddleware stamps the response of every successful write),
+#   * every replica is down or lags more than REPLICA_MAX_LAG_S, or
+#   * checking out a replica connection fails.
+# Local testing: run two Postgres instances (a streaming replica, or simply a
+# second database the app was started against once so it has the schema) and
+# set DATABASE_URL / DATABASE_REPLICA_URLS with DB_SESSION_POOLER=false
+# DB_SSLMODE=disable. The X-DB-Read response header names the target used.
+READ_YOUR_WRITES_S = float(os.getenv("READ_YOUR_WRITES_S", "5"))
+REPLICA_MAX_LAG_S = float(os.getenv("REPLICA_MAX_LAG_S", "10"))
+REPLICA_CHECK_INTERVAL_S = float(os.getenv("REPLICA_CHECK_INTERVAL_S", "5"))
+
+# Not healthy until the first probe succeeds
+REPLICA_STATE = {
+    name: {"healthy": False, "lag_s": None, "checked_at": None, "error": "not checked yet"}
+    for name in REPLICA_LANES
+}
+_REPLICA_STOP = threading.Event()
+_replica_rr = itertools.count()
+
+# Lag is 0 when the instance is not a standby (plain second database) or has
+# replayed everything it received; otherwise age of the last replayed commit.
+REPLICA_LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+DB_READ_ROUTES = Counter("campusfix_db_read_routes_total", "Read-only sessions by target and reason.")
+
+def _replica_lag():
+    return [({"replica": name}, st["lag_s"] if st["healthy"] else -1) for name, st in REPLICA_STATE.items()]
+
+REPLICA_LAG = Gauge("campusfix_db_replica_lag_seconds", "Replica replay lag (-1 = unhealthy).", fn=_replica_lag)
+
+def mark_replica_down(name: str, error):
+    REPLICA_STATE[name].update(healthy=False, error=str(error)[:200], checked_at=datetime.now(IST).isoformat())
+    print(f"⚠️ Replica {name} marked unhealthy: {error}")
+
+def check_replicas():
+    for name in REPLICA_LANES:
+        try:
+            with DB_LANES[name].connect() as conn:
+                lag = float(conn.execute(REPLICA_LAG_SQL).scalar() or 0)
+        except Exception as exc:
+            mark_replica_down(name, exc)
+            continue
+        healthy = lag <= REPLICA_MAX_LAG_S
+        REPLICA_STATE[name].update(
+            healthy=healthy, lag_s=round(lag, 3), checked_at=datetime.now(IST).isoformat(),
+            error=None if healthy else f"lag {lag:.1f}s > {REPLICA_MAX_LAG_S}s",
+        )
+
+def replica_monitor():
+    while not _REPLICA_STOP.is_set():
+        check_replicas()
+        _REPLICA_STOP.wait(REPLICA_CHECK_INTERVAL_S)
+
+def _open_read_session(fallback_lane: str, primary: Optional[Session] = None):
+    """A replica session, else `primary` (when given) or a new one on `fallback_lane`.
+
+    session.info["read_target"] names where the reads go ("primary" or the
+    replica lane).
+    """
+    stats = REQUEST_STATS.get()
+    reason = "no_replica"
+    if REPLICA_LANES:
+        reason = "unhealthy"
+        if stats is not None and stats.get("read_primary"):
+            reason = "recent_write"
+        else:
+            healthy = [name for name in REPLICA_LANES if REPLICA_STATE[name]["healthy"]]
+            start = next(_replica_rr)
+            for offset in range(len(healthy)):
+                name = healthy[(start + offset) % len(healthy)]
+                db = LANE_SESSIONS[name]()
+                try:
+                    db.connection()    # check out now: a dead replica falls back here, not mid-query
+                except OperationalError as exc:
+                    db.close()
+                    mark_replica_down(name, exc)
+                    continue
+                except Exception:
+                    db.close()         # pool exhausted: try the next one / the primary
+                    continue
+                DB_READ_ROUTES.inc(target=name, reason="replica")
+                if stats is not None:
+                    stats["db_read"] = name
+                db.info["read_target"] = name
+                return db
+    DB_READ_ROUTES.inc(target=fallback_lane, reason=reason)
+    if stats is not None:
+        stats["db_read"] = "primary"
+    db = primary if primary is not None else LANE_SESSIONS[fallback_lane]()
+    db.info["read_target"] = "primary"
+    return db
+
+def get_read_db(db: Session = Depends(get_db)):
+    """Session for read-only routes: a healthy replica, else the request's own primary session.
+
+    Reusing get_db's session keeps a request to one interactive connection;
+    when a replica is used, the primary connection (auth lookup) is handed
+    back first.
+    """
+    db.commit()
+    read_db = _open_read_session("interactive", primary=db)
+    try:
+        yield read_db
+    finally:
+        if read_db is not db:
+            read_db.close()
+
+def get_report_read_db():
+    """Like get_read_db, but falls back to the reporting lane."""
+    db = _open_read_session("reporting")
+    try:
+        yield db
+    finally:
+        db.close()
+
+# ==========================================
+# SHARED CACHE (memory / Redis)
+# ==========================================
+# CACHE_URL picks the backend:
+#   unset / memory://     per-process dict; only coherent with a single worker
+#   redis://host:6379/0   shared by every worker and instance (pip install redis)
+# Every entry has a TTL and optional tags; invalidate_tags() drops all keys
+# under a tag. The Redis backend keeps a short-lived local copy of what it
+# reads (CACHE_LOCAL_TTL_S) and publishes invalidations so every worker drops
+# its copy too. get_or_set() is single-flight: one caller per key runs the
+# loader, concurrent callers (in any worker) wait for its result.
+CACHE_URL = os.getenv("CACHE_URL", "")
+CACHE_PREFIX = os.getenv("CACHE_PREFIX", "campusfix:")
+CACHE_LOCAL_TTL_S = float(os.getenv("CACHE_LOCAL_TTL_S", "5"))
+CACHE_LOCK_TTL_S = float(os.getenv("CACHE_LOCK_TTL_S", "10"))
+CACHE_TAG_TTL_S = 24 * 3600
+
+CACHE_REQUESTS = Counter("campusfix_cache_requests_total", "get_or_set lookups by namespace and result (hit / miss / coalesced).")
+CACHE_ERRORS = Counter("campusfix_cache_errors_total", "Cache backend failures (treated as misses).")
+
+_MISSING = object()
+
+def _cache_dumps(value):
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(jsonable_encoder(value), separators=(",", ":")).encode("utf-8")
+
+def _cache_loads(raw):
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+class _CacheBase:
+    """Shared get_or_set / single-flight logic; backends implement get/set/delete/invalidate_tags."""
+
+    def __init__(self):
+        self._flights = {}
+        self._flights_guard = threading.Lock()
+
+    @contextmanager
+    def _local_flight(self, key: str):
+        # One thread per key per process; the others queue on the same lock
+        with self._flights_guard:
+            entry = self._flights.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._flights_guard:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    self._flights.pop(key, None)
+
+    def _load(self, key, loader, ttl, tags):
+        value = loader()
+        if value is not None:
+            self.set(key, value, ttl, tags)
+        return value
+
+    def get_or_set(self, key: str, loader, ttl: float, tags=()):
+        """Cached value for key, else loader() stored for ttl seconds (None is never cached)."""
+        namespace = key.split(":", 1)[0]
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            CACHE_REQUESTS.inc(namespace=namespace, result="hit")
+            return value
+        with self._local_flight(key):
+            value = self.get(key, _MISSING)
+            if value is not _MISSING:
+                CACHE_REQUESTS.inc(namespace=namespace, result="coalesced")
+                return value
+            CACHE_REQUESTS.inc(namespace=namespace, result="miss")
+            return self._load(key, loader, ttl, tags)
+
+class MemoryCache(_CacheBase):
+    def __init__(self, max_entries: int = 10000):
+        super().__init__()
+        self.max_entries = max_entries
+        self._data = {}     # key -> (expires_at, value, tags)
+        self._tags = {}     # tag -> set of keys
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            if entry[0] <= time.monotonic():
+                self._drop(key)
+                return default
+            return entry[1]
+
+    def set(self, key: str, value, ttl: float, tags=()):
+        with self._lock:
+            self._drop(key)
+            if len(self._data) >= self.max_entries:
+                self._evict()
+            self._data[key] = (time.monotonic() + ttl, value, tuple(tags))
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._drop(key)
+
+    def invalidate_tags(self, *tags):
+        with self._lock:
+            for tag in tags:
+                for key in self._tags.pop(tag, ()):
+                    self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._tags.clear()
+
+    def _drop(self, key):
+        entry = self._data.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def _evict(self):
+        now = time.monotonic()
+        for key in [k for k, entry in self._data.items() if entry[0] <= now]:
+            self._drop(key)
+        # Still full: drop the oldest insertions
+        while len(self._data) >= self.max_entries:
+            self._drop(next(iter(self._data)))
+
+class RedisCache(_CacheBase):
+    """Redis-backed cache with a local near-cache kept coherent over pub/sub.
+
+    Redis errors never fail a request: reads become misses, writes are skipped.
+    """
+
+    def __init__(self, client, prefix: str = CACHE_PREFIX, local_ttl: float = CACHE_LOCAL_TTL_S):
+        super().__init__()
+        self.r = client
+        self.prefix = prefix
+        self.local_ttl = local_ttl
+        self.local = MemoryCache(max_entries=2000)
+        self.channel = prefix + "invalidate"
+        self._listener = None
+        self._listener_lock = threading.Lock()
+
+    def _k(self, key):
+        return self.prefix + key
+
+    def _tag_k(self, tag):
+        return self.prefix + "tag:" + tag
+
+    def _ensure_listener(self):
+        if self._listener is None:
+            with self._listener_lock:
+                if self._listener is None:
+                    self._listener = threading.Thread(target=self._listen, name="cache-invalidation", daemon=True)
+                    self._listener.start()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self.r.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                # Anything published while we were not subscribed is lost
+                self.local.clear()
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message.get("type") == "message":
+                        event = _cache_loads(message["data"])
+                        self.local.delete(*event.get("keys", []))
+                        self.local.invalidate_tags(*event.get("tags", []))
+            except Exception as exc:
+                CACHE_ERRORS.inc(op="subscribe")
+                print(f"⚠️ Cache invalidation listener error (reconnecting): {exc}")
+                time.sleep(1)
+
+    def get(self, key: str, default=None):
+        self._ensure_listener()
+        value = self.local.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        try:
+            raw = self.r.get(self._k(key))
+        except Exception:
+            CACHE_ERRORS.inc(op="get")
+            return default
+        if raw is None:
+            return default
+        entry = _cache_loads(raw)
+        remaining = entry["e"] - time.time()
+        if remaining > 0:
+            self.local.set(key, entry["v"], min(remaining, self.local_ttl), entry["t"])
+        return entry["v"]
+
+    def set(self, key: str, value, ttl: float, tags=()):
+        self._ensure_listener()
+        tags = list(tags)
+        payload = _cache_dumps({"v": value, "t": tags, "e": time.time() + ttl})
+        try:
+            pipe = self.r.pipeline(transaction=False)
+            pipe.set(self._k(key), payload, px=int(ttl * 1000))
+            for tag in tags:
+                pipe.sadd(self._tag_k(tag), key)
+                pipe.pexpire(self._tag_k(tag), int(CACHE_TAG_TTL_S * 1000))
+            pipe.execute()
+        except Exception:
+            CACHE_ERRORS.inc(op="set")
+            return
+        self.local.set(key, value, min(ttl, self.local_ttl), tags)
+
+    def delete(self, *keys):
+        self.local.delete(*keys)
+        try:
+            pipe = self.r.pipeline(transaction=False)
+            pipe.delete(*[self._k(k) for k in keys])
+            pipe.publish(self.channel, _cache_dumps({"keys": list(keys)}))
+            pipe.execute()
+        except Exception:
+            CACHE_ERRORS.inc(op="delete")
+
+    def invalidate_tags(self, *tags):
+        self.local.invalidate_tags(*tags)
+        try:
+            pipe = self.r.pipeline(transaction=False)
+            for tag in tags:
+                pipe.smembers(self._tag_k(tag))
+            members = pipe.execute()
+            keys = {m.decode() if isinstance(m, bytes) else m for group in members for m in group}
+            pipe = self.r.pipeline(transaction=False)
+            pipe.delete(*[self._k(k) for k in keys], *[self._tag_k(t) for t in tags])
+            pipe.publish(self.channel, _cache_dumps({"tags": list(tags)}))
+            pipe.execute()
+        except Exception:
+            CACHE_ERRORS.inc(op="invalidate")
+
+    def _load(self, key, loader, ttl, tags):
+        # Cross-worker single flight: SET NX a lock; losers poll for the value
+        lock_key = self.prefix + "lock:" + key
+        token = uuid.uuid4().hex
+        try:
+            acquired = self.r.set(lock_key, token, nx=True, px=int(CACHE_LOCK_TTL_S * 1000))
+        except Exception:
+            CACHE_ERRORS.inc(op="lock")
+            return super()._load(key, loader, ttl, tags)
+        if acquired:
+            try:
+                return super()._load(key, loader, ttl, tags)
+            finally:
+                try:
+                    if self.r.get(lock_key) in (token, token.encode()):
+                        self.r.delete(lock_key)
+                except Exception:
+                    CACHE_ERRORS.inc(op="unlock")
+        deadline = time.monotonic() + CACHE_LOCK_TTL_S
+        while time.monotonic() < deadline:
+            time.sleep(0.025)
+            value = self.get(key, _MISSING)
+            if value is not _MISSING:
+                return value
+            try:
+                if not self.r.exists(lock_key):
+                    break
+            except Exception:
+                break
+        # Holder died or gave up without storing anything: load it ourselves
+        return super()._load(key, loader, ttl, tags)
+
+def create_cache(url: str):
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        try:
+            import redis
+        except ImportError:
+            print("⚠️ CACHE_URL points at Redis but the redis package is missing; using the in-memory cache")
+            return MemoryCache()
+        client = redis.Redis.from_url(url, socket_timeout=1.0, socket_connect_timeout=1.0, health_check_interval=30)
+        print("🧠 Shared cache: Redis")
+        return RedisCache(client)
+    return MemoryCache()
+
+CACHE = create_cache(CACHE_URL)
+
 # ==========================================
 # 2. GLOBAL HELPERS (SHEETS, TIME, NOTIFICATIONS)
 # ==========================================
 
 SHEETS_CLIENT = None
+_SHEETS_INIT_DONE = False
+_INTEGRATION_LOCK = threading.Lock()
 
 def init_google_sheets():
     global SHEETS_CLIENT
     if os.path.exists("google_credentials.json"):
         try:
+            import gspread
+            from oauth2client.service_account import ServiceAccountCredentials
             scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
             creds = ServiceAccountCredentials.from_json_keyfile_name("google_credentials.json", scope)
             SHEETS_CLIENT = gspread.authorize(creds)
@@ -132,6 +961,16 @@ def init_google_sheets():
     else:
         print("⚠️ Notice: google_credentials.json not found. Sheets integration disabled.")
 
+def get_sheets_client():
+    """Connect to Sheets on first use (once per process); None if disabled."""
+    global _SHEETS_INIT_DONE
+    if not _SHEETS_INIT_DONE:
+        with _INTEGRATION_LOCK:
+            if not _SHEETS_INIT_DONE:
+                init_google_sheets()
+                _SHEETS_INIT_DONE = True
+    return SHEETS_CLIENT
+
 # --- DATE HELPER ---
 def get_current_week_start():
     today = datetime.now(IST)
@@ -140,10 +979,11 @@ def get_current_week_start():
 
 # --- ROBUST SHEET HELPERS ---
 def append_issue_to_sheet(issue_data, user_data):
-    if not SHEETS_CLIENT:
+    client = get_sheets_client()
+    if not client:
         return
     try:
-        sheet = SHEETS_CLIENT.open("CampusFix_Issues_Database").sheet1
+        sheet = client.open("CampusFix_Issues_Database").sheet1
         try:
             headers = sheet.row_values(1)
         except Exception:
@@ -172,10 +1012,11 @@ def append_issue_to_sheet(issue_data, user_data):
         print(f"❌ Failed to log issue: {exc}")
 
 def append_rating_to_sheet(rating_data, user_data):
-    if not SHEETS_CLIENT:
+    client = get_sheets_client()
+    if not client:
         return
     try:
-        sheet = SHEETS_CLIENT.open("CampusFix_Mess_Ratings").sheet1
+        sheet = client.open("CampusFix_Mess_Ratings").sheet1
         try:
             headers = sheet.row_values(1)
         except Exception:
@@ -200,33 +1041,54 @@ def append_rating_to_sheet(rating_data, user_data):
     except Exception as exc:
         print(f"❌ Failed to log rating: {exc}")
 
-email_conf = ConnectionConfig(
-    MAIL_USERNAME = "godayush10@gmail.com",
-    MAIL_PASSWORD = os.getenv("MAIL_PASSWORD"),
-    MAIL_FROM = "admin@campusfix.com",
-    MAIL_PORT = 587,
-    MAIL_SERVER = "smtp.gmail.com",
-    MAIL_STARTTLS = True,
-    MAIL_SSL_TLS = False,
-    USE_CREDENTIALS = True,
-    VALIDATE_CERTS = True
-)
+email_conf = None
+
+def get_email_conf():
+    global email_conf
+    if email_conf is None:
+        from fastapi_mail import ConnectionConfig
+        email_conf = ConnectionConfig(
+            MAIL_USERNAME = "godayush10@gmail.com",
+            MAIL_PASSWORD = os.getenv("MAIL_PASSWORD"),
+            MAIL_FROM = "admin@campusfix.com",
+            MAIL_PORT = 587,
+            MAIL_SERVER = "smtp.gmail.com",
+            MAIL_STARTTLS = True,
+            MAIL_SSL_TLS = False,
+            USE_CREDENTIALS = True,
+            VALIDATE_CERTS = True
+        )
+    return email_conf
 
 firebase_app = None
-if os.path.exists("serviceAccountKey.json"):
-    try:
-        cred = credentials.Certificate("serviceAccountKey.json")
-        firebase_app = firebase_admin.initialize_app(cred)
-        print("✅ Firebase Initialized")
-    except Exception as exc:
-        print(f"⚠️ Firebase Error: {exc}")
-else:
-    print("⚠️ Notice: serviceAccountKey.json not found. Push notifications disabled.")
+_FIREBASE_INIT_DONE = False
+
+def get_firebase_app():
+    """Initialise firebase_admin on first use (once per process); None if disabled."""
+    global firebase_app, _FIREBASE_INIT_DONE
+    if _FIREBASE_INIT_DONE:
+        return firebase_app
+    with _INTEGRATION_LOCK:
+        if not _FIREBASE_INIT_DONE:
+            if os.path.exists("serviceAccountKey.json"):
+                try:
+                    import firebase_admin
+                    from firebase_admin import credentials
+                    cred = credentials.Certificate("serviceAccountKey.json")
+                    firebase_app = firebase_admin.initialize_app(cred)
+                    print("✅ Firebase Initialized")
+                except Exception as exc:
+                    print(f"⚠️ Firebase Error: {exc}")
+            else:
+                print("⚠️ Notice: serviceAccountKey.json not found. Push notifications disabled.")
+            _FIREBASE_INIT_DONE = True
+    return firebase_app
 
 async def send_notification(email: str, subject: str, body: str):
     if email:
+        from fastapi_mail import FastMail, MessageSchema, MessageType
         message = MessageSchema(subject=subject, recipients=[email], body=body, subtype=MessageType.plain)
-        fm = FastMail(email_conf)
+        fm = FastMail(get_email_conf())
         try:
             await fm.send_message(message)
             print(f"✅ Email sent to {email}")
@@ -235,6 +1097,30 @@ async def send_notification(email: str, subject: str, body: str):
     # keep a minimal push log that doesn't rely on 'e'
     print(f"📲 [Push Log] To: {email} | Msg: {subject}")
 
+EMAIL_BATCH_CONCURRENCY = int(os.getenv("EMAIL_BATCH_CONCURRENCY", "4"))
+
+async def send_notifications_batch(messages: list):
+    """Send [(email, subject, body), ...], at most EMAIL_BATCH_CONCURRENCY at a time."""
+    from fastapi_mail import FastMail, MessageSchema, MessageType
+    fm = FastMail(get_email_conf())
+    slots = asyncio.Semaphore(EMAIL_BATCH_CONCURRENCY)
+
+    async def send(email, subject, body):
+        message = MessageSchema(subject=subject, recipients=[email], body=body, subtype=MessageType.plain)
+        async with slots:
+            try:
+                await fm.send_message(message)
+                return True
+            except Exception:
+                logger.exception("Email to %s failed", email)
+                return False
+
+    results = await asyncio.gather(*(send(*m) for m in messages if m[0]))
+    sent = sum(results)
+    if sent < len(results):
+        logger.error("Email batch: %d of %d emails failed", len(results) - sent, len(results))
+    print(f"📲 [Push Log] Batch: {sent}/{len(messages)} emails sent")
+
 # ==========================================
 # 3. DATABASE MODELS
 # ==========================================
@@ -277,21 +1163,40 @@ class MessRating(Base):
     quality = Column(Integer)
     review = Column(Text, nullable=True)
     suggestions = Column(Text, nullable=True)
-    image_data = Column(Text, nullable=True)
-    from sqlalchemy import func
+    image_data = Column(Text, nullable=True)     # legacy base64 data URL
+    image_id = Column(String, nullable=True)     # stored_images.id (uploads via POST /images)
+    # Scored from review + suggestions when the rating is stored (sentiment.py);
+    # NULL sentiment = no text to score
+    sentiment = Column(Float, nullable=True)
+    topics = Column(ARRAY(String), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())   # bumped by trigger, see SCHEMA_PATCHES
+    # One vote per student per mess per week (re-votes overwrite the old one)
+    __table_args__ = (UniqueConstraint("user_id", "mess_name", "week_start", name="uq_mess_rating_user_week"),)
+
+class MessWeeklyStat(Base):
+    """Running per-mess weekly sums, kept in step with mess_ratings on every write."""
+    __tablename__ = "mess_weekly_stats"
+    mess_name = Column(String, primary_key=True)
+    week_start = Column(String, primary_key=True)
+    votes = Column(Integer, nullable=False, default=0)
+    hygiene_sum = Column(Integer, nullable=False, default=0)
+    taste_sum = Column(Integer, nullable=False, default=0)
+    quality_sum = Column(Integer, nullable=False, default=0)
 
 
 class Comment(Base):
     __tablename__ = "comments"
     id = Column(Integer, primary_key=True, index=True)
     text = Column(Text)
-    from sqlalchemy import func
     created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())   # bumped by trigger, see SCHEMA_PATCHES
     issue_id = Column(Integer, ForeignKey("issues.id"))
     user_id = Column(Integer, ForeignKey("users.id"))
     user = relationship("User")
 
+ISSUE_PRIORITY_RANK_SQL = "CASE priority WHEN 'High' THEN 1 WHEN 'Medium' THEN 2 ELSE 3 END"
+
 class Issue(Base):
     __tablename__ = "issues"
     id = Column(Integer, primary_key=True, index=True)
@@ -301,19 +1206,150 @@ class Issue(Base):
     sub_location = Column(String)
     specific_location = Column(String)
     priority = Column(String)
+    # Feed sort key: High=1, Medium=2, anything else 3. Generated, so the raw-SQL
+    # escalation UPDATE keeps it current without knowing it exists.
+    priority_rank = Column(SmallInteger, Computed(ISSUE_PRIORITY_RANK_SQL, persisted=True))
     status = Column(String, default=IssueStatus.PENDING)
-    image_data = Column(Text, nullable=True)
-    from sqlalchemy import func
+    image_data = Column(Text, nullable=True)     # legacy base64 data URL
+    image_id = Column(String, nullable=True)     # stored_images.id (uploads via POST /images)
+    # From the campus gazetteer (campus_map.py); NULL when the place is unknown
+    lat = Column(Float, nullable=True)
+    lng = Column(Float, nullable=True)
+    map_cell = Column(BigInteger, nullable=True)  # Z-order grid cell, see GET /issues/map
     created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())   # bumped by trigger, see SCHEMA_PATCHES
     owner_id = Column(Integer, ForeignKey("users.id"))
     rating = Column(Integer, nullable=True)
     review = Column(Text, nullable=True)
+    # Denormalised thread summary for the feed (kept current by add_comment)
+    comment_count = Column(Integer, default=0)
+    last_comment_at = Column(DateTime(timezone=True), nullable=True)
+    last_comment_user = Column(String, nullable=True)
+    last_comment_preview = Column(String, nullable=True)
     owner = relationship("User")
     comments = relationship("Comment", order_by=Comment.created_at.asc())
 
-# Move schema creation into a safe retry helper
-import time
-from sqlalchemy.exc import OperationalError
+class StoredImage(Base):
+    """An uploaded photo after transcoding (EXIF stripped) plus its thumbnail."""
+    __tablename__ = "stored_images"
+    id = Column(String, primary_key=True)        # random 128-bit hex: the URL is the capability
+    owner_id = Column(Integer, ForeignKey("users.id"), index=True)
+    content_type = Column(String, nullable=False)
+    width = Column(Integer)
+    height = Column(Integer)
+    data = deferred(Column(LargeBinary, nullable=False))
+    thumb = deferred(Column(LargeBinary, nullable=False))
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+class CreditLedgerEntry(Base):
+    """Append-only trust-score history; users.credit_score is its running sum."""
+    __tablename__ = "credit_ledger"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    delta = Column(Float, nullable=False)
+    reason = Column(String, nullable=False)     # issue_solved | issue_defected | opening_balance
+    issue_id = Column(Integer, nullable=True)   # no FK: history outlives deleted issues
+    actor_id = Column(Integer, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+# create_all() never touches tables that already exist, so constraints and
+# columns added after the first deploy are applied here. Every statement must be
+# idempotent; a failing patch is logged and skipped.
+SCHEMA_PATCHES = [
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_mess_rating_user_week ON mess_ratings (user_id, mess_name, week_start)",
+    # Admin student directory: filters + keyset on id, prefix search on name / enrollment no.
+    "CREATE INDEX IF NOT EXISTS ix_users_role_hostel ON users (role, hostel, id)",
+    "CREATE INDEX IF NOT EXISTS ix_users_role_semester ON users (role, semester, id)",
+    "CREATE INDEX IF NOT EXISTS ix_users_role_department ON users (role, department, id)",
+    "CREATE INDEX IF NOT EXISTS ix_users_pending_hostel ON users (role, id) WHERE requested_hostel IS NOT NULL",
+    "CREATE INDEX IF NOT EXISTS ix_users_name_prefix ON users (lower(full_name) text_pattern_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_users_enrollment_prefix ON users (lower(enrollment_no) text_pattern_ops)",
+    # Comment thread summary on issues + cursor pagination of a thread.
+    "ALTER TABLE issues ADD COLUMN IF NOT EXISTS comment_count INTEGER",
+    "ALTER TABLE issues ADD COLUMN IF NOT EXISTS last_comment_at TIMESTAMPTZ",
+    "ALTER TABLE issues ADD COLUMN IF NOT EXISTS last_comment_user VARCHAR",
+    "ALTER TABLE issues ADD COLUMN IF NOT EXISTS last_comment_preview VARCHAR",
+    "CREATE INDEX IF NOT EXISTS ix_comments_issue_id ON comments (issue_id, id)",
+    # One grouped pass; only rows never summarised (comment_count IS NULL) are touched.
+    """UPDATE issues AS i SET
+           comment_count = coalesce(agg.n, 0),
+           last_comment_at = agg.last_at,
+           last_comment_user = agg.last_user,
+           last_comment_preview = agg.last_text
+       FROM issues AS base
+       LEFT JOIN (
+           SELECT DISTINCT ON (c.issue_id) c.issue_id,
+                  count(*) OVER (PARTITION BY c.issue_id) AS n,
+                  c.created_at AS last_at, u.full_name AS last_user, left(c.text, 140) AS last_text
+           FROM comments c LEFT JOIN users u ON u.id = c.user_id
+           ORDER BY c.issue_id, c.created_at DESC, c.id DESC
+       ) AS agg ON agg.issue_id = base.id
+       WHERE i.id = base.id AND i.comment_count IS NULL""",
+    # Trust-score ledger: scores that predate it become an opening balance,
+    # and the leaderboard reads straight off these indexes.
+    "UPDATE users SET credit_score = 0 WHERE credit_score IS NULL",
+    """INSERT INTO credit_ledger (user_id, delta, reason)
+       SELECT u.id, u.credit_score, 'opening_balance' FROM users u
+       WHERE u.credit_score <> 0
+         AND NOT EXISTS (SELECT 1 FROM credit_ledger l WHERE l.user_id = u.id)""",
+    "CREATE INDEX IF NOT EXISTS ix_users_leaderboard ON users (role, credit_score DESC NULLS LAST, id)",
+    "CREATE INDEX IF NOT EXISTS ix_users_hostel_leaderboard ON users (role, hostel, credit_score DESC NULLS LAST, id)",
+    # Uploaded images are referenced by id instead of embedded as base64.
+    "ALTER TABLE issues ADD COLUMN IF NOT EXISTS image_id VARCHAR",
+    "ALTER TABLE mess_ratings ADD COLUMN IF NOT EXISTS image_id VARCHAR",
+    # Incremental export watermark. A trigger keeps updated_at current, so the
+    # raw-SQL updates (status transitions, re-votes, thread summary) need no
+    # changes. Existing rows are backfilled before the trigger exists.
+    "ALTER TABLE issues ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ",
+    "ALTER TABLE comments ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ",
+    "ALTER TABLE mess_ratings ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ",
+    "UPDATE issues SET updated_at = created_at WHERE updated_at IS NULL",
+    "UPDATE comments SET updated_at = created_at WHERE updated_at IS NULL",
+    "UPDATE mess_ratings SET updated_at = created_at WHERE updated_at IS NULL",
+    "ALTER TABLE issues ALTER COLUMN updated_at SET DEFAULT now()",
+    "ALTER TABLE comments ALTER COLUMN updated_at SET DEFAULT now()",
+    "ALTER TABLE mess_ratings ALTER COLUMN updated_at SET DEFAULT now()",
+    """CREATE OR REPLACE FUNCTION campusfix_touch_updated_at() RETURNS trigger AS $$
+       BEGIN
+           NEW.updated_at = now();
+           RETURN NEW;
+       END
+       $$ LANGUAGE plpgsql""",
+    "CREATE OR REPLACE TRIGGER trg_issues_updated_at BEFORE UPDATE ON issues FOR EACH ROW EXECUTE FUNCTION campusfix_touch_updated_at()",
+    "CREATE OR REPLACE TRIGGER trg_comments_updated_at BEFORE UPDATE ON comments FOR EACH ROW EXECUTE FUNCTION campusfix_touch_updated_at()",
+    "CREATE OR REPLACE TRIGGER trg_mess_ratings_updated_at BEFORE UPDATE ON mess_ratings FOR EACH ROW EXECUTE FUNCTION campusfix_touch_updated_at()",
+    "CREATE INDEX IF NOT EXISTS ix_issues_updated_at ON issues (updated_at, id)",
+    "CREATE INDEX IF NOT EXISTS ix_comments_updated_at ON comments (updated_at, id)",
+    "CREATE INDEX IF NOT EXISTS ix_mess_ratings_updated_at ON mess_ratings (updated_at, id)",
+    # Review sentiment / topics, filled at ingest; older rows by backfill_review_sentiment().
+    "ALTER TABLE mess_ratings ADD COLUMN IF NOT EXISTS sentiment DOUBLE PRECISION",
+    "ALTER TABLE mess_ratings ADD COLUMN IF NOT EXISTS topics VARCHAR[]",
+    # Issue feed: numeric priority rank + one ordered index per visibility branch
+    # (see feed_statement), and a partial index for the escalation UPDATE.
+    f"ALTER TABLE issues ADD COLUMN IF NOT EXISTS priority_rank SMALLINT GENERATED ALWAYS AS ({ISSUE_PRIORITY_RANK_SQL}) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_issues_feed ON issues (priority_rank, created_at DESC, id DESC)",
+    "CREATE INDEX IF NOT EXISTS ix_issues_feed_location ON issues (sub_location, priority_rank, created_at DESC, id DESC)",
+    "CREATE INDEX IF NOT EXISTS ix_issues_feed_category ON issues (category, priority_rank, created_at DESC, id DESC)",
+    "CREATE INDEX IF NOT EXISTS ix_issues_feed_owner ON issues (owner_id, priority_rank, created_at DESC, id DESC)",
+    """CREATE INDEX IF NOT EXISTS ix_issues_escalation ON issues (created_at)
+       WHERE priority <> 'High' AND status IN ('Pending', 'In Progress')""",
+    # Campus map: gazetteer coordinates + Z-order grid cell, filled at insert
+    # and for older rows by backfill_issue_locations(). The INCLUDE columns let
+    # the clustering query run as an index-only scan.
+    "ALTER TABLE issues ADD COLUMN IF NOT EXISTS lat DOUBLE PRECISION",
+    "ALTER TABLE issues ADD COLUMN IF NOT EXISTS lng DOUBLE PRECISION",
+    "ALTER TABLE issues ADD COLUMN IF NOT EXISTS map_cell BIGINT",
+    """CREATE INDEX IF NOT EXISTS ix_issues_map_cell ON issues (map_cell)
+       INCLUDE (id, category, status, lat, lng, sub_location, owner_id) WHERE map_cell IS NOT NULL""",
+]
+
+def apply_schema_patches():
+    for stmt in SCHEMA_PATCHES:
+        try:
+            with DB_LANES["background"].connect() as conn:
+                conn.execute(text(stmt))
+        except Exception as exc:
+            print(f"⚠️ Schema patch skipped ({stmt[:60]}...): {exc}")
 
 def create_schema_with_retries(max_retries: int = 5, base_delay: float = 2.0):
     """
@@ -322,17 +1358,19 @@ def create_schema_with_retries(max_retries: int = 5, base_delay: float = 2.0):
     """
     for attempt in range(1, max_retries + 1):
         try:
-            Base.metadata.create_all(bind=engine)
+            Base.metadata.create_all(bind=DB_LANES["background"])
+            apply_schema_patches()
+            seed_mess_weekly_stats()
             print("✅ DB schema ensured")
-            return
+            return True
         except OperationalError as exc:
             wait = base_delay * (2 ** (attempt - 1))
             print(f"⚠️ DB connect attempt {attempt}/{max_retries} failed: {exc!r}. Retrying in {wait}s...")
             time.sleep(wait)
     # Final fallback: don't raise — allow app to start without blocking
     print("❌ Could not connect to DB after retries — continuing without schema creation. Run migrations manually.")
+    return False
 
-from pydantic import ConfigDict
 # ==========================================
 # 4. PYDANTIC SCHEMAS
 # ==========================================
@@ -376,10 +1414,18 @@ class IssueCreate(BaseModel):
     specific_location: str
     priority: str
     image_data: Optional[str] = None
+    image_id: Optional[str] = None
 
 class IssueUpdateStatus(BaseModel):
     status: str
 
+class IssueStatusChange(BaseModel):
+    id: int
+    status: str
+
+class IssueBulkStatusUpdate(BaseModel):
+    updates: List[IssueStatusChange]
+
 class CommentCreate(BaseModel):
     text: str
 
@@ -402,6 +1448,7 @@ class MessRatingCreate(BaseModel):
     review: Optional[str] = None
     suggestions: Optional[str] = None
     image_data: Optional[str] = None
+    image_id: Optional[str] = None
 
 class IssueResponse(IssueCreate):
     id: int
@@ -412,6 +1459,8 @@ class IssueResponse(IssueCreate):
     review: Optional[str] = None
     comments: List[CommentResponse] = []
     owner_credit_score: Optional[float] = 0.0
+    lat: Optional[float] = None      # campus map position, when the place is known
+    lng: Optional[float] = None
     model_config = ConfigDict(from_attributes=True)
 
 class DashboardStats(BaseModel):
@@ -432,22 +1481,30 @@ class ChatMessage(BaseModel):
 class ChatRequest(BaseModel):
     messages: List[ChatMessage]
 
+# --- BATCH MODELS ---
+class BatchOperation(BaseModel):
+    method: str                 # as the single-request route: "POST", "PATCH", "PUT"
+    path: str                   # e.g. "/issues/42/comments"
+    body: dict = {}
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation]
+    atomic: bool = False        # True: any failure rolls back every operation
+
 # ==========================================
 # 5. AUTHENTICATION & APP INIT
 # ==========================================
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
-from contextlib import asynccontextmanager
-
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    # Startup
-    init_google_sheets()
+# Set once the schema (tables + patches) has been ensured; /ready reports it.
+SCHEMA_READY = threading.Event()
 
+def prepare_database():
+    """Startup DB work; runs in a background thread so the port opens immediately."""
     # Try DB once – NON-FATAL
     try:
-        with engine.connect() as conn:
+        with DB_LANES["background"].connect() as conn:
             try:
                 conn.execute(text("SET search_path TO public"))
             except Exception as ex:
@@ -456,18 +1513,332 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         print(f"⚠️ Initial DB connection failed (non-fatal): {e}")
 
-    # Create tables with retries
-    create_schema_with_retries(max_retries=5, base_delay=2.0)
+    # Create tables with retries (time.sleep here no longer blocks the event loop)
+    if create_schema_with_retries(max_retries=5, base_delay=2.0):
+        SCHEMA_READY.set()
+        # Ratings stored before sentiment scoring existed (a no-op afterwards)
+        try:
+            backfill_review_sentiment()
+        except Exception as exc:
+            print(f"⚠️ Review sentiment backfill skipped: {exc}")
+        # Issues filed before the campus map existed (likewise)
+        try:
+            backfill_issue_locations()
+        except Exception as exc:
+            print(f"⚠️ Issue location backfill skipped: {exc}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup: nothing blocking. Sheets / Firebase / mail / ReportLab load lazily.
+    threading.Thread(target=prepare_database, name="schema-init", daemon=True).start()
+    if REPLICA_LANES:
+        threading.Thread(target=replica_monitor, name="replica-monitor", daemon=True).start()
 
     yield
 
-    try:
-        engine.dispose()
-    except Exception:
-        pass
+    _REPLICA_STOP.set()
+
+    for lane_engine in DB_LANES.values():
+        try:
+            lane_engine.dispose()
+        except Exception:
+            pass
+
+# --- RESPONSE COMPRESSION ---
+# Issue feeds, user lists and CSV reports are mostly text, so they shrink
+# 5-10x. Brotli is used when the package is installed and the client asks for
+# it; everything else falls back to Starlette's gzip. Tiny bodies are left
+# alone because compressing them costs more than it saves.
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.brotli_quality = brotli_quality
+        self.gzip = GZipMiddleware(app, minimum_size=minimum_size, compresslevel=gzip_level)
+
+    async def __call__(self, scope, receive, send):
+        # Stored images are already WebP/JPEG; recompressing only burns CPU
+        if scope["type"] != "http" or scope.get("path", "").startswith("/images/"):
+            await self.app(scope, receive, send)
+            return
+        accept = ""
+        for key, value in scope.get("headers", []):
+            if key == b"accept-encoding":
+                accept = value.decode("latin-1").lower()
+                break
+        if brotli is not None and "br" in accept:
+            await _BrotliResponder(self.app, self.minimum_size, self.brotli_quality)(scope, receive, send)
+        else:
+            await self.gzip(scope, receive, send)
+
+class _BrotliResponder:
+    def __init__(self, app, minimum_size: int, quality: int):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.quality = quality
+        self.start_message = None
+        self.compressor = None
+        self.passthrough = False
+
+    async def __call__(self, scope, receive, send):
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    async def send_compressed(self, message):
+        if message["type"] == "http.response.start":
+            # Hold the headers until we know the body size
+            self.start_message = message
+            headers = {k.lower(): v for k, v in message.get("headers", [])}
+            self.passthrough = b"content-encoding" in headers
+            return
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.start_message is not None:
+            start, self.start_message = self.start_message, None
+            if self.passthrough or (not more_body and len(body) < self.minimum_size):
+                self.passthrough = True
+                await self.send(start)
+                await self.send(message)
+                return
+            headers = [(k, v) for k, v in start.get("headers", []) if k.lower() != b"content-length"]
+            headers += [(b"content-encoding", b"br"), (b"vary", b"Accept-Encoding")]
+            if not more_body:
+                payload = brotli.compress(body, quality=self.quality)
+                headers.append((b"content-length", str(len(payload)).encode()))
+                await self.send({**start, "headers": headers})
+                await self.send({"type": "http.response.body", "body": payload})
+                return
+            self.compressor = brotli.Compressor(quality=self.quality)
+            await self.send({**start, "headers": headers})
+
+        if self.passthrough:
+            await self.send(message)
+            return
+        chunk = self.compressor.process(body)
+        chunk += self.compressor.flush() if more_body else self.compressor.finish()
+        await self.send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+# --- RATE LIMITING ---
+# /chat (paid LLM call), /reports/download (PDF build) and /login (bcrypt)
+# are throttled with token buckets: one per user (JWT subject, no DB lookup)
+# and one per client IP. A request is let through only when every bucket it
+# touches holds `cost` tokens, and then each loses that many. The IP bucket
+# is generous because a whole hostel can sit behind one NAT address; /login
+# additionally charges a per-account bucket against password guessing.
+#
+# Buckets live in process memory, or in Redis when CACHE_URL points at one,
+# so every worker shares them. Redis failures fall back to the local buckets.
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() != "false"
+# Render puts one proxy in front of us: the client is the last X-Forwarded-For hop
+RATE_LIMIT_PROXY_HOPS = int(os.getenv("RATE_LIMIT_PROXY_HOPS", "1"))
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+RATE_LIMIT_RULES = {
+    "user": rate_rule(os.getenv("RATE_LIMIT_USER", "60/60")),
+    "ip": rate_rule(os.getenv("RATE_LIMIT_IP", "1200/60")),
+    "account": rate_rule(os.getenv("RATE_LIMIT_ACCOUNT", "50/300")),
+}
+
+# (method, path) -> tokens per request. With the defaults a user gets a burst
+# of 10 chats then one per 6 s, 3 reports then one per 20 s; an account gets
+# 5 login attempts then one a minute.
+RATE_LIMIT_COSTS = {
+    ("POST", "/chat"): 6,
+    ("GET", "/reports/download"): 20,
+    ("POST", "/login"): 10,
+}
+
+RATE_LIMITED = Counter("campusfix_rate_limited_total", "Requests rejected with 429, by route and bucket scope.")
+
+def create_rate_limiter(cache):
+    if isinstance(cache, RedisCache):
+        return RedisRateLimiter(cache.r, RATE_LIMIT_RULES, CACHE_PREFIX, errors=CACHE_ERRORS)
+    return MemoryRateLimiter(RATE_LIMIT_RULES, max_keys=RATE_LIMIT_MAX_KEYS)
+
+RATE_LIMITER = create_rate_limiter(CACHE)
+
+# Caller identity for the request-level middlewares (rate limiting,
+# idempotency, coalescing), read straight off the ASGI scope
+def _client_ip(scope):
+    if RATE_LIMIT_PROXY_HOPS:
+        for key, value in scope.get("headers", []):
+            if key == b"x-forwarded-for":
+                hops = [h.strip() for h in value.decode("latin-1").split(",") if h.strip()]
+                if hops:
+                    return hops[-min(RATE_LIMIT_PROXY_HOPS, len(hops))]
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+def _bearer_subject(scope):
+    for key, value in scope.get("headers", []):
+        if key == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                try:
+                    return _token_email(token.strip())
+                except Exception:
+                    return None     # the route itself answers 401
+    return None
+
+def _request_caller(scope):
+    return _bearer_subject(scope) or _client_ip(scope)
+
+# --- ADMISSION CONTROL / LOAD SHEDDING ---
+# When Supabase slows down, requests used to queue for a pooled connection
+# until pool_timeout and then fail anyway, while clients retried on top. Now
+# every non-critical request must fit under an in-flight limit that adapts to
+# how long the interactive pool makes callers wait (see admission.py). Over
+# the limit a normal request may wait ADMISSION_QUEUE_TIMEOUT_S in a short
+# FIFO queue for a slot; otherwise we answer 503 + Retry-After immediately.
+#
+#   critical – auth, issue creation, probes: never shed, not counted
+#   normal   – everything else, up to the limit (+ the queue)
+#   low      – reports, exports, analytics: only up to ADMISSION_LOW_SHARE of
+#              the limit, and not at all while the reporting lane is backed up
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() != "false"
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "64"))
+ADMISSION_MIN_IN_FLIGHT = int(os.getenv("ADMISSION_MIN_IN_FLIGHT", "4"))
+ADMISSION_TARGET_WAIT_S = float(os.getenv("ADMISSION_TARGET_WAIT_S", "0.05"))
+ADMISSION_LOW_SHARE = float(os.getenv("ADMISSION_LOW_SHARE", "0.5"))
+ADMISSION_LOW_MAX_WAIT_S = float(os.getenv("ADMISSION_LOW_MAX_WAIT_S", "1.0"))
+ADMISSION_ADJUST_S = float(os.getenv("ADMISSION_ADJUST_S", "0.5"))
+ADMISSION_RETRY_AFTER_S = int(os.getenv("ADMISSION_RETRY_AFTER_S", "5"))
+ADMISSION_QUEUE_TIMEOUT_S = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_S", "0.25"))
+ADMISSION_QUEUE_MAX = int(os.getenv("ADMISSION_QUEUE_MAX", "32"))
+
+ADMISSION_CRITICAL = {
+    ("POST", "/login"), ("POST", "/google-login"), ("POST", "/register"), ("POST", "/issues"),
+    ("GET", "/health"), ("HEAD", "/health"), ("GET", "/ready"), ("HEAD", "/ready"), ("GET", "/metrics"),
+}
+ADMISSION_LOW_PREFIXES = (
+    "/reports/", "/export/", "/mess/analytics", "/mess/trends", "/leaderboard",
+    "/admin/mess/", "/admin/credit/",
+)
+
+def pool_wait(lane: str):
+    pressure = POOL_PRESSURE.get(lane)
+    return pressure.value() if pressure is not None else 0.0
+
+ADMISSION = AdmissionController(
+    ADMISSION_MAX_IN_FLIGHT, ADMISSION_MIN_IN_FLIGHT, ADMISSION_TARGET_WAIT_S, pool_wait,
+    low_share=ADMISSION_LOW_SHARE, low_max_wait_s=ADMISSION_LOW_MAX_WAIT_S,
+    adjust_s=ADMISSION_ADJUST_S, max_queue=ADMISSION_QUEUE_MAX,
+)
+
+ADMISSION_SHED = Counter("campusfix_admission_shed_total", "Requests refused with 503 by admission control, by priority and reason.")
+ADMISSION_STATE = Gauge(
+    "campusfix_admission", "Adaptive in-flight limit, current admitted requests and queued requests.",
+    fn=lambda: [({"state": "limit"}, ADMISSION.limit), ({"state": "in_flight"}, ADMISSION.in_flight),
+                ({"state": "queued"}, ADMISSION.queued)],
+)
+
+# --- IDEMPOTENCY KEYS ---
+# On flaky hostel Wi-Fi the app retries writes whose response it never saw,
+# and each retry used to create another issue / comment / rating (plus the
+# Sheets rows and emails that go with it). A client may now send
+# `Idempotency-Key: <unique value>` on the routes below; a retry replays the
+# first response instead of running again (see idempotency.py). Keys are
+# scoped to the caller (JWT subject, else client IP) and route. Records live
+# in the cache backend: Redis when CACHE_URL points at one, otherwise this
+# process.
+IDEMPOTENCY_TTL_S = float(os.getenv("IDEMPOTENCY_TTL_S", str(24 * 3600)))
+IDEMPOTENCY_LOCK_TTL_S = float(os.getenv("IDEMPOTENCY_LOCK_TTL_S", "60"))   # a crashed first attempt frees the key after this
+IDEMPOTENCY_WAIT_S = float(os.getenv("IDEMPOTENCY_WAIT_S", "15"))
+
+IDEMPOTENT_ROUTES = [
+    ("POST", re.compile(r"^/issues$")),
+    ("POST", re.compile(r"^/issues/\d+/comments$")),
+    ("PATCH", re.compile(r"^/issues/\d+/rate$")),
+    ("POST", re.compile(r"^/mess/rate$")),
+    ("POST", re.compile(r"^/batch$")),
+]
+
+IDEMPOTENCY_REQUESTS = Counter("campusfix_idempotency_requests_total", "Requests carrying Idempotency-Key, by outcome.")
+
+def create_idempotency_store(cache):
+    if isinstance(cache, RedisCache):
+        return RedisIdempotencyStore(cache.r, IDEMPOTENCY_TTL_S, IDEMPOTENCY_LOCK_TTL_S, CACHE_PREFIX)
+    return MemoryIdempotencyStore(IDEMPOTENCY_TTL_S, IDEMPOTENCY_LOCK_TTL_S)
+
+IDEMPOTENCY_STORE = create_idempotency_store(CACHE)
+
+# --- REQUEST COALESCING ---
+# At mealtimes hundreds of students open /mess/analytics within seconds, and
+# at 9 am every admin dashboard loads /stats. Identical concurrent GETs on the
+# routes below now run once: the first becomes the leader, later ones await
+# its response instead of each taking a worker thread, a pooled connection
+# and a serialisation pass. 200s are then served from a short micro-cache.
+#
+# "Identical" = same path, same (sorted) query and same permission scope:
+#   public – response does not depend on the caller (no auth on the route)
+#   user   – response is per caller (JWT subject)
+# A caller that has just written (here, or pinned to the primary by
+# ReadYourWritesMiddleware) bypasses both, so it always sees its own write.
+# The data cache under the handlers still coalesces across workers; this
+# layer saves the per-request work in front of it.
+COALESCE_ENABLED = os.getenv("COALESCE_ENABLED", "true").lower() != "false"
+COALESCE_MICRO_TTL_S = float(os.getenv("COALESCE_MICRO_TTL_S", "1.0"))
+COALESCE_MAX_ENTRIES = 2000
+
+COALESCED_ROUTES = {
+    "/mess/analytics": "public",
+    "/mess/trends": "public",
+    "/stats": "user",
+    "/leaderboard": "user",
+    "/issues": "user",
+    "/issues/map": "user",
+}
+
+COALESCE_REQUESTS = Counter(
+    "campusfix_coalesce_requests_total",
+    "Coalescible GETs by route and result (leader / coalesced / micro_cache / bypass).",
+)
+
+COALESCER = RequestCoalescer(COALESCE_MICRO_TTL_S, COALESCE_MAX_ENTRIES, COALESCE_REQUESTS)
+
+COALESCE_RATIO = Gauge(
+    "campusfix_coalesce_ratio", "Share of coalescible GETs answered from another request's work, by route.",
+    fn=COALESCER.ratios,
+)
+
+def _pinned_to_primary():
+    stats = REQUEST_STATS.get()
+    return bool(stats and stats.get("read_primary"))
 
 # Single app instance using lifespan
-app = FastAPI(lifespan=lifespan)
+# Routes that return plain dicts/lists are serialised with orjson when available.
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+
+# Innermost, so recorded responses are stored uncompressed
+app.add_middleware(
+    IdempotencyMiddleware, store=IDEMPOTENCY_STORE, routes=IDEMPOTENT_ROUTES, caller=_request_caller,
+    requests=IDEMPOTENCY_REQUESTS, errors=CACHE_ERRORS, wait_s=IDEMPOTENCY_WAIT_S,
+)
+# Inside CORS, so browsers can read a 429 / 503 and its Retry-After.
+# Shedding runs first: it is the cheaper check.
+app.add_middleware(
+    RateLimitMiddleware, limiter=RATE_LIMITER, costs=RATE_LIMIT_COSTS, client_ip=_client_ip,
+    subject=_bearer_subject, rejected=RATE_LIMITED, enabled=RATE_LIMIT_ENABLED,
+)
+app.add_middleware(
+    AdmissionMiddleware, controller=ADMISSION, critical=ADMISSION_CRITICAL, low_prefixes=ADMISSION_LOW_PREFIXES,
+    shed=ADMISSION_SHED, queue_timeout_s=ADMISSION_QUEUE_TIMEOUT_S, retry_after_s=ADMISSION_RETRY_AFTER_S,
+    enabled=ADMISSION_ENABLED,
+)
+# Shared responses are captured before compression and CORS, which depend on
+# each caller's own Accept-Encoding / Origin; micro-cache hits skip shedding
+app.add_middleware(
+    CoalescingMiddleware, coalescer=COALESCER, routes=COALESCED_ROUTES, caller=_request_caller,
+    pinned=_pinned_to_primary, enabled=COALESCE_ENABLED,
+)
+app.add_middleware(CompressionMiddleware, minimum_size=COMPRESS_MIN_SIZE)
 
 app.add_middleware(
     CORSMiddleware,
@@ -482,8 +1853,168 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Read-Primary-Until", "X-DB-Read", "Retry-After", "Idempotent-Replayed", "X-Next-Cursor", "X-Export-Until"],
 )
 
+def _may_profile(stats: dict):
+    # Header-triggered profiles are only honoured for authenticated staff
+    return stats.get("role") not in (None, "student")
+
+class MetricsMiddleware:
+    """Outermost layer: latency, status and SQL count per route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = {"sql": 0, "profile": None, "role": None, "path": scope.get("path")}
+        if SQL_PROFILE_ALL or (b"x-sql-profile", b"1") in scope.get("headers", []):
+            stats["profile"] = []
+        token = REQUEST_STATS.set(stats)
+        start = time.perf_counter()
+        state = {"code": 500, "done": False}
+
+        def record():
+            # Runs once, when the last body chunk goes out: background tasks
+            # (emails, Sheets) execute after that and must not count as latency.
+            if state["done"]:
+                return
+            state["done"] = True
+            elapsed = time.perf_counter() - start
+            HTTP_IN_FLIGHT.dec()
+            route = scope.get("route")
+            # Templates ("/issues/{id}/status"), never raw paths, keep label cardinality bounded
+            path = getattr(route, "path", None) or "<unmatched>"
+            method = scope.get("method", "GET")
+            HTTP_LATENCY.observe(elapsed, route=path, method=method)
+            HTTP_REQUESTS.inc(route=path, method=method, status=state["code"])
+            SQL_PER_REQUEST.observe(stats["sql"], route=path, method=method)
+            if stats["profile"] is not None and (SQL_PROFILE_ALL or _may_profile(stats)):
+                SQL_REQUEST_PROFILES.append({
+                    "route": path, "method": method, "status": state["code"],
+                    "ms": round(elapsed * 1000, 2), "at": datetime.now(IST).isoformat(),
+                    **summarise_sql_profile(stats["profile"]),
+                })
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["code"] = message["status"]
+                if stats["profile"] is not None and _may_profile(stats):
+                    db_ms = sum(st["ms"] for st in stats["profile"])
+                    timing = f'db;dur={db_ms:.1f};desc="{len(stats["profile"])} queries"'
+                    message = {**message, "headers": list(message.get("headers", [])) + [(b"server-timing", timing.encode())]}
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                record()
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUEST_STATS.reset(token)
+            record()
+
+RYW_COOKIE = "cf_read_primary_until"
+
+def _read_primary_until(headers):
+    """Latest "read from primary until" epoch sent by the client (header or cookie)."""
+    until = 0.0
+    for key, value in headers:
+        raw = None
+        if key == b"x-read-primary-until":
+            raw = value.decode("latin-1")
+        elif key == b"cookie":
+            cookie = SimpleCookie()
+            try:
+                cookie.load(value.decode("latin-1"))
+            except Exception:
+                continue
+            if RYW_COOKIE in cookie:
+                raw = cookie[RYW_COOKIE].value
+        if raw:
+            try:
+                until = max(until, float(raw))
+            except ValueError:
+                pass
+    return until
+
+class ReadYourWritesMiddleware:
+    """Pins a client to the primary for READ_YOUR_WRITES_S after each successful write.
+
+    The deadline travels as both a cookie and the X-Read-Primary-Until header
+    (the app echoes the header, since it does not send cookies cross-origin).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not REPLICA_LANES:
+            await self.app(scope, receive, send)
+            return
+
+        now = time.time()
+        until = _read_primary_until(scope.get("headers", []))
+        stats = REQUEST_STATS.get()
+        if stats is not None:
+            # A deadline further out than one window is not ours; ignore it
+            stats["read_primary"] = now < until <= now + READ_YOUR_WRITES_S + 1
+        is_write = scope.get("method", "GET") not in ("GET", "HEAD", "OPTIONS")
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                if is_write and message["status"] < 400:
+                    deadline = f"{time.time() + READ_YOUR_WRITES_S:.3f}"
+                    headers.append((b"x-read-primary-until", deadline.encode()))
+                    headers.append((b"set-cookie", (
+                        f"{RYW_COOKIE}={deadline}; Max-Age={int(READ_YOUR_WRITES_S) + 1}; "
+                        "Path=/; HttpOnly; Secure; SameSite=None"
+                    ).encode()))
+                if stats is not None and stats.get("db_read"):
+                    headers.append((b"x-db-read", stats["db_read"].encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+# Inside MetricsMiddleware, so REQUEST_STATS is already set
+app.add_middleware(ReadYourWritesMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+def enqueue_job(background_tasks: BackgroundTasks, queue: str, fn, *args):
+    """add_task() with queue-depth and outcome tracking (queues: sheets, email, images, backfill)."""
+    BG_QUEUE_DEPTH.inc(queue=queue)
+
+    if asyncio.iscoroutinefunction(fn):
+        async def job():
+            outcome = "ok"
+            try:
+                await fn(*args)
+            except Exception:
+                outcome = "error"
+                raise
+            finally:
+                BG_QUEUE_DEPTH.dec(queue=queue)
+                BG_TASKS.inc(queue=queue, outcome=outcome)
+    else:
+        def job():
+            outcome = "ok"
+            try:
+                fn(*args)
+            except Exception:
+                outcome = "error"
+                raise
+            finally:
+                BG_QUEUE_DEPTH.dec(queue=queue)
+                BG_TASKS.inc(queue=queue, outcome=outcome)
+
+    background_tasks.add_task(job)
+
 
 def get_password_hash(password):
     return pwd_context.hash(password.encode('utf-8')[:72])
@@ -494,16 +2025,60 @@ def verify_password(plain, hashed):
 def create_token(data: dict):
     return jwt.encode({**data, "exp": datetime.now(IST) + timedelta(days=7)}, SECRET_KEY, algorithm=ALGORITHM)
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+USER_PRIVATE_FIELDS = {"password_hash"}
+
+# Cached principals skip secrets and the profile_pic blob
+PRINCIPAL_FIELDS = [c.key for c in User.__table__.columns if c.key not in USER_PRIVATE_FIELDS | {"profile_pic"}]
+PRINCIPAL_TTL_S = float(os.getenv("CACHE_PRINCIPAL_TTL_S", "300"))
+
+def _load_principal(db: Session, email: str):
+    row = db.query(*[getattr(User, f) for f in PRINCIPAL_FIELDS]).filter(User.email == email).first()
+    return dict(zip(PRINCIPAL_FIELDS, row)) if row else None
+
+def invalidate_principal(email: Optional[str]):
+    if email:
+        CACHE.delete(f"principal:{email}")
+
+def _token_email(token: str):
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    return payload.get("sub")
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    """The caller as a detached User snapshot, served from the shared cache.
+
+    Good for role / id / hostel checks. Routes that modify the user or need
+    profile_pic take get_current_user_row instead.
+    """
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user = db.query(User).filter(User.email == payload.get("sub")).first()
+        email = _token_email(token)
+        cols = CACHE.get_or_set(f"principal:{email}", lambda: _load_principal(db, email), PRINCIPAL_TTL_S)
+        if not cols:
+            raise HTTPException(status_code=401)
+        user = User(**cols)
+        stats = REQUEST_STATS.get()
+        if stats is not None:
+            stats["role"] = user.role
+        return user
+    except Exception:
+        raise HTTPException(status_code=401)
+
+def get_current_user_row(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    """The caller's full row, attached to this request's session (uncached)."""
+    try:
+        user = db.query(User).filter(User.email == _token_email(token)).first()
         if not user:
             raise HTTPException(status_code=401)
+        stats = REQUEST_STATS.get()
+        if stats is not None:
+            stats["role"] = user.role
         return user
     except Exception:
         raise HTTPException(status_code=401)
 
+def user_to_dict(u: User):
+    """Column values of a user row, minus secrets, ready for direct serialisation."""
+    return {c.key: getattr(u, c.key) for c in User.__table__.columns if c.key not in USER_PRIVATE_FIELDS}
+
 # ==========================================
 # 6. API ROUTES
 # ==========================================
@@ -520,6 +2095,75 @@ def health():
     """
     return {"status": "ok"}
 
+@app.api_route("/ready", methods=["GET", "HEAD"])
+def ready():
+    """
+    Readiness probe: 200 once the schema is ensured and the DB answers,
+    503 while startup is still running or the DB is unreachable.
+    """
+    if not SCHEMA_READY.is_set():
+        return JSONResponse(status_code=503, content={"status": "starting", "schema": False})
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    except Exception:
+        return JSONResponse(status_code=503, content={"status": "db_unavailable", "schema": True})
+    return {"status": "ready", "schema": True}
+
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+@app.get("/metrics")
+def metrics(authorization: Optional[str] = Header(None)):
+    """Prometheus scrape target. Set METRICS_TOKEN to require `Authorization: Bearer <token>`."""
+    if METRICS_TOKEN and authorization != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(401)
+    body = "\n".join(m.render() for m in METRICS) + "\n"
+    return Response(content=body, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/admin/sql-profile")
+def sql_profile(limit: int = Query(50, ge=1, le=200), user: User = Depends(get_current_user)):
+    """Slowest captured statements plus recent per-request profiles (N+1 flagged)."""
+    if user.role == 'student':
+        raise HTTPException(403, "Admins only")
+    slow = sorted(SQL_SLOW_QUERIES, key=lambda q: q["ms"], reverse=True)[:limit]
+    return {
+        "enabled_globally": SQL_PROFILE_ALL,
+        "slow_threshold_ms": SQL_SLOW_MS,
+        "slow_queries": slow,
+        "requests": list(SQL_REQUEST_PROFILES)[-limit:][::-1],
+    }
+
+@app.get("/admin/db-lanes")
+def db_lanes(user: User = Depends(get_current_user)):
+    """Per-lane pool occupancy (same numbers as campusfix_db_pool_connections)."""
+    if user.role == 'student':
+        raise HTTPException(403, "Admins only")
+    return lane_pool_stats()
+
+@app.get("/admin/admission")
+def admission_state(user: User = Depends(get_current_user)):
+    """Adaptive in-flight limit, admitted requests and the pool waits driving them."""
+    if user.role == 'student':
+        raise HTTPException(403, "Admins only")
+    return {
+        **ADMISSION.snapshot(),
+        "enabled": ADMISSION_ENABLED,
+        "max_in_flight": ADMISSION_MAX_IN_FLIGHT,
+        "target_wait_s": ADMISSION_TARGET_WAIT_S,
+        "queue_timeout_s": ADMISSION_QUEUE_TIMEOUT_S,
+    }
+
+@app.get("/admin/db-replicas")
+def db_replicas(user: User = Depends(get_current_user)):
+    """Replica health / lag as seen by the monitor, plus the routing settings."""
+    if user.role == 'student':
+        raise HTTPException(403, "Admins only")
+    return {
+        "read_your_writes_s": READ_YOUR_WRITES_S,
+        "max_lag_s": REPLICA_MAX_LAG_S,
+        "replicas": REPLICA_STATE,
+    }
+
 # --- AUTH ROUTES ---
 @app.post("/register")
 def register(u: UserRegister, db: Session = Depends(get_db)):
@@ -535,6 +2179,13 @@ def register(u: UserRegister, db: Session = Depends(get_db)):
 
 @app.post("/login")
 def login(form: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+    # The middleware already charged the caller's IP; this stops guessing one
+    # account's password from many addresses
+    if RATE_LIMIT_ENABLED:
+        wait, limited_by = RATE_LIMITER.check([("account", form.username.strip().lower())], RATE_LIMIT_COSTS[("POST", "/login")])
+        if limited_by:
+            RATE_LIMITED.inc(route="/login", scope=limited_by)
+            raise HTTPException(429, rate_limit_detail(wait), headers={"Retry-After": retry_after(wait)})
     user = db.query(User).filter(User.email == form.username).first()
     if not user or not verify_password(form.password, user.password_hash):
         raise HTTPException(400, "Invalid credentials")
@@ -562,35 +2213,114 @@ def google_login(g: GoogleLogin, db: Session = Depends(get_db)):
 
 # --- USER ROUTES ---
 @app.get("/users/me")
-def me(user: User = Depends(get_current_user)):
+def me(user: User = Depends(get_current_user_row)):
     return jsonable_encoder(user)
 
-@app.put("/users/me")
-def update_profile(u: UserUpdate, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def apply_profile_update(user: User, u: UserUpdate):
     for key, value in u.dict(exclude_unset=True).items():
         setattr(user, key, value)
+
+@app.put("/users/me")
+def update_profile(u: UserUpdate, user: User = Depends(get_current_user_row), db: Session = Depends(get_db)):
+    apply_profile_update(user, u)
     db.commit()
     db.refresh(user)
+    invalidate_principal(user.email)
     return jsonable_encoder(user)
 
 @app.put("/users/fcm-token")
-def update_fcm_token(t: TokenUpdate, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def update_fcm_token(t: TokenUpdate, user: User = Depends(get_current_user_row), db: Session = Depends(get_db)):
     user.fcm_token = t.token
     db.commit()
+    invalidate_principal(user.email)
     return {"msg": "Token Updated"}
 
 @app.post("/users/request-hostel")
-def request_hostel_change(req: HostelRequest, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def request_hostel_change(req: HostelRequest, user: User = Depends(get_current_user_row), db: Session = Depends(get_db)):
     user.requested_hostel = req.new_hostel
     db.commit()
+    invalidate_principal(user.email)
     return {"msg": "Request sent to Admin"}
 
 @app.get("/users/all")
-def get_all_users(user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_all_users(user: User = Depends(get_current_user), db: Session = Depends(get_read_db)):
     if user.role == 'student':
         raise HTTPException(403, "Not authorized")
     users = db.query(User).filter(User.role == 'student').all()
-    return jsonable_encoder(users)
+    return FastJSONResponse([user_to_dict(u) for u in users])
+
+# --- ADMIN STUDENT DIRECTORY ---
+# Safe columns an admin may project. profile_pic is a data-URL blob, so it is
+# only sent when explicitly asked for; secrets are never selectable.
+DIRECTORY_FIELDS = [
+    "id", "full_name", "email", "enrollment_no", "registration_no", "semester", "hostel",
+    "requested_hostel", "block", "room_no", "phone", "department", "credit_score", "profile_pic",
+]
+DIRECTORY_DEFAULT_FIELDS = [f for f in DIRECTORY_FIELDS if f != "profile_pic"]
+
+def _like_prefix(term: str):
+    escaped = term.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return escaped + "%"
+
+@app.get("/users/directory")
+def user_directory(
+    fields: Optional[str] = None,
+    hostel: Optional[str] = None,
+    semester: Optional[str] = None,
+    department: Optional[str] = None,
+    pending: bool = False,
+    q: Optional[str] = None,
+    cursor: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=200),
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Paginated student directory for the admin Students page.
+    `fields` is a comma-separated projection, `pending=true` keeps only
+    students with a hostel change request, `q` prefix-matches name or
+    enrollment no. Pass `next_cursor` back as `cursor` for the next page.
+    """
+    if user.role == 'student':
+        raise HTTPException(403, "Not authorized")
+
+    if fields:
+        wanted = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = [f for f in wanted if f not in DIRECTORY_FIELDS]
+        if unknown:
+            raise HTTPException(400, f"Unknown fields: {', '.join(unknown)}")
+    else:
+        wanted = DIRECTORY_DEFAULT_FIELDS
+    if "id" not in wanted:
+        wanted = ["id"] + wanted
+
+    query = db.query(*[getattr(User, f) for f in wanted]).filter(User.role == 'student')
+    if hostel:
+        query = query.filter(User.hostel == hostel)
+    if semester:
+        query = query.filter(User.semester == semester)
+    if department:
+        query = query.filter(User.department == department)
+    if pending:
+        query = query.filter(User.requested_hostel.isnot(None))
+    if q and q.strip():
+        pattern = _like_prefix(q.strip())
+        query = query.filter(or_(
+            func.lower(User.full_name).like(pattern),
+            func.lower(User.enrollment_no).like(pattern),
+        ))
+    if cursor:
+        query = query.filter(User.id > cursor)
+
+    rows = query.order_by(User.id.asc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    items = [dict(zip(wanted, row)) for row in rows]
+
+    return FastJSONResponse({
+        "items": items,
+        "next_cursor": items[-1]["id"] if has_more else None,
+    })
 
 @app.post("/users/{id}/manage-hostel")
 def manage_hostel_request(id: int, act: HostelAction, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
@@ -603,6 +2333,7 @@ def manage_hostel_request(id: int, act: HostelAction, user: User = Depends(get_c
         student.hostel = student.requested_hostel
     student.requested_hostel = None
     db.commit()
+    invalidate_principal(student.email)
     return {"msg": f"Request {act.action}d"}
 
 # ==========================================
@@ -680,12 +2411,11 @@ async def chat_endpoint(req: ChatRequest, user: User = Depends(get_current_user)
 # ==========================================
 # MESS ANALYTICS & SYNC ENGINE
 # ==========================================
-from sqlalchemy import and_, func
-
 def get_sheet():
-    if not SHEETS_CLIENT:
+    client = get_sheets_client()
+    if not client:
         raise RuntimeError("Google Sheets not initialized")
-    return SHEETS_CLIENT.open("CampusFix_Mess_Ratings").sheet1
+    return client.open("CampusFix_Mess_Ratings").sheet1
 
 def _parse_sheet_date(date_str):
     """
@@ -771,6 +2501,7 @@ def sync_sheet_rows_to_db(db: Session, rows: list):
     to distinguish multiple votes on the same day.
     """
     inserted = 0
+    weekly_deltas = {}
 
     for row in rows:
         dt = row.get("date") or datetime.now(IST)
@@ -790,6 +2521,7 @@ def sync_sheet_rows_to_db(db: Session, rows: list):
             continue
 
         # New unique vote
+        sentiment, topics = analyse_review(row["review"], row["suggestions"])
         new_r = MessRating(
             user_id=None,
             mess_name=row["mess_name"],
@@ -799,14 +2531,26 @@ def sync_sheet_rows_to_db(db: Session, rows: list):
             quality=row["quality"],
             review=row["review"] or None,
             suggestions=row["suggestions"] or None,
+            sentiment=sentiment,
+            topics=topics if sentiment is not None else None,
             created_at=dt
         )
         db.add(new_r)
         inserted += 1
+        key = (new_r.mess_name, new_r.week_start)
+        agg = weekly_deltas.setdefault(key, [0, 0, 0, 0])
+        agg[0] += 1
+        agg[1] += new_r.hygiene or 0
+        agg[2] += new_r.taste or 0
+        agg[3] += new_r.quality or 0
 
     try:
         if inserted:
+            db.flush()
+            for (mess_name, week_start), (votes, h, t, q) in weekly_deltas.items():
+                bump_mess_weekly_stat(db, mess_name, week_start, votes, h, t, q)
             db.commit()
+            CACHE.invalidate_tags("mess")
             print(f"✅ Sync Complete: {inserted} new reviews imported.")
         else:
             print("✅ Sync Verified: No new data.")
@@ -816,13 +2560,28 @@ def sync_sheet_rows_to_db(db: Session, rows: list):
         print(f"❌ DB Commit Failed: {exc}")
         return 0, 0, False
 
+# Analytics are cached per (scope, week, mess) under the "mess" tag, which
+# every vote and Sheets sync invalidates.
+MESS_ANALYTICS_TTL_S = float(os.getenv("CACHE_MESS_ANALYTICS_TTL_S", "300"))
+
+# Review sentiment bands (VADER's usual cut-offs) and topic list length
+REVIEW_POSITIVE_MIN = 0.05
+REVIEW_NEGATIVE_MAX = -0.05
+REVIEW_TOP_TOPICS = 8
+MESS_REVIEWS_LIMIT = int(os.getenv("MESS_REVIEWS_LIMIT", "50"))
+
 @app.get("/mess/analytics")
 def get_mess_analytics(
     mess: Optional[str] = None,
     scope: str = "week",      # "week" | "all"
     force_sync: str = "false", # Accepts "true"/"false" string from frontend
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
+    week = "all" if scope == "all" else get_current_week_start()
+    key = f"mess-analytics:{week}:{(mess or '').lower().strip()}"
+    return CACHE.get_or_set(key, lambda: build_mess_analytics(db, mess, scope), MESS_ANALYTICS_TTL_S, tags=["mess"])
+
+def build_mess_analytics(db: Session, mess: Optional[str], scope: str):
     # 1. TRIGGER SYNC?
     # Sync if explicitly requested OR if we are looking at 'all' time (to ensure freshness)
     # should_sync = (force_sync.lower() == 'true')
@@ -845,17 +2604,35 @@ def get_mess_analytics(
     #         print(f"⚠️ Sync skipped (Sheet API error): {e}")
 
     # 2. QUERY DB (The Single Source of Truth)
-    if scope == "all":
-        query = db.query(MessRating)
-    else:
+    filters = []
+    if scope != "all":
         week_start = get_current_week_start()
-        query = db.query(MessRating).filter(MessRating.week_start == week_start)
-
+        filters.append(MessRating.week_start == week_start)
     if mess:
-        query = query.filter(func.lower(MessRating.mess_name) == mess.lower().strip())
-
-    ratings = query.all()
-    total = len(ratings)
+        filters.append(func.lower(MessRating.mess_name) == mess.lower().strip())
+
+    # This week's averages come from the running sums kept by /mess/rate
+    weekly = None
+    if scope != "all":
+        agg_q = db.query(
+            func.sum(MessWeeklyStat.votes), func.sum(MessWeeklyStat.hygiene_sum),
+            func.sum(MessWeeklyStat.taste_sum), func.sum(MessWeeklyStat.quality_sum)
+        ).filter(MessWeeklyStat.week_start == week_start)
+        if mess:
+            agg_q = agg_q.filter(func.lower(MessWeeklyStat.mess_name) == mess.lower().strip())
+        weekly = agg_q.first()
+        if not (weekly and weekly[0]):
+            weekly = None
+    if weekly:
+        votes, h_sum, t_sum, q_sum = weekly
+        total = int(votes)
+        avg_h, avg_t, avg_q = h_sum / votes, t_sum / votes, q_sum / votes
+    else:
+        total, avg_h, avg_t, avg_q = db.query(
+            func.count(MessRating.id), func.avg(MessRating.hygiene),
+            func.avg(MessRating.taste), func.avg(MessRating.quality)
+        ).filter(*filters).one()
+        avg_h, avg_t, avg_q = (float(a) if a is not None else 0 for a in (avg_h, avg_t, avg_q))
 
     # 3. Handle Empty State
     if total == 0:
@@ -864,17 +2641,12 @@ def get_mess_analytics(
             "sentiment": "No data yet",
             "action_item": "Waiting for reviews...",
             "total": 0,
+            "review_sentiment": {"score": None, "scored": 0, "positive": 0, "negative": 0},
+            "topics": [],
             "reviews": []
         }
 
     # 4. Compute Stats
-    h_vals = [r.hygiene for r in ratings if r.hygiene is not None]
-    t_vals = [r.taste for r in ratings if r.taste is not None]
-    q_vals = [r.quality for r in ratings if r.quality is not None]
-
-    avg_h = (sum(h_vals) / len(h_vals)) if h_vals else 0
-    avg_t = (sum(t_vals) / len(t_vals)) if t_vals else 0
-    avg_q = (sum(q_vals) / len(q_vals)) if q_vals else 0
     overall = (avg_h + avg_t + avg_q) / 3 if (avg_h or avg_t or avg_q) else 0
 
     # AI Sentiment Logic (Simple Heuristic)
@@ -891,21 +2663,46 @@ def get_mess_analytics(
         sentiment = "Critical 🚨"
         action_item = "Immediate hygiene inspection required."
 
-    # 5. Format Reviews (Newest First)
-    reviews_list = []
-    # Sort in Python to avoid complex DB sorting if created_at is mixed types
-    sorted_ratings = sorted(ratings, key=lambda x: x.created_at or datetime.min, reverse=True)
-
-    for r in sorted_ratings:
-        # Only add "Voices" if there is content
-        if (r.review and len(r.review) > 2) or (r.suggestions and len(r.suggestions) > 2) or r.image_data:
-            reviews_list.append({
-                "rating": round((r.hygiene + r.taste + r.quality) / 3, 1),
-                "review": r.review,
-                "suggestion": r.suggestions,
-                "image": r.image_data,
-                "date": r.created_at.strftime("%Y-%m-%d") if r.created_at else ""
-            })
+    # Review text: per-rating scores stored at ingest, aggregated in SQL
+    score, scored, positive, negative = db.query(
+        func.avg(MessRating.sentiment),
+        func.count(MessRating.sentiment),
+        func.count(case((MessRating.sentiment >= REVIEW_POSITIVE_MIN, 1))),
+        func.count(case((MessRating.sentiment <= REVIEW_NEGATIVE_MAX, 1))),
+    ).filter(*filters).one()
+    topic_rows = db.query(func.unnest(MessRating.topics).label("topic")).filter(*filters).subquery()
+    topics = [
+        {"topic": topic, "count": count}
+        for topic, count in db.query(topic_rows.c.topic, func.count())
+        .group_by(topic_rows.c.topic)
+        .order_by(func.count().desc(), topic_rows.c.topic)
+        .limit(REVIEW_TOP_TOPICS)
+    ]
+    complaints = [t["topic"] for t in topics if t["topic"] != "fresh"][:3]
+    if score is not None and score <= REVIEW_NEGATIVE_MAX and complaints:
+        action_item = f"{action_item} Reviews mostly flag: {', '.join(complaints)}."
+
+    # 5. Format Reviews (Newest First): the latest MESS_REVIEWS_LIMIT "Voices" with content
+    voices = db.query(
+        MessRating.hygiene, MessRating.taste, MessRating.quality, MessRating.review,
+        MessRating.suggestions, MessRating.image_data, MessRating.image_id,
+        MessRating.sentiment, MessRating.topics, MessRating.created_at,
+    ).filter(*filters, or_(
+        func.length(MessRating.review) > 2, func.length(MessRating.suggestions) > 2,
+        MessRating.image_data != "", MessRating.image_id != "",
+    )).order_by(MessRating.created_at.desc(), MessRating.id.desc()).limit(MESS_REVIEWS_LIMIT)
+    reviews_list = [
+        {
+            "rating": round((r.hygiene + r.taste + r.quality) / 3, 1),
+            "review": r.review,
+            "suggestion": r.suggestions,
+            "image": r.image_data or image_urls(r.image_id)[0],
+            "sentiment": r.sentiment,
+            "topics": r.topics or [],
+            "date": r.created_at.strftime("%Y-%m-%d") if r.created_at else ""
+        }
+        for r in voices
+    ]
 
     return {
         "avg": {
@@ -917,55 +2714,662 @@ def get_mess_analytics(
         "sentiment": sentiment,
         "action_item": action_item,
         "total": total,
+        "review_sentiment": {
+            "score": round(score, 3) if score is not None else None,
+            "scored": scored,
+            "positive": positive,
+            "negative": negative,
+        },
+        "topics": topics,
         "reviews": reviews_list
     }
 
+# Trends are grouped straight off mess_weekly_stats (one row per mess per
+# week, kept current on every vote), so a multi-year range for every mess is
+# one GROUP BY over a few thousand rows. Averages are vote-weighted. The
+# moving average covers the trailing `window` calendar periods (RANGE, not
+# ROWS), so a week with no votes shrinks the window instead of reaching
+# further back. A week is counted in the month its Monday falls in.
+_MESS_TRENDS_SQL = text("""
+    WITH buckets AS (
+        SELECT mess_name,
+               date_trunc(:unit, CAST(week_start AS date))::date AS period,
+               sum(votes) AS votes,
+               sum(hygiene_sum) AS h, sum(taste_sum) AS t, sum(quality_sum) AS q
+        FROM mess_weekly_stats
+        WHERE votes > 0
+          AND (CAST(:mess AS text) IS NULL OR lower(mess_name) = :mess)
+          AND (CAST(:since AS text) IS NULL OR week_start >= :since)
+          AND (CAST(:until AS text) IS NULL OR week_start <= :until)
+        GROUP BY mess_name, period
+    )
+    SELECT mess_name, period, votes,
+           h::float / votes AS hygiene, t::float / votes AS taste, q::float / votes AS quality,
+           sum(votes) OVER w AS window_votes,
+           CAST(sum(h) OVER w AS float) / sum(votes) OVER w AS ma_hygiene,
+           CAST(sum(t) OVER w AS float) / sum(votes) OVER w AS ma_taste,
+           CAST(sum(q) OVER w AS float) / sum(votes) OVER w AS ma_quality
+    FROM buckets
+    WINDOW w AS (PARTITION BY mess_name ORDER BY period
+                 RANGE BETWEEN CAST(:span AS interval) PRECEDING AND CURRENT ROW)
+    ORDER BY mess_name, period
+""")
+
+def _trend_scores(h: float, t: float, q: float):
+    return {
+        "hygiene": round(h, 2),
+        "taste": round(t, 2),
+        "quality": round(q, 2),
+        "overall": round((h + t + q) / 3, 2),
+    }
+
+def build_mess_trends(db: Session, mess: Optional[str], bucket: str, since: Optional[str], until: Optional[str], window: int):
+    span = f"{window - 1} {bucket}s"      # RANGE offset: "3 weeks", "5 months", ...
+    rows = db.execute(_MESS_TRENDS_SQL, {
+        "unit": bucket, "mess": mess.lower().strip() if mess else None,
+        "since": since, "until": until, "span": span,
+    }).all()
+
+    series = {}
+    for r in rows:
+        series.setdefault(r.mess_name, []).append({
+            "period": r.period.isoformat(),
+            "votes": int(r.votes),
+            "avg": _trend_scores(r.hygiene, r.taste, r.quality),
+            "moving_avg": _trend_scores(r.ma_hygiene, r.ma_taste, r.ma_quality),
+            "moving_votes": int(r.window_votes),
+        })
+    return {
+        "bucket": bucket,
+        "window": window,
+        "from": since,
+        "to": until,
+        "series": [{"mess_name": name, "points": points} for name, points in series.items()],
+    }
+
+@app.get("/mess/trends")
+def get_mess_trends(
+    mess: Optional[str] = None,
+    bucket: str = "week",                       # "week" | "month"
+    since: Optional[str] = Query(None, alias="from", pattern=r"^\d{4}-\d{2}-\d{2}$"),
+    until: Optional[str] = Query(None, alias="to", pattern=r"^\d{4}-\d{2}-\d{2}$"),
+    window: int = Query(4, ge=1, le=52),        # moving-average width, in buckets
+    db: Session = Depends(get_read_db)
+):
+    """Per-mess weekly / monthly averages with vote counts and a moving average."""
+    if bucket not in ("week", "month"):
+        raise HTTPException(400, "bucket must be 'week' or 'month'")
+    key = f"mess-trends:{bucket}:{window}:{since or ''}:{until or ''}:{(mess or '').lower().strip()}"
+    return CACHE.get_or_set(key, lambda: build_mess_trends(db, mess, bucket, since, until, window), MESS_ANALYTICS_TTL_S, tags=["mess"])
+
+# ==========================================
+# IMAGE UPLOADS (multipart, transcoded off the event loop)
+# ==========================================
+# POST /images takes multipart/form-data with a `file` field. The body is
+# parsed as it arrives and only the file part is written, chunk by chunk, to a
+# temp file (from the threadpool, never on the event loop), so a 8 MB phone
+# photo never sits in memory and an oversized upload is cut off with 413 as
+# soon as it crosses IMAGE_MAX_UPLOAD_BYTES.
+# Decoding / resizing / EXIF stripping runs in a process pool (imaging.py) so
+# Pillow's CPU time never blocks the event loop. The result is stored in
+# Postgres (Render's disk is ephemeral and not shared between instances) and
+# served, immutable, from GET /images/{id} and /images/{id}/thumb.
+IMAGE_MAX_UPLOAD_BYTES = int(os.getenv("IMAGE_MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+IMAGE_MAX_SIDE = int(os.getenv("IMAGE_MAX_SIDE", "1600"))
+IMAGE_THUMB_SIDE = int(os.getenv("IMAGE_THUMB_SIDE", "320"))
+IMAGE_FORMAT = "jpeg" if os.getenv("IMAGE_FORMAT", "webp").lower() in ("jpeg", "jpg") else "webp"
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "80"))
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+UPLOAD_TMP_DIR = os.getenv("UPLOAD_TMP_DIR") or None
+
+IMAGE_UPLOAD_BYTES = Histogram(
+    "campusfix_image_upload_bytes", "Upload size before / after transcoding.",
+    [64e3, 256e3, 512e3, 1e6, 2e6, 4e6, 8e6, 16e6],
+)
+
+_image_pool = None
+
+def get_image_pool():
+    """Worker processes for transcoding, started on first upload."""
+    global _image_pool
+    if _image_pool is None:
+        with _INTEGRATION_LOCK:
+            if _image_pool is None:
+                import multiprocessing
+                # spawn, not fork: the parent has engines, pools and threads that must not
+                # be cloned; under the uvicorn CLI children import only imaging.py
+                _image_pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _image_pool
+
+def discard_image_pool(broken: ProcessPoolExecutor):
+    """Drop a pool whose worker died; the next upload starts a fresh one."""
+    global _image_pool
+    with _INTEGRATION_LOCK:
+        # Concurrent uploads all see the same breakage; only the first resets
+        if _image_pool is broken:
+            _image_pool = None
+    # Reaps the surviving workers and the pool's management thread
+    broken.shutdown(wait=False, cancel_futures=True)
+
+class UploadTooLarge(Exception):
+    pass
+
+async def stream_upload_to_disk(request: Request, field: str, max_bytes: int):
+    """Write the `field` part of a multipart body to a temp file as it streams in.
+
+    Returns (path, bytes written); path is None if the field was missing.
+    Raises UploadTooLarge once the part exceeds max_bytes.
+    """
+    ctype, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if ctype != b"multipart/form-data" or not boundary:
+        raise HTTPException(400, "Expected multipart/form-data")
+
+    out = await run_in_threadpool(
+        tempfile.NamedTemporaryFile, prefix="upload-", suffix=".bin", dir=UPLOAD_TMP_DIR, delete=False,
+    )
+    pending = []    # file bytes parsed from the current network chunk
+    state = {"headers": {}, "field": b"", "value": b"", "target": False, "found": False, "size": 0}
+
+    def on_part_begin():
+        state["headers"] = {}
+    def on_header_field(data, start, end):
+        state["field"] += data[start:end]
+    def on_header_value(data, start, end):
+        state["value"] += data[start:end]
+    def on_header_end():
+        state["headers"][state["field"].lower()] = state["value"]
+        state["field"], state["value"] = b"", b""
+    def on_headers_finished():
+        _, disp = parse_options_header(state["headers"].get(b"content-disposition", b""))
+        state["target"] = not state["found"] and disp.get(b"name") == field.encode()
+    def on_part_data(data, start, end):
+        if state["target"]:
+            state["size"] += end - start
+            if state["size"] > max_bytes:
+                raise UploadTooLarge()
+            pending.append(data[start:end])
+    def on_part_end():
+        if state["target"]:
+            state["found"], state["target"] = True, False
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin, "on_part_data": on_part_data, "on_part_end": on_part_end,
+        "on_header_field": on_header_field, "on_header_value": on_header_value,
+        "on_header_end": on_header_end, "on_headers_finished": on_headers_finished,
+    })
+    async def flush():
+        if pending:
+            data = b"".join(pending)
+            pending.clear()
+            await run_in_threadpool(out.write, data)
+
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            await flush()
+        parser.finalize()
+        await flush()
+        await run_in_threadpool(out.close)
+    except BaseException:
+        # Plain calls: a cancelled request cannot await anything any more
+        out.close()
+        os.unlink(out.name)
+        raise
+    if not state["found"]:
+        await run_in_threadpool(os.unlink, out.name)
+        return None, 0
+    return out.name, state["size"]
+
+def save_stored_image(image_id: str, owner_id: int, result: dict):
+    db = SessionLocal()
+    try:
+        db.add(StoredImage(
+            id=image_id, owner_id=owner_id, content_type=result["content_type"],
+            width=result["width"], height=result["height"], data=result["data"], thumb=result["thumb"],
+        ))
+        db.commit()
+    finally:
+        db.close()
+
+def check_image_ref(db: Session, image_id: Optional[str], user: User):
+    """An image_id in a request body must be an upload by the same user."""
+    if image_id and not db.query(StoredImage.id).filter(StoredImage.id == image_id, StoredImage.owner_id == user.id).first():
+        raise HTTPException(400, "Unknown image")
+
+def image_urls(image_id: Optional[str]):
+    if not image_id:
+        return None, None
+    return f"/images/{image_id}", f"/images/{image_id}/thumb"
+
+@app.post("/images")
+async def upload_image(request: Request, user: User = Depends(get_current_user)):
+    declared = request.headers.get("content-length")
+    # Multipart framing adds a little on top of the file itself
+    if declared and declared.isdigit() and int(declared) > IMAGE_MAX_UPLOAD_BYTES + 64 * 1024:
+        raise HTTPException(413, "Image too large")
+    try:
+        path, size = await stream_upload_to_disk(request, "file", IMAGE_MAX_UPLOAD_BYTES)
+    except UploadTooLarge:
+        raise HTTPException(413, "Image too large")
+    if not path:
+        raise HTTPException(400, "Missing 'file' field")
+
+    import imaging
+    pool = get_image_pool()
+    try:
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(
+            pool, imaging.transcode, path, IMAGE_MAX_SIDE, IMAGE_THUMB_SIDE, IMAGE_FORMAT, IMAGE_QUALITY,
+        )
+    except imaging.UnsupportedImage as exc:
+        raise HTTPException(415, str(exc))
+    except BrokenProcessPool:
+        # A worker died (e.g. OOM on a huge frame); start a fresh pool next time
+        discard_image_pool(pool)
+        raise HTTPException(503, "Image processing unavailable. Please retry.")
+    finally:
+        os.unlink(path)
+
+    image_id = uuid.uuid4().hex
+    try:
+        await run_in_threadpool(save_stored_image, image_id, user.id, result)
+    except OperationalError:
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "Database temporarily unavailable. Please retry."}
+        )
+    IMAGE_UPLOAD_BYTES.observe(size, stage="upload")
+    IMAGE_UPLOAD_BYTES.observe(len(result["data"]), stage="stored")
+    url, thumb_url = image_urls(image_id)
+    return {
+        "id": image_id, "url": url, "thumb_url": thumb_url,
+        "content_type": result["content_type"], "width": result["width"], "height": result["height"],
+        "bytes": len(result["data"]), "thumb_bytes": len(result["thumb"]),
+    }
+
+def _serve_stored_image(image_id: str, column, if_none_match: Optional[str], etag: str):
+    if if_none_match == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    # Replica first; a just-uploaded image may not have replicated yet, so a
+    # replica miss is retried on the primary (a primary miss is final)
+    db = _open_read_session("interactive")
+    try:
+        row = db.query(StoredImage.content_type, column).filter(StoredImage.id == image_id).first()
+        retry_primary = row is None and db.info["read_target"] != "primary"
+    finally:
+        db.close()
+    if retry_primary:
+        db = SessionLocal()
+        try:
+            row = db.query(StoredImage.content_type, column).filter(StoredImage.id == image_id).first()
+        finally:
+            db.close()
+    if not row:
+        raise HTTPException(404)
+    return Response(content=row[1], media_type=row[0], headers={
+        "Cache-Control": "public, max-age=31536000, immutable", "ETag": etag,
+    })
+
+@app.get("/images/{image_id}")
+def get_image(image_id: str, if_none_match: Optional[str] = Header(None)):
+    return _serve_stored_image(image_id, StoredImage.data, if_none_match, f'"{image_id}"')
+
+@app.get("/images/{image_id}/thumb")
+def get_image_thumb(image_id: str, if_none_match: Optional[str] = Header(None)):
+    return _serve_stored_image(image_id, StoredImage.thumb, if_none_match, f'"{image_id}-t"')
+
+# ==========================================
+# MESS RATING INGESTION (POST-MEAL SPIKE PATH)
+# ==========================================
+# A whole hostel rates within ~15 minutes of a meal, so the request path is
+# kept to: one user lookup, one INSERT-or-UPDATE of the vote and one upsert of
+# the weekly sums, all inside a single short transaction. Sheets logging and
+# the (large) base64 photo are written afterwards as background tasks.
+
+MAX_RATING_IMAGE_CHARS = 2_000_000   # ~1.5 MB decoded
+MESS_VOTE_ATTEMPTS = 3
+
+_BUMP_WEEKLY_STAT_SQL = text("""
+    INSERT INTO mess_weekly_stats (mess_name, week_start, votes, hygiene_sum, taste_sum, quality_sum)
+    VALUES (:mess, :week, :votes, :h, :t, :q)
+    ON CONFLICT (mess_name, week_start) DO UPDATE SET
+        votes = mess_weekly_stats.votes + EXCLUDED.votes,
+        hygiene_sum = mess_weekly_stats.hygiene_sum + EXCLUDED.hygiene_sum,
+        taste_sum = mess_weekly_stats.taste_sum + EXCLUDED.taste_sum,
+        quality_sum = mess_weekly_stats.quality_sum + EXCLUDED.quality_sum
+""")
+
+_INSERT_VOTE_SQL = text("""
+    INSERT INTO mess_ratings (user_id, mess_name, week_start, hygiene, taste, quality, review, suggestions, image_id, sentiment, topics, created_at)
+    VALUES (:uid, :mess, :week, :h, :t, :q, :review, :suggestions, :image_id, :sentiment, :topics, now())
+    ON CONFLICT (user_id, mess_name, week_start) DO NOTHING
+    RETURNING id
+""")
+
+# Re-vote: lock the old row, overwrite it and hand back the OLD scores so the
+# weekly sums can be corrected by the exact delta.
+_REVOTE_SQL = text("""
+    UPDATE mess_ratings AS r SET
+        hygiene = :h, taste = :t, quality = :q,
+        review = :review, suggestions = :suggestions, created_at = now(),
+        image_id = coalesce(:image_id, r.image_id),
+        sentiment = :sentiment, topics = :topics
+    FROM (
+        SELECT id, hygiene, taste, quality FROM mess_ratings
+        WHERE user_id = :uid AND mess_name = :mess AND week_start = :week
+        FOR UPDATE
+    ) AS old
+    WHERE r.id = old.id
+    RETURNING r.id, old.hygiene, old.taste, old.quality
+""")
+
+def bump_mess_weekly_stat(db: Session, mess_name: str, week_start: str, votes: int, h: int, t: int, q: int):
+    db.execute(_BUMP_WEEKLY_STAT_SQL, {"mess": mess_name, "week": week_start, "votes": votes, "h": h, "t": t, "q": q})
+
+def seed_mess_weekly_stats():
+    """Add the weekly sums of every (mess, week) group that has ratings but no stats row.
+
+    Runs on every startup, before SCHEMA_READY is set; votes are refused until
+    then (see record_mess_vote), so no group can be started by a live vote
+    before its history has been counted.
+    """
+    try:
+        with DB_LANES["background"].connect() as conn:
+            seeded = conn.execute(text("""
+                INSERT INTO mess_weekly_stats (mess_name, week_start, votes, hygiene_sum, taste_sum, quality_sum)
+                SELECT r.mess_name, r.week_start, count(*),
+                       coalesce(sum(r.hygiene), 0), coalesce(sum(r.taste), 0), coalesce(sum(r.quality), 0)
+                FROM mess_ratings r
+                WHERE r.mess_name IS NOT NULL AND r.week_start IS NOT NULL
+                  AND NOT EXISTS (
+                      SELECT 1 FROM mess_weekly_stats s
+                      WHERE s.mess_name = r.mess_name AND s.week_start = r.week_start
+                  )
+                GROUP BY r.mess_name, r.week_start
+                ON CONFLICT (mess_name, week_start) DO NOTHING
+            """)).rowcount
+            if seeded:
+                print(f"✅ Mess weekly stats seeded for {seeded} week(s)")
+    except Exception as exc:
+        print(f"⚠️ Mess weekly stats seed skipped: {exc}")
+
+SENTIMENT_BACKFILL_BATCH = int(os.getenv("SENTIMENT_BACKFILL_BATCH", "1000"))
+
+_SET_SENTIMENT_SQL = text("""
+    UPDATE mess_ratings AS r SET sentiment = v.sentiment, topics = string_to_array(v.topics, ',')
+    FROM (SELECT unnest(CAST(:ids AS integer[])) AS id,
+                 unnest(CAST(:scores AS float8[])) AS sentiment,
+                 unnest(CAST(:topics AS varchar[])) AS topics) AS v
+    WHERE r.id = v.id
+""")
+
+def backfill_review_sentiment(rescore: bool = False):
+    """Score ratings that have text but no sentiment yet (every one with rescore=True).
+
+    Walks the table by id in SENTIMENT_BACKFILL_BATCH chunks, one UPDATE per
+    chunk, so it is safe to run while votes are coming in. Returns rows scored.
+    """
+    scored, last_id = 0, 0
+    while True:
+        with DB_LANES["background"].connect() as conn:
+            rows = conn.execute(text("""
+                SELECT id, review, suggestions FROM mess_ratings
+                WHERE id > :last_id AND (:rescore OR sentiment IS NULL)
+                  AND (coalesce(review, '') <> '' OR coalesce(suggestions, '') <> '')
+                ORDER BY id LIMIT :n
+            """), {"last_id": last_id, "rescore": rescore, "n": SENTIMENT_BACKFILL_BATCH}).all()
+            if not rows:
+                break
+            ids, scores, topics = [], [], []
+            for rating_id, review, suggestions in rows:
+                sentiment, found = analyse_review(review, suggestions)
+                ids.append(rating_id)
+                scores.append(sentiment or 0.0)
+                topics.append(",".join(found))
+            conn.execute(_SET_SENTIMENT_SQL, {"ids": ids, "scores": scores, "topics": topics})
+        scored += len(rows)
+        last_id = rows[-1][0]
+    if scored:
+        CACHE.invalidate_tags("mess")
+        print(f"✅ Review sentiment backfill: {scored} rating(s) scored")
+    return scored
+
+@app.post("/admin/mess/sentiment/backfill")
+def sentiment_backfill(background_tasks: BackgroundTasks, rescore: bool = False, user: User = Depends(get_current_user)):
+    """Score unscored reviews in the background (rescore=true after a lexicon change)."""
+    if user.role == 'student':
+        raise HTTPException(403, "Admins only")
+    enqueue_job(background_tasks, "backfill", backfill_review_sentiment, rescore)
+    return {"msg": "Sentiment backfill started", "rescore": rescore}
+
+def store_rating_image(rating_id: int, image_data: str):
+    db = background_session()
+    try:
+        db.query(MessRating).filter(MessRating.id == rating_id).update({MessRating.image_data: image_data})
+        db.commit()
+        CACHE.invalidate_tags("mess")    # the review list shows images
+    except Exception as exc:
+        db.rollback()
+        print(f"❌ Failed to store rating image #{rating_id}: {exc}")
+    finally:
+        db.close()
+
+def record_mess_vote(db: Session, r: MessRatingCreate, user: User):
+    """Validate and store one vote plus its weekly sums, inside the caller's transaction.
+
+    Returns (rating_id, updated, week_start); nothing is committed here.
+    """
+    if not SCHEMA_READY.is_set():
+        # The weekly sums are seeded during startup; a vote before that would
+        # start its week's row without the history (see seed_mess_weekly_stats)
+        raise HTTPException(503, "Service is starting. Please retry.", headers={"Retry-After": "5"})
+    mess_name = (r.mess_name or "").strip()
+    if not mess_name:
+        raise HTTPException(400, "Mess name is required")
+    if not all(1 <= v <= 5 for v in (r.hygiene, r.taste, r.quality)):
+        raise HTTPException(400, "Ratings must be between 1 and 5")
+    if r.image_data and len(r.image_data) > MAX_RATING_IMAGE_CHARS:
+        raise HTTPException(413, "Image too large")
+    check_image_ref(db, r.image_id, user)
+
+    week_start = get_current_week_start()
+    sentiment, topics = analyse_review(r.review, r.suggestions)
+    params = {
+        "uid": user.id, "mess": mess_name, "week": week_start,
+        "h": r.hygiene, "t": r.taste, "q": r.quality,
+        "review": r.review or None, "suggestions": r.suggestions or None,
+        "image_id": r.image_id or None,
+        "sentiment": sentiment, "topics": topics if sentiment is not None else None,
+    }
+
+    # The insert and the re-vote can race with a delete of the same vote:
+    # insert conflicts, then the row is gone before the UPDATE locks it.
+    # Go round again (the insert will now succeed) rather than fail.
+    for _ in range(MESS_VOTE_ATTEMPTS):
+        row = db.execute(_INSERT_VOTE_SQL, params).first()
+        if row:
+            bump_mess_weekly_stat(db, mess_name, week_start, 1, r.hygiene, r.taste, r.quality)
+            return row[0], False, week_start
+        row = db.execute(_REVOTE_SQL, params).first()
+        if row:
+            rating_id, old_h, old_t, old_q = row
+            bump_mess_weekly_stat(db, mess_name, week_start, 0,
+                                  r.hygiene - (old_h or 0), r.taste - (old_t or 0), r.quality - (old_q or 0))
+            return rating_id, True, week_start
+    raise HTTPException(409, "Your vote changed while it was being saved. Please retry.")
+
+def mess_vote_recorded(background_tasks: BackgroundTasks, r: MessRatingCreate, user: User, rating_id: int):
+    """After-commit side effects of a vote."""
+    CACHE.invalidate_tags("mess")
+    if r.image_data:
+        enqueue_job(background_tasks, "images", store_rating_image, rating_id, r.image_data)
+    enqueue_job(background_tasks, "sheets", append_rating_to_sheet, r, user)
+
+@app.post("/mess/rate")
+def rate_mess(r: MessRatingCreate, background_tasks: BackgroundTasks, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    try:
+        # The engine defaults to AUTOCOMMIT; the vote and the weekly sums
+        # must land together, so this session runs a real transaction.
+        begin_transaction(db)
+        rating_id, updated, week_start = record_mess_vote(db, r, user)
+        db.commit()
+    except OperationalError:
+        db.rollback()
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "Database temporarily unavailable. Please retry."}
+        )
+
+    mess_vote_recorded(background_tasks, r, user, rating_id)
+    return {"msg": "Vote updated" if updated else "Vote recorded", "id": rating_id, "week_start": week_start}
+
 # --- ISSUE ROUTES ---
+# Dashboard counters are cached under the "issues" tag; every issue write
+# invalidates it (plus the owner's own count).
+STATS_TTL_S = float(os.getenv("CACHE_STATS_TTL_S", "60"))
+
+def issue_counts(db: Session):
+    total, pending, resolved = db.query(
+        func.count(Issue.id),
+        func.count(case((Issue.status == "Pending", 1))),
+        func.count(case((Issue.status == "Solved", 1))),
+    ).one()
+    return {"total_issues": total, "pending": pending, "resolved": resolved}
+
+def invalidate_issue_caches(*owner_ids):
+    CACHE.invalidate_tags("issues", *[f"issues:owner:{o}" for o in owner_ids if o is not None])
+
+def issue_location(sub_location: Optional[str], specific_location: Optional[str] = None):
+    """lat / lng / map_cell column values for a place ({} when it is not in the gazetteer)."""
+    coords = locate(sub_location, specific_location)
+    if coords is None:
+        return {}
+    lat, lng = coords
+    return {"lat": lat, "lng": lng, "map_cell": grid_cell(lat, lng)}
+
+def new_issue_payload(issue: Issue, user: User):
+    # owner_name is required by IssueResponse; without it the insert committed
+    # but the client got a 500 and retried, creating a duplicate
+    return {**jsonable_encoder(issue), "owner_name": user.full_name or "Unknown"}
+
+def issue_created(background_tasks: BackgroundTasks, issue: Issue, user: User):
+    """After-commit side effects of a new issue."""
+    invalidate_issue_caches(user.id)
+    enqueue_job(background_tasks, "sheets", append_issue_to_sheet, issue, user)
+
 @app.post("/issues", response_model=IssueResponse)
 def create_issue(i: IssueCreate, background_tasks: BackgroundTasks, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    new_issue = Issue(**i.dict(), owner_id=user.id)
+    check_image_ref(db, i.image_id, user)
+    new_issue = Issue(**i.dict(), owner_id=user.id, **issue_location(i.sub_location, i.specific_location))
     db.add(new_issue)
     db.commit()
     db.refresh(new_issue)
+    issue_created(background_tasks, new_issue, user)
+    return new_issue_payload(new_issue, user)
+
+# --- ISSUE FEED ---
+# The feed is ordered by (priority_rank, created_at DESC, id DESC): exactly the
+# tail of the ix_issues_feed* indexes. A student's visibility filter is an OR
+# over three columns that no single index serves, so it is split into disjoint
+# branches (own hostel / Mess and Academic elsewhere / own issues elsewhere),
+# each an ordered index scan. Every branch carries its own ORDER BY (and LIMIT)
+# because Postgres never flattens a UNION ALL arm that has a WHERE, so only then
+# does it see the index order; the arms are combined with a Merge Append
+# instead of a sort, and with ?limit= each one stops after a page.
+# Pages continue from ?cursor=, the X-Next-Cursor of the previous page.
+FEED_COLUMNS = (
+    Issue.id, Issue.title, Issue.description, Issue.category, Issue.sub_location,
+    Issue.specific_location, Issue.priority, Issue.priority_rank, Issue.status,
+    Issue.image_data, Issue.image_id, Issue.created_at, Issue.owner_id, Issue.rating,
+    Issue.review, Issue.comment_count, Issue.last_comment_at, Issue.last_comment_user,
+    Issue.last_comment_preview,
+)
+FEED_SHARED_CATEGORIES = ("Mess", "Academic")     # visible to every student
+FEED_MAX_LIMIT = 500
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+def feed_branches(user: User):
+    """Disjoint WHERE clauses whose union is what `user` may see."""
+    if user.role != 'student':
+        return [true()]
+    # == / IS DISTINCT FROM also do the right thing for hostel None (IS NULL)
+    elsewhere = Issue.sub_location.is_distinct_from(user.hostel)
+    branches = [Issue.sub_location == user.hostel]
+    branches += [and_(Issue.category == c, elsewhere) for c in FEED_SHARED_CATEGORIES]
+    branches.append(and_(
+        Issue.owner_id == user.id, elsewhere,
+        or_(Issue.category.is_(None), Issue.category.notin_(FEED_SHARED_CATEGORIES)),
+    ))
+    return branches
 
-    background_tasks.add_task(append_issue_to_sheet, new_issue, user)
+def encode_feed_cursor(row) -> str:
+    micros = (row.created_at - _EPOCH) // timedelta(microseconds=1)
+    return f"{row.priority_rank}.{micros}.{row.id}"
 
-    return jsonable_encoder(new_issue)
+def decode_feed_cursor(cursor: str):
+    try:
+        rank, micros, issue_id = (int(part) for part in cursor.split("."))
+    except ValueError:
+        raise HTTPException(400, "Invalid cursor")
+    return rank, _EPOCH + timedelta(microseconds=micros), issue_id
+
+def feed_statement(user: User, limit: Optional[int] = None, after=None):
+    """SELECT for one page of `user`'s feed, starting after the decoded cursor `after`."""
+    clauses = []
+    for branch in feed_branches(user):
+        if after is None:
+            clauses.append(branch)
+            continue
+        # Mixed sort directions rule out one row comparison, so each branch
+        # becomes "rest of the current rank" + "lower ranks": both index ranges.
+        rank, created_at, issue_id = after
+        clauses.append(and_(branch, Issue.priority_rank == rank,
+                            tuple_(Issue.created_at, Issue.id) < tuple_(created_at, issue_id)))
+        clauses.append(and_(branch, Issue.priority_rank > rank))
+    order = (Issue.priority_rank, Issue.created_at.desc(), Issue.id.desc())
+    parts = [select(*FEED_COLUMNS).where(clause).order_by(*order).limit(limit) for clause in clauses]
+    if len(parts) == 1:
+        return parts[0]
+    feed = union_all(*parts).subquery("feed")
+    return select(feed).order_by(feed.c.priority_rank, feed.c.created_at.desc(), feed.c.id.desc()).limit(limit)
 
 @app.get("/issues")
-def list_issues(response: Response, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def list_issues(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=FEED_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    read_db: Session = Depends(get_read_db),
+):
     # CACHE STRATEGY: show cached data instantly; revalidate in background (5 minutes)
     response.headers["Cache-Control"] = "public, max-age=0, stale-while-revalidate=300"
+    after = decode_feed_cursor(cursor) if cursor else None
 
+    # Escalation is a write, so it stays on the primary; one UPDATE, no row loading
+    # (ix_issues_escalation only holds the open, non-High rows it can touch)
     three_days_ago = datetime.now(IST) - timedelta(days=3)
-    stale = db.query(Issue).filter(
+    db.query(Issue).filter(
         Issue.priority != "High",
         Issue.created_at < three_days_ago,
         Issue.status.in_([IssueStatus.PENDING, IssueStatus.IN_PROGRESS])
-    ).all()
-    for s in stale:
-        s.priority = "High"
-    if stale:
-        db.commit()
-
-    query = db.query(Issue).order_by(
-        case((Issue.priority == "High", 1), (Issue.priority == "Medium", 2), else_=3),
-        Issue.created_at.desc()
-    )
+    ).update({Issue.priority: "High"}, synchronize_session=False)
+    db.commit()     # also hands the primary connection back before the (replica) read
 
-    if user.role == 'student':
-        query = query.filter(
-            or_(
-                Issue.sub_location == user.hostel,
-                Issue.category.in_(['Mess', 'Academic']),
-                Issue.owner_id == user.id
-            )
-        )
+    # The feed itself may come from a replica
     try:
-        db.execute(text("SELECT 1"))    # wake / revalidate dead SSL connection
-        issues = query.all()
+        read_db.execute(text("SELECT 1"))    # wake / revalidate dead SSL connection
+        issues = read_db.execute(feed_statement(user, limit, after)).all()
+        # Owner columns in one round trip instead of a lazy load per owner
+        owner_ids = {i.owner_id for i in issues if i.owner_id is not None}
+        owners = {
+            o.id: o for o in read_db.execute(
+                select(User.id, User.full_name, User.credit_score).where(User.id.in_(owner_ids))
+            )
+        } if owner_ids else {}
     except OperationalError:
-        db.rollback()
+        read_db.rollback()
         return JSONResponse(
             status_code=503,
             content={"detail": "Database temporarily unavailable. Please retry."}
@@ -973,16 +3377,8 @@ def list_issues(response: Response, user: User = Depends(get_current_user), db:
 
     results = []
     for i in issues:
-        comments_formatted = [
-            {
-                "id": c.id,
-                "text": c.text,
-                "created_at": c.created_at,
-                "user_name": c.user.full_name if c.user else "Unknown"
-            }
-            for c in i.comments
-        ]
-
+        image_url, thumb_url = image_urls(i.image_id)
+        owner = owners.get(i.owner_id)
         issue_dict = {
             "id": i.id,
             "title": i.title,
@@ -993,52 +3389,383 @@ def list_issues(response: Response, user: User = Depends(get_current_user), db:
             "priority": i.priority,
             "status": i.status,
             "image_data": i.image_data,
+            "image_url": image_url,
+            "thumb_url": thumb_url,
             "created_at": i.created_at,
             "owner_id": i.owner_id,
-            "owner_name": i.owner.full_name if i.owner else "Unknown",
-            "owner_credit_score": i.owner.credit_score if i.owner else 0.0,
+            "owner_name": owner.full_name if owner else "Unknown",
+            "owner_credit_score": owner.credit_score if owner else 0.0,
             "rating": i.rating,
             "review": i.review,
-            "comments": comments_formatted
+            "comment_count": i.comment_count or 0,
+            "last_comment": {
+                "text": i.last_comment_preview,
+                "user_name": i.last_comment_user or "Unknown",
+                "created_at": i.last_comment_at
+            } if i.last_comment_at else None
         }
         results.append(issue_dict)
 
-    return results
+    headers = {"Cache-Control": response.headers["Cache-Control"]}
+    if limit and len(issues) == limit:
+        headers["X-Next-Cursor"] = encode_feed_cursor(issues[-1])
+    # Plain dicts of primitives/datetimes: serialise directly, no jsonable_encoder pass
+    return FastJSONResponse(results, headers=headers)
+
+# --- CAMPUS MAP ---
+# Pins are clustered on the server: the bounding box is covered with
+# 64 px cluster cells (campus_map.cell_ranges), each a contiguous span of the
+# Z-order map_cell, and one GROUP BY over those index ranges returns a count
+# and dominant category per cell. The payload depends on the screen, not on
+# how many historic issues there are. Lone issues come back as real pins.
+MAP_MAX_CELLS = int(os.getenv("MAP_MAX_CELLS", "1024"))
+MAP_OPEN_STATUSES = [IssueStatus.PENDING, IssueStatus.IN_PROGRESS]
+LOCATION_BACKFILL_BATCH = int(os.getenv("LOCATION_BACKFILL_BATCH", "500"))
+
+_SET_LOCATION_SQL = text("""
+    UPDATE issues AS i SET lat = v.lat, lng = v.lng, map_cell = v.cell
+    FROM (SELECT unnest(CAST(:subs AS varchar[])) AS sub,
+                 unnest(CAST(:specs AS varchar[])) AS spec,
+                 unnest(CAST(:lats AS float8[])) AS lat,
+                 unnest(CAST(:lngs AS float8[])) AS lng,
+                 unnest(CAST(:cells AS bigint[])) AS cell) AS v
+    WHERE i.sub_location = v.sub AND i.specific_location IS NOT DISTINCT FROM v.spec
+      AND i.map_cell IS DISTINCT FROM v.cell
+""")
+
+def backfill_issue_locations(relocate: bool = False):
+    """Give issues without coordinates their gazetteer position (every issue with relocate=True).
+
+    Works per distinct (sub_location, specific_location) rather than per row:
+    a campus has few places, however many issues it has. relocate=True after a
+    gazetteer change also clears places that were dropped. Returns rows updated.
+    """
+    with DB_LANES["background"].connect() as conn:
+        places = conn.execute(text("""
+            SELECT DISTINCT sub_location, specific_location FROM issues
+            WHERE sub_location IS NOT NULL AND (:relocate OR map_cell IS NULL)
+        """), {"relocate": relocate}).all()
+    located = []
+    for sub, spec in places:
+        where = issue_location(sub, spec)
+        if where or relocate:
+            located.append((sub, spec, where.get("lat"), where.get("lng"), where.get("map_cell")))
+    updated = 0
+    for start in range(0, len(located), LOCATION_BACKFILL_BATCH):
+        chunk = located[start:start + LOCATION_BACKFILL_BATCH]
+        with DB_LANES["background"].connect() as conn:
+            updated += conn.execute(_SET_LOCATION_SQL, dict(zip(("subs", "specs", "lats", "lngs", "cells"), map(list, zip(*chunk))))).rowcount
+    if updated:
+        print(f"✅ Issue location backfill: {updated} issue(s) placed on the map")
+    return updated
+
+@app.post("/admin/map/backfill")
+def location_backfill(background_tasks: BackgroundTasks, relocate: bool = False, user: User = Depends(get_current_user)):
+    """Locate issues in the background (relocate=true after a gazetteer change)."""
+    if user.role == 'student':
+        raise HTTPException(403, "Admins only")
+    enqueue_job(background_tasks, "backfill", backfill_issue_locations, relocate)
+    return {"msg": "Location backfill started", "relocate": relocate}
+
+@app.get("/issues/map")
+def issue_map(
+    response: Response,
+    bbox: str = Query(..., description="west,south,east,north (Leaflet's toBBoxString())"),
+    zoom: int = Query(..., ge=0, le=30),
+    status: str = "open",
+    user: User = Depends(get_current_user),
+    read_db: Session = Depends(get_read_db),
+):
+    """Clustered issue markers for the visible part of the campus map."""
+    response.headers["Cache-Control"] = "public, max-age=0, stale-while-revalidate=300"
+    try:
+        west, south, east, north = (float(v) for v in bbox.split(","))
+    except ValueError:
+        raise HTTPException(400, "bbox must be west,south,east,north")
+    if not all(map(math.isfinite, (west, south, east, north))) or west >= east or south >= north:
+        raise HTTPException(400, "bbox must be west,south,east,north")
+    if status == "open":
+        status_filter = Issue.status.in_(MAP_OPEN_STATUSES)
+    elif status == "all":
+        status_filter = true()
+    elif status in {s.value for s in IssueStatus}:
+        status_filter = Issue.status == status
+    else:
+        raise HTTPException(400, "Invalid status")
+
+    shift, ranges = cell_ranges(west, south, east, north, zoom, MAP_MAX_CELLS)
+    spans = values(column("lo", BigInteger), column("hi", BigInteger), name="spans").data(ranges)
+    cluster = Issue.map_cell.op(">>")(2 * shift).label("cluster")
+    stmt = (
+        select(
+            cluster, Issue.category, func.count().label("n"), func.min(Issue.id).label("issue_id"),
+            func.sum(Issue.lat).label("lat_sum"), func.sum(Issue.lng).label("lng_sum"),
+        )
+        .select_from(spans)
+        .join(Issue, and_(Issue.map_cell >= spans.c.lo, Issue.map_cell < spans.c.hi))
+        .where(status_filter, or_(*feed_branches(user)))
+        .group_by(cluster, Issue.category)
+    )
+    try:
+        rows = read_db.execute(stmt).all()
+        clusters = {}
+        for row in rows:
+            c = clusters.setdefault(row.cluster, {"count": 0, "lat": 0.0, "lng": 0.0, "categories": {}, "issue_id": row.issue_id})
+            c["count"] += row.n
+            c["lat"] += row.lat_sum
+            c["lng"] += row.lng_sum
+            c["categories"][row.category or "Other"] = row.n
+            c["issue_id"] = min(c["issue_id"], row.issue_id)
+        # Clusters of one are shown as the issue itself
+        single_ids = [c["issue_id"] for c in clusters.values() if c["count"] == 1]
+        singles = {
+            i.id: i for i in read_db.execute(
+                select(Issue.id, Issue.title, Issue.status, Issue.priority).where(Issue.id.in_(single_ids))
+            )
+        } if single_ids else {}
+    except OperationalError:
+        read_db.rollback()
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "Database temporarily unavailable. Please retry."}
+        )
+
+    markers = []
+    for c in clusters.values():
+        marker = {
+            "lat": round(c["lat"] / c["count"], 6),
+            "lng": round(c["lng"] / c["count"], 6),
+            "count": c["count"],
+            "dominant_category": max(c["categories"].items(), key=lambda kv: (kv[1], kv[0]))[0],
+            "categories": c["categories"],
+        }
+        issue = singles.get(c["issue_id"]) if c["count"] == 1 else None
+        if issue:
+            marker["issue"] = {"id": issue.id, "title": issue.title, "status": issue.status, "priority": issue.priority}
+        markers.append(marker)
+    markers.sort(key=lambda m: -m["count"])
+    return FastJSONResponse(
+        {"clusters": markers, "total": sum(m["count"] for m in markers)},
+        headers={"Cache-Control": response.headers["Cache-Control"]},
+    )
+
+# --- TRUST SCORE LEDGER ---
+# Every score change is a credit_ledger row plus an in-SQL increment of
+# users.credit_score, in one transaction. Status transitions lock the issue
+# rows and report the previous status, so two admins closing the same issue
+# can only award the point once.
+CREDIT_SOLVED = 1.0
+CREDIT_DEFECTED = -0.5
+LEADERBOARD_TTL_S = float(os.getenv("CACHE_LEADERBOARD_TTL_S", "60"))
+
+_TRANSITION_SQL = text("""
+    UPDATE issues AS i SET status = v.status
+    FROM (SELECT unnest(CAST(:ids AS integer[])) AS id,
+                 unnest(CAST(:statuses AS varchar[])) AS status) AS v,
+         (SELECT id, status FROM issues WHERE id = ANY(:ids) ORDER BY id FOR UPDATE) AS old
+    WHERE i.id = v.id AND old.id = v.id AND old.status IS DISTINCT FROM v.status
+    RETURNING i.id, old.status AS old_status, v.status AS new_status, i.owner_id, i.title
+""")
+
+_APPLY_CREDIT_SQL = text("""
+    UPDATE users AS u SET credit_score = coalesce(u.credit_score, 0) + v.delta
+    FROM (SELECT unnest(CAST(:ids AS integer[])) AS id,
+                 unnest(CAST(:deltas AS float8[])) AS delta) AS v
+    WHERE u.id = v.id
+""")
+
+def apply_credit_changes(db: Session, entries: list):
+    """Book ledger rows and bump scores by their per-user sum. Caller commits."""
+    if not entries:
+        return {}
+    db.execute(CreditLedgerEntry.__table__.insert(), entries)
+    per_user = {}
+    for e in entries:
+        per_user[e["user_id"]] = per_user.get(e["user_id"], 0.0) + e["delta"]
+    ids = sorted(per_user)    # fixed lock order across concurrent callers
+    db.execute(_APPLY_CREDIT_SQL, {"ids": ids, "deltas": [per_user[i] for i in ids]})
+    return per_user
+
+def transition_issue_statuses(db: Session, changes: dict, actor: User):
+    """Apply {issue_id: status} set-based; returns (changed rows, per-user credit deltas).
+
+    Must run inside a transaction. Rows already in the target status are
+    skipped, and only staff actions move trust scores.
+    """
+    ids = sorted(changes)
+    rows = db.execute(_TRANSITION_SQL, {"ids": ids, "statuses": [changes[i] for i in ids]}).mappings().all()
+    entries = []
+    if actor.role != 'student':
+        for row in rows:
+            if row["owner_id"] is None:
+                continue
+            if row["new_status"] == "Solved" and row["old_status"] != "Solved":
+                delta, reason = CREDIT_SOLVED, "issue_solved"
+            elif row["new_status"] == "Defected" and row["old_status"] != "Defected":
+                delta, reason = CREDIT_DEFECTED, "issue_defected"
+            else:
+                continue
+            entries.append({"user_id": row["owner_id"], "delta": delta, "reason": reason,
+                            "issue_id": row["id"], "actor_id": actor.id})
+    return rows, apply_credit_changes(db, entries)
+
+def status_change_email(row, owner_name: str, actor: User):
+    subject = f"CampusFix: Issue Updated to {row['new_status']}"
+    body = f"Hello {owner_name},\n\nYour issue '{row['title']}' is now: {row['new_status']}."
+    if row["new_status"] == "Solved" and actor.role != 'student':
+        body += "\n\n🎉 You earned +1 Trust Point for a valid issue!"
+    elif row["new_status"] == "Defected":
+        body += "\n\n⚠️ Your Trust Score decreased by 0.5 due to an invalid report."
+    return subject, body
+
+def after_status_changes(background_tasks: BackgroundTasks, db: Session, rows, credited: dict, actor: User):
+    """Cache invalidation and owner notifications once the transaction has committed."""
+    invalidate_issue_caches()
+    owner_ids = {r["owner_id"] for r in rows if r["owner_id"] is not None}
+    owners = {o.id: o for o in db.query(User.id, User.email, User.full_name).filter(User.id.in_(owner_ids))} if owner_ids else {}
+    if credited:
+        CACHE.invalidate_tags("leaderboard")
+        for user_id in credited:
+            if user_id in owners:
+                invalidate_principal(owners[user_id].email)
+    messages = []
+    for row in rows:
+        owner = owners.get(row["owner_id"])
+        if owner and owner.email:
+            messages.append((owner.email, *status_change_email(row, owner.full_name, actor)))
+    if len(messages) == 1:
+        enqueue_job(background_tasks, "email", send_notification, *messages[0])
+    elif messages:
+        enqueue_job(background_tasks, "email", send_notifications_batch, messages)
 
 @app.patch("/issues/{id}/status")
 async def update_status(id: int, u: IssueUpdateStatus, background_tasks: BackgroundTasks, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    issue = db.query(Issue).filter(Issue.id == id).first()
-    if not issue:
-        raise HTTPException(404)
     if user.role == 'student' and u.status not in ['Solved', 'Unnecessary']:
         raise HTTPException(403)
 
-    old_status = issue.status
+    try:
+        # Status and score must land together: real transaction, not AUTOCOMMIT
+        begin_transaction(db)
+        rows, credited = transition_issue_statuses(db, {id: u.status}, user)
+        db.commit()
+    except OperationalError:
+        db.rollback()
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "Database temporarily unavailable. Please retry."}
+        )
+
+    if not rows:
+        if not db.query(Issue.id).filter(Issue.id == id).first():
+            raise HTTPException(404)
+        return {"msg": "Updated"}
 
-    if old_status != u.status:
-        issue.status = u.status
+    after_status_changes(background_tasks, db, rows, credited, user)
+    return {"msg": "Updated"}
 
-        if issue.owner:
-            if u.status == "Solved" and old_status != "Solved":
-                if user.role != 'student':
-                    issue.owner.credit_score += 1.0
-            elif u.status == "Defected" and old_status != "Defected":
-                if user.role != 'student':
-                    issue.owner.credit_score -= 0.5
+BULK_STATUS_MAX = 1000
+ISSUE_STATUSES = {s.value for s in IssueStatus}
 
+@app.post("/issues/bulk-status")
+def bulk_update_status(body: IssueBulkStatusUpdate, background_tasks: BackgroundTasks, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Apply many status changes in one transaction; one email batch for all owners."""
+    if user.role == 'student':
+        raise HTTPException(403, "Admins only")
+    if not body.updates:
+        return {"updated": 0, "unchanged": [], "not_found": []}
+    if len(body.updates) > BULK_STATUS_MAX:
+        raise HTTPException(400, f"At most {BULK_STATUS_MAX} updates per request")
+    bad = sorted({c.status for c in body.updates} - ISSUE_STATUSES)
+    if bad:
+        raise HTTPException(400, f"Invalid status: {', '.join(bad)}")
+
+    changes = {c.id: c.status for c in body.updates}    # last entry per id wins
+    try:
+        begin_transaction(db)
+        rows, credited = transition_issue_statuses(db, changes, user)
         db.commit()
+    except OperationalError:
+        db.rollback()
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "Database temporarily unavailable. Please retry."}
+        )
 
-        if issue.owner and issue.owner.email:
-            subject = f"CampusFix: Issue Updated to {u.status}"
-            body = f"Hello {issue.owner.full_name},\n\nYour issue '{issue.title}' is now: {u.status}."
-            if u.status == "Solved" and user.role != 'student':
-                body += "\n\n🎉 You earned +1 Trust Point for a valid issue!"
-            elif u.status == "Defected":
-                body += "\n\n⚠️ Your Trust Score decreased by 0.5 due to an invalid report."
+    changed = {r["id"] for r in rows}
+    rest = [i for i in changes if i not in changed]
+    existing = {i for (i,) in db.query(Issue.id).filter(Issue.id.in_(rest))} if rest else set()
+    if rows:
+        after_status_changes(background_tasks, db, rows, credited, user)
+    return {
+        "updated": len(rows),
+        "unchanged": sorted(existing),
+        "not_found": sorted(set(rest) - existing),
+    }
 
-            background_tasks.add_task(send_notification, issue.owner.email, subject, body)
+@app.get("/leaderboard")
+def leaderboard(
+    hostel: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=100),
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+):
+    """Top students by trust score, campus-wide or for one hostel (index range scan)."""
+    def load():
+        q = db.query(User.id, User.full_name, User.hostel, User.credit_score).filter(User.role == 'student')
+        if hostel:
+            q = q.filter(User.hostel == hostel)
+        rows = q.order_by(User.credit_score.desc().nulls_last(), User.id).limit(limit).all()
+        return [
+            {"rank": n, "id": r.id, "full_name": r.full_name, "hostel": r.hostel, "credit_score": r.credit_score or 0.0}
+            for n, r in enumerate(rows, start=1)
+        ]
 
-    return {"msg": "Updated"}
+    entries = CACHE.get_or_set(f"leaderboard:{hostel or '*'}:{limit}", load, LEADERBOARD_TTL_S, tags=["leaderboard"])
+    me = None
+    if user.role == 'student':
+        # The cached principal's score can be minutes old; rank off the row
+        score = db.query(func.coalesce(User.credit_score, 0.0)).filter(User.id == user.id).scalar_subquery()
+        ahead = db.query(score, func.count(User.id)).filter(User.role == 'student', User.credit_score > score)
+        if hostel:
+            ahead = ahead.filter(User.hostel == hostel)
+        current, count = ahead.one()
+        me = {"rank": count + 1, "credit_score": current or 0.0}
+    return {"hostel": hostel, "entries": entries, "me": me}
+
+def reconcile_credit_scores():
+    """Recompute every users.credit_score from the ledger in one UPDATE; returns rows fixed."""
+    db = background_session()
+    try:
+        db.connection(execution_options={"isolation_level": "READ COMMITTED"})
+        # Hold off new ledger rows so the sums can't miss an in-flight change
+        db.execute(text("LOCK TABLE credit_ledger IN SHARE MODE"))
+        fixed = db.execute(text("""
+            UPDATE users AS u SET credit_score = coalesce(l.total, 0)
+            FROM users AS base
+            LEFT JOIN (SELECT user_id, sum(delta) AS total FROM credit_ledger GROUP BY user_id) AS l
+                   ON l.user_id = base.id
+            WHERE u.id = base.id AND u.credit_score IS DISTINCT FROM coalesce(l.total, 0)
+            RETURNING u.email
+        """)).scalars().all()
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    if fixed:
+        CACHE.invalidate_tags("leaderboard")
+        for email in fixed:
+            invalidate_principal(email)
+    print(f"✅ Credit reconciliation: {len(fixed)} score(s) corrected")
+    return len(fixed)
+
+@app.post("/admin/credit/reconcile")
+def reconcile_credit(user: User = Depends(get_current_user)):
+    """Rebuild trust scores from the ledger (safe to run any time)."""
+    if user.role == 'student':
+        raise HTTPException(403, "Admins only")
+    return {"corrected": reconcile_credit_scores()}
 
 @app.delete("/issues/{id}")
 def delete_issue(id: int, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
@@ -1047,86 +3774,445 @@ def delete_issue(id: int, user: User = Depends(get_current_user), db: Session =
         raise HTTPException(404)
     if user.role == 'student' and issue.owner_id != user.id:
         raise HTTPException(403)
+    owner_id = issue.owner_id
     db.delete(issue)
     db.commit()
+    invalidate_issue_caches(owner_id)
     return {"msg": "Deleted"}
 
-@app.post("/issues/{id}/comments")
-async def add_comment(id: int, c: CommentCreate, background_tasks: BackgroundTasks, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    issue = db.query(Issue).filter(Issue.id == id).first()
+COMMENT_PREVIEW_CHARS = 140
+
+def insert_comment(db: Session, id: int, c: CommentCreate, user: User):
+    """Add the comment and bump the issue's feed summary. No commit: callers
+    run this inside a real transaction so the two writes land together.
+
+    Returns the (id, owner_id, title, owner_email) row the notification needs;
+    the issue itself is never loaded (image_data can be a large base64 blob).
+    """
+    issue = db.query(Issue.id, Issue.owner_id, Issue.title, User.email.label("owner_email")) \
+        .outerjoin(User, User.id == Issue.owner_id) \
+        .filter(Issue.id == id).first()
     if not issue:
         raise HTTPException(404)
 
     db.add(Comment(text=c.text, issue_id=id, user_id=user.id))
-    db.commit()
-
-    if issue.owner and issue.owner.id != user.id and issue.owner.email:
+    # Bump the feed summary in SQL so concurrent commenters don't lose counts
+    db.query(Issue).filter(Issue.id == id).update({
+        Issue.comment_count: func.coalesce(Issue.comment_count, 0) + 1,
+        Issue.last_comment_at: func.now(),
+        Issue.last_comment_user: user.full_name,
+        Issue.last_comment_preview: (c.text or "")[:COMMENT_PREVIEW_CHARS],
+    }, synchronize_session=False)
+    return issue
+
+def comment_added(background_tasks: BackgroundTasks, issue, c: CommentCreate, user: User):
+    """After-commit side effects of a comment (issue = insert_comment's row): tell the issue owner."""
+    if issue.owner_email and issue.owner_id != user.id:
         subject = f"New Comment on '{issue.title}'"
         body = f"Hello,\n\n{user.full_name} commented: \"{c.text}\""
-        background_tasks.add_task(send_notification, issue.owner.email, subject, body)
+        enqueue_job(background_tasks, "email", send_notification, issue.owner_email, subject, body)
 
+@app.post("/issues/{id}/comments")
+async def add_comment(id: int, c: CommentCreate, background_tasks: BackgroundTasks, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    # The comment and the issue's comment_count must land together
+    begin_transaction(db)
+    issue = insert_comment(db, id, c, user)
+    db.commit()
+    comment_added(background_tasks, issue, c, user)
     return {"msg": "Comment Added"}
 
-@app.patch("/issues/{id}/rate")
-def rate_issue(id: int, r: RatingCreate, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+@app.get("/issues/{id}/comments")
+def list_comments(
+    id: int,
+    cursor: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=100),
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Oldest-first page of a ticket's thread; pass `next_cursor` back as `cursor`."""
+    # Same visibility as the feed: a thread the caller can't see is a 404
+    if not db.query(Issue.id).filter(Issue.id == id, or_(*feed_branches(user))).first():
+        raise HTTPException(404)
+
+    query = db.query(Comment.id, Comment.text, Comment.created_at, User.full_name) \
+        .outerjoin(User, User.id == Comment.user_id) \
+        .filter(Comment.issue_id == id)
+    if cursor:
+        query = query.filter(Comment.id > cursor)
+    rows = query.order_by(Comment.id.asc()).limit(limit + 1).all()
+
+    has_more = len(rows) > limit
+    items = [
+        {"id": cid, "text": ctext, "created_at": created_at, "user_name": name or "Unknown"}
+        for cid, ctext, created_at, name in rows[:limit]
+    ]
+    return FastJSONResponse({
+        "items": items,
+        "next_cursor": items[-1]["id"] if has_more else None,
+    })
+
+def apply_issue_rating(db: Session, id: int, r: RatingCreate):
     issue = db.query(Issue).filter(Issue.id == id).first()
     if not issue or issue.status != "Solved":
         raise HTTPException(400, "Issue must be Solved to rate.")
 
     issue.rating = r.rating
     issue.review = r.review
+
+@app.patch("/issues/{id}/rate")
+def rate_issue(id: int, r: RatingCreate, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    apply_issue_rating(db, id, r)
     db.commit()
     return {"msg": "Rated"}
 
+# --- BATCHED WRITES ---
+# The app's offline queue replays its writes through POST /batch in one
+# request: one TLS handshake, one token check and one DB transaction instead
+# of one of each per write. Each operation names the route it stands for and
+# runs that route's own logic inside a SAVEPOINT, so a failing operation is
+# rolled back alone and the rest still commit together (unless `atomic`).
+# Emails, Sheets rows and cache invalidation happen only after the commit.
+BATCH_MAX_OPERATIONS = int(os.getenv("BATCH_MAX_OPERATIONS", "50"))
+
+def _batch_create_issue(db: Session, user: User, params: dict, body: dict):
+    i = IssueCreate(**body)
+    check_image_ref(db, i.image_id, user)
+    issue = Issue(**i.dict(), owner_id=user.id, **issue_location(i.sub_location, i.specific_location))
+    db.add(issue)
+    db.flush()
+    db.refresh(issue)
+    return new_issue_payload(issue, user), lambda bg: issue_created(bg, issue, user)
+
+def _batch_add_comment(db: Session, user: User, params: dict, body: dict):
+    c = CommentCreate(**body)
+    issue = insert_comment(db, int(params["id"]), c, user)
+    db.flush()
+    return {"msg": "Comment Added"}, lambda bg: comment_added(bg, issue, c, user)
+
+def _batch_rate_issue(db: Session, user: User, params: dict, body: dict):
+    apply_issue_rating(db, int(params["id"]), RatingCreate(**body))
+    db.flush()
+    return {"msg": "Rated"}, None
+
+def _batch_rate_mess(db: Session, user: User, params: dict, body: dict):
+    r = MessRatingCreate(**body)
+    rating_id, updated, week_start = record_mess_vote(db, r, user)
+    payload = {"msg": "Vote updated" if updated else "Vote recorded", "id": rating_id, "week_start": week_start}
+    return payload, lambda bg: mess_vote_recorded(bg, r, user, rating_id)
+
+def _batch_update_profile(db: Session, user: User, params: dict, body: dict):
+    row = db.query(User).filter(User.id == user.id).first()
+    apply_profile_update(row, UserUpdate(**body))
+    db.flush()
+    return user_to_dict(row), lambda bg: invalidate_principal(row.email)
+
+BATCH_ROUTES = [
+    ("POST", re.compile(r"^/issues$"), _batch_create_issue),
+    ("POST", re.compile(r"^/issues/(?P<id>\d+)/comments$"), _batch_add_comment),
+    ("PATCH", re.compile(r"^/issues/(?P<id>\d+)/rate$"), _batch_rate_issue),
+    ("POST", re.compile(r"^/mess/rate$"), _batch_rate_mess),
+    ("PUT", re.compile(r"^/users/me$"), _batch_update_profile),
+]
+
+def _batch_handler(method: str, path: str):
+    for route_method, pattern, handler in BATCH_ROUTES:
+        match = pattern.match(path.split("?", 1)[0])
+        if match and route_method == method.upper():
+            return handler, match.groupdict()
+    return None, None
+
+@app.post("/batch")
+def run_batch(b: BatchRequest, background_tasks: BackgroundTasks, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Run queued writes in order; one result per operation, in the same order.
+
+    Each result carries the status and body the single-request route would
+    have returned (409 for a constraint violation, 500 for an unexpected
+    error). With atomic=true the first failure rolls everything back
+    and the other operations report 424.
+    """
+    if not b.operations:
+        raise HTTPException(400, "No operations")
+    if len(b.operations) > BATCH_MAX_OPERATIONS:
+        raise HTTPException(413, f"At most {BATCH_MAX_OPERATIONS} operations per batch")
+
+    results, followups = [], []
+    # Follow-ups (Sheets rows, emails) read the new rows after the session is
+    # gone; keep what was loaded instead of expiring it at commit
+    db.expire_on_commit = False
+    try:
+        # One real transaction for the whole batch (the engine is AUTOCOMMIT)
+        begin_transaction(db)
+        for n, op in enumerate(b.operations):
+            handler, params = _batch_handler(op.method, op.path)
+            if handler is None:
+                results.append({"status": 404, "detail": f"Unsupported operation: {op.method} {op.path}"})
+                failed = True
+            else:
+                savepoint = db.begin_nested()
+                try:
+                    payload, followup = handler(db, user, params, op.body)
+                    savepoint.commit()
+                    results.append({"status": 200, "body": payload})
+                    followups.append(followup)
+                    failed = False
+                except HTTPException as exc:
+                    savepoint.rollback()
+                    results.append({"status": exc.status_code, "detail": exc.detail})
+                    failed = True
+                except ValidationError as exc:
+                    savepoint.rollback()
+                    results.append({"status": 422, "detail": jsonable_encoder(exc.errors(include_url=False))})
+                    failed = True
+                except OperationalError:
+                    raise   # connection lost: the whole batch is gone (503 below)
+                except IntegrityError as exc:
+                    savepoint.rollback()
+                    print(f"❌ Batch operation {n} ({op.method} {op.path}) conflicted: {exc.orig}")
+                    results.append({"status": 409, "detail": "Conflicts with existing data"})
+                    failed = True
+                except SQLAlchemyError as exc:
+                    savepoint.rollback()
+                    print(f"❌ Batch operation {n} ({op.method} {op.path}) failed in the DB: {exc!r}")
+                    results.append({"status": 500, "detail": "Database error"})
+                    failed = True
+                except Exception as exc:
+                    # A bug in the handler fails this operation only
+                    savepoint.rollback()
+                    print(f"❌ Batch operation {n} ({op.method} {op.path}) failed: {exc!r}")
+                    results.append({"status": 500, "detail": "Internal Server Error"})
+                    failed = True
+            if failed and b.atomic:
+                db.rollback()
+                note = {"status": 424, "detail": f"Not applied: operation {n} failed"}
+                results = [note if r["status"] == 200 else r for r in results]
+                results += [note] * (len(b.operations) - n - 1)
+                return {"results": results, "committed": False}
+        db.commit()
+    except OperationalError:
+        db.rollback()
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "Database temporarily unavailable. Please retry."}
+        )
+
+    for followup in followups:
+        if followup is not None:
+            followup(background_tasks)
+    return {"results": results, "committed": True}
+
 @app.get("/stats", response_model=DashboardStats)
-def stats(response: Response, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def stats(response: Response, user: User = Depends(get_current_user), db: Session = Depends(get_read_db)):
     # Cache stats for 1 minute (background refresh)
     response.headers["Cache-Control"] = "public, max-age=0, stale-while-revalidate=60"
 
-    total = db.query(Issue).count()
-    pending = db.query(Issue).filter(Issue.status == "Pending").count()
-    resolved = db.query(Issue).filter(Issue.status == "Solved").count()
-    my_issues = db.query(Issue).filter(Issue.owner_id == user.id).count()
-    return {"total_issues": total, "pending": pending, "resolved": resolved, "my_issues": my_issues}
-
-import io
-import csv
-import os
-from datetime import datetime, timedelta
-import pytz
-
-# FastAPI & Database
-from fastapi import Depends, HTTPException, Query
-from fastapi.responses import StreamingResponse, JSONResponse
-from sqlalchemy.orm import Session
-from sqlalchemy import text
-from sqlalchemy.exc import OperationalError
-
-# ReportLab (PDF Generation)
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image as RLImage
-from reportlab.platypus.flowables import HRFlowable
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.graphics.shapes import Drawing, Rect, String
-from reportlab.graphics.charts.barcharts import VerticalBarChart
-from reportlab.graphics.charts.piecharts import Pie
-
-# Define Timezone (Prevents crash if IST is missing)
-# IST = pytz.timezone('Asia/Kolkata')
+    # Campus-wide counts are shared by everyone; the per-owner count is keyed per user
+    counts = CACHE.get_or_set("stats:global", lambda: issue_counts(db), STATS_TTL_S, tags=["issues"])
+    my_issues = CACHE.get_or_set(
+        f"stats:owner:{user.id}",
+        lambda: db.query(Issue).filter(Issue.owner_id == user.id).count(),
+        STATS_TTL_S, tags=[f"issues:owner:{user.id}"],
+    )
+    return {**counts, "my_issues": my_issues}
 
 # ==========================================
 # 8. REPORT GENERATION (PRODUCTION)
 # ==========================================
 
+# Above this many rows the PDF switches to page-sized LongTable chunks with
+# fixed row heights. One big Table is re-measured and copied on every page
+# split, which grows quadratically; one-page chunks are laid out once each.
+REPORT_LARGE_ROWS = int(os.getenv("REPORT_LARGE_ROWS", "500"))
+
+REPORT_COL_WIDTHS_IN = {
+    'issues': [0.45, 0.8, 1.1, 0.9, 0.7, 0.9, 1.1],
+    'mess': [0.8, 0.9, 0.7, 0.7, 0.7, 0.8, 1.5],
+}
+
+# Status cell fills for issue reports, first match wins
+REPORT_STATUS_FILLS = (
+    ('Resolved', '#dcfce7'),
+    ('Solved', '#dcfce7'),
+    ('Progress', '#fef3c7'),
+    ('Pending', '#fee2e2'),
+)
+
+_REPORT_ASSETS = None
+
+
+def _build_report_assets():
+    from reportlab.lib import colors
+    from reportlab.lib.units import inch
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.platypus import Flowable, LongTable, TableStyle
+
+    base = getSampleStyleSheet()
+    styles = {
+        'normal': base['Normal'],
+        'title': ParagraphStyle('CustomTitle', parent=base['Heading1'], fontSize=24, fontName='Helvetica-Bold', textColor=colors.HexColor('#1e293b'), spaceAfter=0, alignment=2),  # RIGHT align
+        'meta': ParagraphStyle('HeaderMeta', parent=base['Normal'], fontSize=10, fontName='Helvetica', textColor=colors.HexColor('#94a3b8'), spaceAfter=10),
+        'stats_label': ParagraphStyle('StatsLabel', parent=base['Normal'], fontSize=10, fontName='Helvetica', textColor=colors.HexColor('#64748b'), alignment=1),
+        'stats_value': ParagraphStyle('StatsValue', parent=base['Normal'], fontSize=20, fontName='Helvetica-Bold', textColor=colors.HexColor('#4f46e5'), alignment=1, spaceAfter=5),
+        'section': ParagraphStyle('SectionTitle', parent=base['Heading2'], fontSize=14, fontName='Helvetica-Bold', textColor=colors.HexColor('#1e293b'), spaceAfter=15),
+        'records': ParagraphStyle('SectionTitle', parent=base['Heading2'], fontSize=12, fontName='Helvetica-Bold', textColor=colors.HexColor('#1e293b'), spaceAfter=12),
+        'footer': ParagraphStyle('Footer', parent=base['Normal'], fontSize=8, fontName='Helvetica', textColor=colors.HexColor('#94a3b8'), alignment=1),
+        'logo_text': ParagraphStyle('LogoText', parent=base['Normal'], fontSize=20, fontName='Helvetica-Bold', textColor=colors.HexColor('#4f46e5'), alignment=0),
+    }
+
+    table_cmds = [
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4f46e5')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 9),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('TOPPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8fafc')]),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#e2e8f0')),
+        ('ALIGN', (0, 1), (-1, -1), 'CENTER'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 1), (-1, -1), 8.5),
+        ('LEFTPADDING', (0, 0), (-1, -1), 6),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 6),
+        ('TOPPADDING', (0, 1), (-1, -1), 8),
+        ('BOTTOMPADDING', (0, 1), (-1, -1), 8),
+    ]
+
+    # Measure a one-line header and data row once so large reports can pass
+    # rowHeights and skip per-cell measurement.
+    probe = LongTable([["ID"], ["0"]], style=table_cmds)
+    probe.wrap(6 * inch, 10 * inch)
+    header_height, row_height = probe._rowHeights
+
+    col_widths = {kind: [w * inch for w in widths] for kind, widths in REPORT_COL_WIDTHS_IN.items()}
+    status_fills = [(word, colors.HexColor(hex_color)) for word, hex_color in REPORT_STATUS_FILLS]
+
+    class RecordRows(Flowable):
+        """Rows not placed yet; each split emits a LongTable filling one frame."""
+
+        def __init__(self, kind, headers, rows, start=0):
+            Flowable.__init__(self)
+            self.hAlign = 'CENTER'   # same placement as a Table
+            self.kind, self.headers, self.rows, self.start = kind, headers, rows, start
+
+        def _table(self, count):
+            # Fixed heights need one-line cells; the cells are already truncated
+            rows = [[" ".join(str(cell).split()) for cell in row] for row in self.rows[self.start:self.start + count]]
+            cmds = list(table_cmds)
+            if self.kind == 'issues':
+                cmds += _status_fill_cmds(rows, 1, status_fills)
+            return LongTable([self.headers] + rows, colWidths=col_widths[self.kind],
+                             rowHeights=[header_height] + [row_height] * len(rows), style=cmds)
+
+        def wrap(self, availWidth, availHeight):
+            self.width = sum(col_widths[self.kind])
+            self.height = header_height + row_height * (len(self.rows) - self.start)
+            return self.width, self.height
+
+        def split(self, availWidth, availHeight):
+            count = int((availHeight - header_height) // row_height)
+            if count < 1:
+                return []
+            return [self._table(count), RecordRows(self.kind, self.headers, self.rows, self.start + count)]
+
+        def draw(self):
+            table = self._table(len(self.rows) - self.start)
+            table.wrapOn(self.canv, self.width, self.height)
+            table.drawOn(self.canv, 0, 0)
+
+    logo_path = "logo.png"  # Path to your logo file
+    logo = None
+    if os.path.exists(logo_path):
+        with open(logo_path, "rb") as fh:
+            logo = fh.read()
+
+    return {
+        'styles': styles,
+        'table_cmds': table_cmds,
+        'header_table_style': TableStyle([
+            ('ALIGN', (0, 0), (0, 0), 'LEFT'),
+            ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ]),
+        'stats_table_style': TableStyle([
+            ('BACKGROUND', (0, 1), (-1, 1), colors.HexColor('#f1f5f9')),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('LEFTPADDING', (0, 0), (-1, -1), 10),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 10),
+            ('TOPPADDING', (0, 0), (-1, 0), 15),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 15),
+            ('TOPPADDING', (0, 1), (-1, 1), 10),
+            ('BOTTOMPADDING', (0, 1), (-1, 1), 10),
+            ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#e2e8f0')),
+            ('LINEBELOW', (0, 0), (-1, 0), 1, colors.HexColor('#e2e8f0')),
+        ]),
+        'chart_table_style': TableStyle([
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ]),
+        'col_widths': col_widths,
+        'status_fills': status_fills,
+        'RecordRows': RecordRows,
+        'header_height': header_height,
+        'row_height': row_height,
+        'logo': logo,
+    }
+
+
+def report_assets():
+    """Styles, table commands and the logo bytes, built once per process."""
+    global _REPORT_ASSETS
+    if _REPORT_ASSETS is None:
+        with _INTEGRATION_LOCK:
+            if _REPORT_ASSETS is None:
+                _REPORT_ASSETS = _build_report_assets()
+    return _REPORT_ASSETS
+
+
+def _status_fill_cmds(rows, first_row, status_fills):
+    """BACKGROUND commands for the status column, one per run of equal fills."""
+    cmds = []
+    run_fill, run_start = None, 0
+    for offset, row in enumerate(rows + [None]):
+        fill = None
+        if row is not None:
+            fill = next((color for word, color in status_fills if word in (row[5] or '')), None)
+        if fill is not run_fill:
+            if run_fill is not None:
+                cmds.append(('BACKGROUND', (5, first_row + run_start), (5, first_row + offset - 1), run_fill))
+            run_fill, run_start = fill, offset
+    return cmds
+
+
+def report_table_flowables(kind, headers, data):
+    """The "Detailed Records" section: a title plus the records table.
+
+    Small reports get a single LongTable. Large ones get a RecordRows stream
+    that is cut into one LongTable per frame while the document is laid out,
+    so only the page being placed is ever materialised.
+    """
+    from reportlab.platypus import LongTable, Paragraph
+
+    assets = report_assets()
+    title = Paragraph(f"<b>Detailed Records ({len(data)} entries)</b>", assets['styles']['records'])
+    if len(data) > REPORT_LARGE_ROWS:
+        return [title, assets['RecordRows'](kind, headers, data)]
+
+    cmds = list(assets['table_cmds'])
+    if kind == 'issues':
+        cmds += _status_fill_cmds(data, 1, assets['status_fills'])
+    return [title, LongTable([headers] + data, colWidths=assets['col_widths'][kind], repeatRows=1, style=cmds)]
+
+
 @app.get("/reports/download")
 def download_report(
     type: str,
     report_range: str = Query(..., alias="range"),
     format: str = "pdf",
     user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_report_read_db)
 ):
     print(f"REPORT: type={type}, range={report_range}, user={user.email}")
     # validate report type always
@@ -1217,7 +4303,16 @@ def download_report(
     stats_summary = {}
 
     if type == 'issues':
-        rows = db.query(Issue).filter(Issue.created_at >= query_date).all()
+        # Only the printed columns: full rows would drag image_data along
+        rows = (
+            db.query(
+                Issue.id, Issue.created_at, Issue.sub_location, Issue.category,
+                Issue.priority, Issue.status, User.full_name.label("owner_name"),
+            )
+            .outerjoin(User, User.id == Issue.owner_id)
+            .filter(Issue.created_at >= query_date)
+            .all()
+        )
         headers = ["ID", "Date", "Location", "Category", "Priority", "Status", "Student"]
 
         total_issues = len(rows)
@@ -1251,11 +4346,18 @@ def download_report(
                 r.category or "-",
                 r.priority or "-",
                 r.status,
-                r.owner.full_name if r.owner else "Unknown"
+                r.owner_name or "Unknown"
             ])
 
     elif type == 'mess':
-        rows = db.query(MessRating).filter(MessRating.created_at >= query_date).all()
+        rows = (
+            db.query(
+                MessRating.created_at, MessRating.mess_name, MessRating.hygiene,
+                MessRating.taste, MessRating.quality, MessRating.review,
+            )
+            .filter(MessRating.created_at >= query_date)
+            .all()
+        )
         headers = ["Date", "Mess Hall", "Hygiene", "Taste", "Quality", "Overall Rating", "Review"]
 
         total_ratings = len(rows)
@@ -1290,6 +4392,16 @@ def download_report(
 
     # 3. Generate ENHANCED PDF
     if format == 'pdf':
+        # ReportLab is only needed here; importing it lazily keeps startup fast
+        from reportlab.lib import colors
+        from reportlab.lib.pagesizes import letter
+        from reportlab.lib.units import inch
+        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, Image as RLImage
+        from reportlab.platypus.flowables import HRFlowable
+        from reportlab.graphics.shapes import Drawing, Rect, String
+        from reportlab.graphics.charts.barcharts import VerticalBarChart
+        from reportlab.graphics.charts.piecharts import Pie
+
         buffer = io.BytesIO()
         doc = SimpleDocTemplate(
             buffer,
@@ -1300,36 +4412,25 @@ def download_report(
             bottomMargin=50
         )
         elements = []
-        styles = getSampleStyleSheet()
-        
-        # Define Custom Styles
-        title_style = ParagraphStyle('CustomTitle', parent=styles['Heading1'], fontSize=24, fontName='Helvetica-Bold', textColor=colors.HexColor('#1e293b'), spaceAfter=0, alignment=2)  # RIGHT align
-        subtitle_style = ParagraphStyle('CustomSubtitle', parent=styles['Normal'], fontSize=14, fontName='Helvetica', textColor=colors.HexColor('#64748b'), spaceAfter=20, alignment=0)
-        header_meta_style = ParagraphStyle('HeaderMeta', parent=styles['Normal'], fontSize=10, fontName='Helvetica', textColor=colors.HexColor('#94a3b8'), spaceAfter=10)
-        stats_label_style = ParagraphStyle('StatsLabel', parent=styles['Normal'], fontSize=10, fontName='Helvetica', textColor=colors.HexColor('#64748b'), alignment=1)
-        stats_value_style = ParagraphStyle('StatsValue', parent=styles['Normal'], fontSize=20, fontName='Helvetica-Bold', textColor=colors.HexColor('#4f46e5'), alignment=1, spaceAfter=5)
+        # Styles, table commands and the logo are shared across reports
+        assets = report_assets()
+        styles = assets['styles']
+        header_meta_style = styles['meta']
+        stats_label_style = styles['stats_label']
+        stats_value_style = styles['stats_value']
 
         # --- FIXED HEADER WITH LOGO IMAGE ---
-        logo_path = "logo.png"  # Path to your logo file
-
-        # Check if logo exists, otherwise use text fallback
-        if os.path.exists(logo_path):
-            logo = RLImage(logo_path, width=1.2*inch, height=1.2*inch)
+        if assets['logo'] is not None:
+            logo = RLImage(io.BytesIO(assets['logo']), width=1.2*inch, height=1.2*inch)
             logo.hAlign = 'LEFT'
         else:
             # Fallback: Create a styled text logo
-            logo = Paragraph("<b><font size=20 color='#4f46e5'>CAMPUS</font><br/><font size=20 color='#4f46e5'>FIX</font></b>",
-                           ParagraphStyle('LogoText', parent=styles['Normal'], fontSize=20, fontName='Helvetica-Bold', textColor=colors.HexColor('#4f46e5'), alignment=0))
+            logo = Paragraph("<b><font size=20 color='#4f46e5'>CAMPUS</font><br/><font size=20 color='#4f46e5'>FIX</font></b>", styles['logo_text'])
 
-        title = Paragraph(f"<b>{type.capitalize()} Report</b>", title_style)
+        title = Paragraph(f"<b>{type.capitalize()} Report</b>", styles['title'])
 
         header_data = [[logo, title]]
-        header_table = Table(header_data, colWidths=[2*inch, 4.5*inch])
-        header_table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (0, 0), 'LEFT'),
-            ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ]))
+        header_table = Table(header_data, colWidths=[2*inch, 4.5*inch], style=assets['header_table_style'])
         elements.append(header_table)
         elements.append(Spacer(1, 15))
 
@@ -1380,25 +4481,12 @@ def download_report(
                     ]
                 ]
 
-            stats_table = Table(stats_data, colWidths=[1.3*inch]*5)
-            stats_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 1), (-1, 1), colors.HexColor('#f1f5f9')),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                ('LEFTPADDING', (0, 0), (-1, -1), 10),
-                ('RIGHTPADDING', (0, 0), (-1, -1), 10),
-                ('TOPPADDING', (0, 0), (-1, 0), 15),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 15),
-                ('TOPPADDING', (0, 1), (-1, 1), 10),
-                ('BOTTOMPADDING', (0, 1), (-1, 1), 10),
-                ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#e2e8f0')),
-                ('LINEBELOW', (0, 0), (-1, 0), 1, colors.HexColor('#e2e8f0')),
-            ]))
+            stats_table = Table(stats_data, colWidths=[1.3*inch]*5, style=assets['stats_table_style'])
             elements.append(stats_table)
             elements.append(Spacer(1, 30))
 
         # 🎨 FIXED VISUAL CHARTS SECTION
-        elements.append(Paragraph("<b>Visual Analytics</b>", ParagraphStyle('SectionTitle', parent=styles['Heading2'], fontSize=14, fontName='Helvetica-Bold', textColor=colors.HexColor('#1e293b'), spaceAfter=15)))
+        elements.append(Paragraph("<b>Visual Analytics</b>", styles['section']))
 
         if type == 'issues' and stats_summary['total'] > 0:
             drawing1 = Drawing(250, 220)
@@ -1452,11 +4540,7 @@ def download_report(
                 drawing2.add(title_text2)
                 drawing2.add(bar)
 
-            chart_table = Table([[drawing1, drawing2]], colWidths=[3*inch, 3.5*inch])
-            chart_table.setStyle(TableStyle([
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ]))
+            chart_table = Table([[drawing1, drawing2]], colWidths=[3*inch, 3.5*inch], style=assets['chart_table_style'])
             elements.append(chart_table)
             elements.append(Spacer(1, 25))
 
@@ -1500,55 +4584,15 @@ def download_report(
 
         # --- DATA TABLE SECTION ---
         if data:
-            elements.append(Paragraph(f"<b>Detailed Records ({len(data)} entries)</b>", ParagraphStyle('SectionTitle', parent=styles['Heading2'], fontSize=12, fontName='Helvetica-Bold', textColor=colors.HexColor('#1e293b'), spaceAfter=12)))
-
-            table_data = [headers] + data
-            if type == 'issues':
-                col_widths = [0.45*inch, 0.8*inch, 1.1*inch, 0.9*inch, 0.7*inch, 0.9*inch, 1.1*inch]
-            else:
-                col_widths = [0.8*inch, 0.9*inch, 0.7*inch, 0.7*inch, 0.7*inch, 0.8*inch, 1.5*inch]
-
-            table = Table(table_data, colWidths=col_widths)
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4f46e5')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 9),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('TOPPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8fafc')]),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#e2e8f0')),
-                ('ALIGN', (0, 1), (-1, -1), 'CENTER'),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 1), (-1, -1), 8.5),
-                ('LEFTPADDING', (0, 0), (-1, -1), 6),
-                ('RIGHTPADDING', (0, 0), (-1, -1), 6),
-                ('TOPPADDING', (0, 1), (-1, -1), 8),
-                ('BOTTOMPADDING', (0, 1), (-1, -1), 8),
-            ]))
-
-            if type == 'issues':
-                for i in range(1, len(data) + 1):
-                    status = data[i-1][5]
-                    if 'Resolved' in status or 'Solved' in status:
-                        table.setStyle(TableStyle([('BACKGROUND', (5, i), (5, i), colors.HexColor('#dcfce7'))]))
-                    elif 'Progress' in status:
-                        table.setStyle(TableStyle([('BACKGROUND', (5, i), (5, i), colors.HexColor('#fef3c7'))]))
-                    elif 'Pending' in status:
-                        table.setStyle(TableStyle([('BACKGROUND', (5, i), (5, i), colors.HexColor('#fee2e2'))]))
-
-            elements.append(table)
+            elements.extend(report_table_flowables(type, headers, data))
         else:
-            elements.append(Paragraph("<b>No records found for this period.</b>", styles['Normal']))
+            elements.append(Paragraph("<b>No records found for this period.</b>", styles['normal']))
 
         # --- FOOTER SECTION ---
         elements.append(Spacer(1, 30))
         elements.append(HRFlowable(width="100%", thickness=1, color=colors.HexColor('#e2e8f0')))
 
-        footer_text = ParagraphStyle('Footer', parent=styles['Normal'], fontSize=8, fontName='Helvetica', textColor=colors.HexColor('#94a3b8'), alignment=1)
+        footer_text = styles['footer']
         elements.append(Spacer(1, 10))
         elements.append(Paragraph("📋 CampusFix Maintenance Portal | 🔐 Confidential Report | Generated by AI System<br/>⚖️ Authorized Personnel Only | Report valid for 30 days", footer_text))
 
@@ -1588,6 +4632,199 @@ def download_report(
             }
         )
 
+# ==========================================
+# 9. BULK EXPORT (NDJSON / ARROW / PARQUET)
+# ==========================================
+# GET /export/{table} streams full issues, comments or mess_ratings rows for
+# analytics tooling. The CSV report above is meant for people: it has summary
+# lines on top and truncates reviews. Rows come from a server-side cursor
+# inside one REPEATABLE READ transaction. Memory stays at one batch, and the
+# export is a single consistent snapshot.
+#
+# Incremental pulls use one of two watermarks:
+#   ?since_id=N                     rows with id > N (new rows only)
+#   ?updated_since=TS&after_id=N    rows with (updated_at, id) > (TS, N),
+#                                   which also catches edits and status changes
+# Only rows older than EXPORT_SETTLE_S are returned. A transaction that
+# commits late therefore cannot land behind a watermark the client has
+# already moved past. id and updated_at are always included, so clients
+# resume from the last row they received. X-Export-Until is this pull's
+# cutoff.
+#
+# ?fields=id,status,... picks the columns. The default is every column except
+# the legacy base64 image_data. format=arrow (IPC stream) and format=parquet
+# need pyarrow. Parquet is spooled to a temp file first because its footer is
+# written last.
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", "2000"))
+EXPORT_SETTLE_S = float(os.getenv("EXPORT_SETTLE_S", "30"))
+
+EXPORT_TABLES = {
+    "issues": Issue.__table__,
+    "comments": Comment.__table__,
+    "mess_ratings": MessRating.__table__,
+}
+EXPORT_DEFAULT_EXCLUDED = {"image_data"}
+EXPORT_FORMATS = {
+    # format: (media type, file extension)
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+EXPORT_ROWS = Counter("campusfix_export_rows_total", "Rows streamed by /export, by table and format.")
+
+def export_columns(table, fields: Optional[str]):
+    """Requested column names, with the resume position (id, updated_at) first."""
+    if fields:
+        names = [name.strip() for name in fields.split(",") if name.strip()]
+        unknown = [name for name in names if name not in table.c]
+        if unknown:
+            raise HTTPException(400, f"Unknown field(s) for {table.name}: {', '.join(unknown)}")
+    else:
+        names = [col.name for col in table.c if col.name not in EXPORT_DEFAULT_EXCLUDED]
+    return list(dict.fromkeys(["id", "updated_at"] + names))
+
+def _ndjson_line(record: dict) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE)
+    return json.dumps(record, ensure_ascii=False, default=lambda v: v.isoformat()).encode() + b"\n"
+
+def _arrow_schema(columns):
+    import pyarrow as pa
+
+    def arrow_type(col):
+        if isinstance(col.type, Integer):
+            return pa.int64()
+        if isinstance(col.type, Float):
+            return pa.float64()
+        if isinstance(col.type, DateTime):
+            return pa.timestamp("us", tz="UTC")
+        if isinstance(col.type, ARRAY):
+            return pa.list_(pa.string())
+        return pa.string()
+
+    return pa.schema([pa.field(col.name, arrow_type(col)) for col in columns])
+
+def _arrow_batch(schema, rows):
+    import pyarrow as pa
+    arrays = [pa.array([row[i] for row in rows], type=field.type) for i, field in enumerate(schema)]
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+def _export_batches(conn, result, table_name: str, fmt: str):
+    try:
+        for rows in result.partitions():
+            EXPORT_ROWS.inc(len(rows), table=table_name, format=fmt)
+            yield rows
+    finally:
+        result.close()
+        conn.close()
+
+def _ndjson_chunks(batches, names):
+    for rows in batches:
+        yield b"".join(_ndjson_line(dict(zip(names, row))) for row in rows)
+
+def _arrow_chunks(batches, schema):
+    import pyarrow as pa
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for rows in batches:
+            writer.write_batch(_arrow_batch(schema, rows))
+            chunk = sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+            yield chunk
+    yield sink.getvalue()
+
+def _parquet_chunks(batches, schema):
+    import pyarrow.parquet as pq
+    with tempfile.TemporaryFile() as spool:
+        with pq.ParquetWriter(spool, schema) as writer:
+            for rows in batches:
+                writer.write_batch(_arrow_batch(schema, rows))
+        spool.seek(0)
+        while chunk := spool.read(1 << 20):
+            yield chunk
+
+@app.get("/export/{table}")
+def export_table(
+    table: str,
+    format: str = "ndjson",
+    fields: Optional[str] = None,
+    since_id: Optional[int] = Query(None, ge=0),
+    updated_since: Optional[datetime] = None,
+    after_id: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1),
+    user: User = Depends(get_current_user),
+):
+    """Stream full rows for analytics tooling (watermarks: see section comment)."""
+    if user.role == 'student':
+        raise HTTPException(403, "Admins only")
+    if table not in EXPORT_TABLES:
+        raise HTTPException(404, f"Unknown export table (choose from {', '.join(EXPORT_TABLES)})")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(400, f"Unknown format (choose from {', '.join(EXPORT_FORMATS)})")
+    if since_id is not None and updated_since is not None:
+        raise HTTPException(400, "Use either since_id or updated_since, not both")
+    if format != "ndjson" and importlib.util.find_spec("pyarrow") is None:
+        raise HTTPException(400, f"{format} export needs pyarrow installed on the server")
+
+    tbl = EXPORT_TABLES[table]
+    names = export_columns(tbl, fields)
+    columns = [tbl.c[name] for name in names]
+
+    # The read session only picks the target (replica or reporting lane); the
+    # export runs on its own connection because server-side cursors need a
+    # real transaction, and the lanes are autocommit.
+    db = _open_read_session("reporting")
+    bind = db.get_bind()
+    db.close()
+    conn = None
+    try:
+        conn = bind.connect().execution_options(
+            isolation_level="REPEATABLE READ", stream_results=True, yield_per=EXPORT_BATCH_ROWS,
+        )
+        until = conn.execute(text("SELECT now()")).scalar() - timedelta(seconds=EXPORT_SETTLE_S)
+        stmt = select(*columns)
+        if updated_since is not None:
+            if updated_since.tzinfo is None:
+                updated_since = updated_since.replace(tzinfo=IST)
+            stmt = stmt.where(
+                tuple_(tbl.c.updated_at, tbl.c.id) > tuple_(updated_since, after_id),
+                tbl.c.updated_at < until,
+            ).order_by(tbl.c.updated_at, tbl.c.id)
+        else:
+            stmt = stmt.where(tbl.c.id > (since_id or 0), tbl.c.created_at < until).order_by(tbl.c.id)
+        if limit:
+            stmt = stmt.limit(limit)
+        result = conn.execute(stmt)
+    except OperationalError:
+        if conn is not None:
+            conn.close()
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "Database temporarily unavailable. Please retry."}
+        )
+
+    batches = _export_batches(conn, result, table, format)
+    if format == "ndjson":
+        body = _ndjson_chunks(batches, names)
+    elif format == "arrow":
+        body = _arrow_chunks(batches, _arrow_schema(columns))
+    else:
+        body = _parquet_chunks(batches, _arrow_schema(columns))
+
+    media_type, extension = EXPORT_FORMATS[format]
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="campusfix_{table}.{extension}"',
+            "X-Export-Until": until.isoformat(),
+        },
+        # Also covers a client that disconnects before the body is started
+        background=BackgroundTask(conn.close),
+    )
+
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8000))
     uvicorn.run(app, host="0.0.0.0", port=port)
@@ -0,0 +1,191 @@
+# ratelimit.py
+"""
+Token-bucket rate limiting, in process memory or shared through Redis.
+
+A bucket holds up to `capacity` tokens and refills at `rate` tokens per
+second. A request names several buckets (per user, per IP, ...) and a cost;
+it is let through only when every bucket holds the cost, and then each
+loses that many. Buckets are keyed by "scope:identity" and the rules
+(capacity, rate) come per scope, e.g. {"user": (60, 1.0)}.
+
+main.py owns the configuration (rules, route costs, metrics) and hands it in.
+"""
+import asyncio
+import math
+import threading
+import time
+
+from starlette.responses import JSONResponse
+
+
+def rate_rule(spec: str):
+    """Parse "capacity/seconds": "60/60" is 60 tokens refilled at 1 token/s."""
+    capacity, seconds = (float(part) for part in spec.split("/", 1))
+    return capacity, capacity / seconds
+
+
+def retry_after(wait: float):
+    return str(max(1, math.ceil(wait)))
+
+
+def rate_limit_detail(wait: float):
+    return f"Too many requests. Please retry in {retry_after(wait)} s."
+
+
+class _RateLimiter:
+    shared = False
+
+    def __init__(self, rules: dict):
+        self.rules = rules
+
+    def check(self, scopes, cost: float):
+        """Charge cost to each (scope, identity) bucket; (retry_after_s, limiting scope) or (0.0, None)."""
+        buckets = [(f"{scope}:{ident}",) + self.rules[scope] for scope, ident in scopes]
+        wait, short = self.take(buckets, cost)
+        return (wait, scopes[short][0]) if short >= 0 else (0.0, None)
+
+
+class MemoryRateLimiter(_RateLimiter):
+    def __init__(self, rules: dict, max_keys: int = 100000, clock=time.monotonic):
+        super().__init__(rules)
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets = {}  # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    def take(self, buckets, cost: float):
+        """Charge `cost` to every (key, capacity, rate) bucket, or to none of them.
+
+        Returns (0.0, -1) when granted, else (seconds until it would be, index
+        of the bucket that is short).
+        """
+        now = self.clock()
+        with self._lock:
+            levels, wait, short = [], 0.0, -1
+            for i, (key, capacity, rate) in enumerate(buckets):
+                tokens, updated = self._buckets.get(key, (capacity, now))
+                tokens = min(capacity, tokens + (now - updated) * rate)
+                levels.append(tokens)
+                need = min(cost, capacity)
+                if tokens < need and (need - tokens) / rate > wait:
+                    wait, short = (need - tokens) / rate, i
+            if short >= 0:
+                return wait, short
+            if len(self._buckets) >= self.max_keys:
+                self._sweep(now)
+            for (key, capacity, rate), tokens in zip(buckets, levels):
+                self._buckets.pop(key, None)    # re-insert: dict order = least recently charged first
+                self._buckets[key] = (tokens - min(cost, capacity), now)
+            return 0.0, -1
+
+    def _sweep(self, now):
+        # A bucket that has refilled is the same as no bucket at all; the
+        # largest capacity / rate bounds every refill.
+        refill_s = max(capacity / rate for capacity, rate in self.rules.values())
+        for key in [k for k, (_, updated) in self._buckets.items() if now - updated >= refill_s]:
+            del self._buckets[key]
+        while len(self._buckets) >= self.max_keys:
+            del self._buckets[next(iter(self._buckets))]
+
+
+# KEYS = bucket keys; ARGV = cost, then capacity and rate for each key.
+# Redis' own clock is used so workers with skewed clocks agree.
+TOKEN_BUCKET_LUA = """
+redis.replicate_commands()
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local cost = tonumber(ARGV[1])
+local levels, wait, short = {}, 0, -1
+for i, key in ipairs(KEYS) do
+    local capacity, rate = tonumber(ARGV[2 * i]), tonumber(ARGV[2 * i + 1])
+    local state = redis.call('HMGET', key, 'tokens', 'updated')
+    local tokens = tonumber(state[1]) or capacity
+    local updated = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+    levels[i] = tokens
+    local need = math.min(cost, capacity)
+    if tokens < need and (need - tokens) / rate > wait then
+        wait, short = (need - tokens) / rate, i - 1
+    end
+end
+if short >= 0 then
+    return {tostring(wait), short}
+end
+for i, key in ipairs(KEYS) do
+    local capacity, rate = tonumber(ARGV[2 * i]), tonumber(ARGV[2 * i + 1])
+    redis.call('HSET', key, 'tokens', tostring(levels[i] - math.min(cost, capacity)), 'updated', tostring(now))
+    redis.call('PEXPIRE', key, math.ceil(capacity / rate * 1000))
+end
+return {'0', -1}
+"""
+
+
+class RedisRateLimiter(_RateLimiter):
+    """Token buckets shared by every worker, updated atomically by one Lua script.
+
+    Redis failures fall back to local buckets; `errors` (a metrics counter)
+    counts them.
+    """
+    shared = True
+
+    def __init__(self, client, rules: dict, prefix: str, errors=None):
+        super().__init__(rules)
+        self.prefix = prefix + "rl:"
+        self.script = client.register_script(TOKEN_BUCKET_LUA)
+        self.fallback = MemoryRateLimiter(rules)
+        self.errors = errors
+
+    def take(self, buckets, cost: float):
+        args = [cost]
+        for _, capacity, rate in buckets:
+            args += [capacity, rate]
+        try:
+            wait, short = self.script(keys=[self.prefix + key for key, _, _ in buckets], args=args)
+            return float(wait), int(short)
+        except Exception:
+            if self.errors is not None:
+                self.errors.inc(op="ratelimit")
+            return self.fallback.take(buckets, cost)
+
+
+class RateLimitMiddleware:
+    """429 + Retry-After once a caller's buckets run dry on a costed route.
+
+    costs: {(method, path): tokens}. Each request is charged to an "ip"
+    bucket (client_ip(scope)) and, when subject(scope) names the caller, a
+    "user" bucket. `rejected` counts 429s by route and limiting scope.
+    """
+
+    def __init__(self, app, limiter, costs: dict, client_ip, subject, rejected, enabled: bool = True):
+        self.app = app
+        self.limiter = limiter
+        self.costs = costs
+        self.client_ip = client_ip
+        self.subject = subject
+        self.rejected = rejected
+        self.enabled = enabled
+
+    async def __call__(self, scope, receive, send):
+        cost = self.costs.get((scope.get("method"), scope.get("path"))) if scope["type"] == "http" else None
+        if not cost or not self.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        scopes = [("ip", self.client_ip(scope))]
+        subject = self.subject(scope)
+        if subject:
+            scopes.insert(0, ("user", subject))
+        if self.limiter.shared:
+            wait, limited_by = await asyncio.to_thread(self.limiter.check, scopes, cost)
+        else:
+            wait, limited_by = self.limiter.check(scopes, cost)
+
+        if limited_by is None:
+            await self.app(scope, receive, send)
+            return
+        self.rejected.inc(route=scope["path"], scope=limited_by)
+        response = JSONResponse(
+            {"detail": rate_limit_detail(wait)}, status_code=429,
+            headers={"Retry-After": retry_after(wait)},
+        )
+        await response(scope, receive, send)
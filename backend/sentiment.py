@@ -0,0 +1,133 @@
+# sentiment.py
+"""
+Lexicon sentiment + topic tagging for mess reviews.
+
+Pure Python and deterministic, so it runs inline when a rating is stored
+(tens of microseconds per review) and in the backfill, with no model files or
+extra packages. Scoring follows the VADER recipe: word valences are summed,
+with negation and intensifier handling, and the sum is squashed into [-1, 1].
+Topics are the complaint / praise keywords a mess committee acts on.
+"""
+import math
+import re
+
+# Word -> valence (-3 .. +3). Mess vocabulary first, then general words and
+# the Hinglish students actually write.
+LEXICON = {
+    # food
+    "tasty": 2.5, "delicious": 3.0, "yummy": 2.5, "fresh": 2.0, "hot": 0.5, "crispy": 1.5,
+    "flavourful": 2.0, "flavorful": 2.0, "healthy": 1.5, "hygienic": 2.0, "clean": 1.5, "filling": 1.0,
+    "stale": -2.5, "rotten": -3.0, "spoiled": -3.0, "spoilt": -3.0, "sour": -1.0, "smelly": -2.0,
+    "stinks": -2.5, "stink": -2.5, "smell": -1.0, "oily": -2.0, "greasy": -2.0, "salty": -1.5,
+    "bland": -1.5, "tasteless": -2.5, "watery": -1.5, "undercooked": -2.5, "uncooked": -2.5,
+    "raw": -1.5, "overcooked": -1.5, "burnt": -2.0, "burned": -2.0, "cold": -1.5, "hard": -1.0,
+    "soggy": -1.5, "dirty": -2.5, "unhygienic": -3.0, "unclean": -2.5, "filthy": -3.0,
+    "insect": -3.0, "insects": -3.0, "cockroach": -3.0, "worm": -3.0, "worms": -3.0,
+    "hair": -2.5, "fly": -2.0, "flies": -2.0, "sick": -2.5, "vomit": -3.0, "vomiting": -3.0,
+    "diarrhea": -3.0, "poisoning": -3.0,
+    # general
+    "good": 1.9, "great": 3.1, "nice": 1.8, "excellent": 3.2, "amazing": 2.8, "awesome": 3.1,
+    "best": 3.2, "love": 3.2, "loved": 2.9, "like": 1.5, "liked": 1.8, "enjoyed": 2.3,
+    "better": 1.9, "improved": 2.0, "improving": 1.8, "fine": 0.8, "ok": 0.9, "okay": 0.9,
+    "decent": 1.4, "satisfied": 1.8, "happy": 2.7, "perfect": 2.7, "polite": 1.8, "friendly": 2.2,
+    "bad": -2.5, "worse": -2.1, "worst": -3.1, "terrible": -2.5, "horrible": -2.5, "awful": -2.0,
+    "poor": -2.1, "pathetic": -2.7, "disgusting": -2.9, "gross": -2.1, "hate": -2.7,
+    "hated": -3.2, "unacceptable": -2.4, "disappointed": -2.3, "disappointing": -2.2,
+    "rude": -2.0, "late": -1.0, "delay": -1.3, "delayed": -1.3, "slow": -1.0, "less": -0.5,
+    "insufficient": -1.8, "expensive": -1.0, "waste": -1.8, "wasted": -2.2, "inedible": -3.0,
+    "complaint": -1.5, "problem": -1.7, "issue": -1.0, "issues": -1.0, "same": -0.5, "repetitive": -1.5,
+    "boring": -1.3,
+    # Hinglish
+    "accha": 1.9, "acha": 1.9, "achha": 1.9, "badhiya": 2.5, "badiya": 2.5, "mast": 2.5,
+    "bekar": -2.5, "bekaar": -2.5, "ganda": -2.5, "gandi": -2.5, "bakwas": -3.0, "bakwaas": -3.0,
+    "kharab": -2.5, "thanda": -1.5,
+}
+
+NEGATIONS = {"not", "no", "never", "nothing", "nor", "without", "hardly", "barely", "nahi", "nahin", "mat"}
+
+# Intensifier -> boost added to the next word's magnitude
+BOOSTERS = {
+    "very": 0.293, "too": 0.293, "so": 0.293, "really": 0.293, "extremely": 0.4, "super": 0.35,
+    "totally": 0.3, "completely": 0.3, "absolutely": 0.35, "highly": 0.3, "bahut": 0.293,
+    "slightly": -0.293, "somewhat": -0.293, "little": -0.2, "bit": -0.2,
+}
+
+NEGATION_SCOPE = 3          # a negator flips up to three following words ...
+NEGATION_FACTOR = -0.74     # ... but never across punctuation
+BUT_BEFORE, BUT_AFTER = 0.5, 1.5   # "good but too salty": the clause after "but" wins
+ALPHA = 15                  # normalisation constant from VADER
+
+# Topic -> trigger words. A negated trigger ("not oily") does not tag.
+TOPICS = {
+    "oily": ("oil", "oily", "greasy", "ghee"),
+    "stale": ("stale", "rotten", "spoiled", "spoilt", "leftover", "leftovers", "sour", "baasi"),
+    "cold": ("cold", "lukewarm", "thanda"),
+    "salty": ("salty", "salt"),
+    "spicy": ("spicy", "chilli", "chili", "mirchi"),
+    "bland": ("bland", "tasteless", "flavourless", "flavorless", "pheeka", "feeka"),
+    "undercooked": ("undercooked", "uncooked", "raw", "kaccha", "kacha"),
+    "burnt": ("burnt", "burned", "overcooked"),
+    "watery": ("watery", "diluted", "thin"),
+    "foreign object": ("hair", "insect", "insects", "cockroach", "worm", "worms", "fly", "flies", "stone", "keeda"),
+    "hygiene": ("dirty", "unhygienic", "unclean", "filthy", "hygiene", "hygienic", "utensils", "plates", "ganda", "gandi"),
+    "smell": ("smell", "smelly", "stink", "stinks", "odour", "odor"),
+    "portion": ("quantity", "portion", "portions", "insufficient"),
+    "variety": ("variety", "repetitive", "same", "menu", "boring"),
+    "service": ("late", "delay", "delayed", "queue", "wait", "waiting", "staff", "rude", "slow"),
+    "health": ("sick", "vomit", "vomiting", "diarrhea", "poisoning", "stomach"),
+    "fresh": ("fresh", "freshly"),
+}
+
+_TOPIC_OF = {word: topic for topic, words in TOPICS.items() for word in words}
+_TOKEN_RE = re.compile(r"[a-z]+|[.,;:!?]")
+_BREAKS = set(".,;:!?")
+
+
+def tokenize(text: str):
+    # "isn't" -> "is not": the negation survives the apostrophe strip
+    return _TOKEN_RE.findall(text.lower().replace("n't", " not"))
+
+
+def analyse_review(*texts):
+    """Score the given texts together.
+
+    Returns (sentiment, topics): sentiment in [-1, 1] rounded to 3 places, or
+    None when there is no text at all; topics as a sorted list of TOPICS keys.
+    """
+    tokens = tokenize(" ".join(t for t in texts if t))
+    if not tokens:
+        return None, []
+
+    before_but = after_but = 0.0
+    topics = set()
+    negated_until = -1
+    seen_but = False
+    for i, token in enumerate(tokens):
+        if token in _BREAKS:
+            negated_until = -1
+            continue
+        if token in ("but", "however", "lekin", "par"):
+            seen_but = True
+            continue
+        if token in NEGATIONS:
+            negated_until = i + NEGATION_SCOPE
+            continue
+        negated = i <= negated_until
+        topic = _TOPIC_OF.get(token)
+        if topic and not negated:
+            topics.add(topic)
+        valence = LEXICON.get(token)
+        if valence is None:
+            continue
+        if i and tokens[i - 1] in BOOSTERS:
+            valence += math.copysign(BOOSTERS[tokens[i - 1]], valence)
+        if negated:
+            valence *= NEGATION_FACTOR
+        if seen_but:
+            after_but += valence
+        else:
+            before_but += valence
+
+    total = before_but * BUT_BEFORE + after_but * BUT_AFTER if seen_but else before_but
+    compound = total / math.sqrt(total * total + ALPHA)
+    return round(compound, 3), sorted(topics)
@@ -0,0 +1,14 @@
+# conftest.py
+"""
+Importing main needs a DATABASE_URL and mail settings; none of these tests
+open a connection, so placeholders are enough.
+"""
+import os
+import sys
+
+os.environ.setdefault("DATABASE_URL", "postgresql://campusfix@127.0.0.1:1/campusfix")
+os.environ.setdefault("DB_SESSION_POOLER", "false")
+os.environ.setdefault("DB_SSLMODE", "disable")
+os.environ.setdefault("MAIL_PASSWORD", "unused")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
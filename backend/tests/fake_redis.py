@@ -0,0 +1,124 @@
+# fake_redis.py
+"""In-process Redis stand-in for the cache tests."""
+import queue
+import threading
+import time
+
+
+class FakeRedis:
+    """In-process stand-in for the slice of redis-py that RedisCache uses.
+
+    Wrap it in main.RedisCache to run the Redis path (pipelines, tag sets,
+    locks, pub/sub) without a server; several RedisCache instances on one
+    FakeRedis behave like workers sharing a Redis.
+    """
+
+    def __init__(self):
+        self._data = {}     # key -> [value, expires_at or None]
+        self._lock = threading.RLock()
+        self._subscribers = []
+
+    def _live(self, key):
+        entry = self._data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self._data[key]
+            return None
+        return entry
+
+    @staticmethod
+    def _b(value):
+        return value if isinstance(value, bytes) else str(value).encode()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._live(key)
+            return None if entry is None or isinstance(entry[0], set) else entry[0]
+
+    def set(self, key, value, px=None, nx=False):
+        with self._lock:
+            if nx and self._live(key) is not None:
+                return None
+            expires = time.monotonic() + px / 1000 if px else None
+            self._data[key] = [self._b(value), expires]
+            return True
+
+    def exists(self, *keys):
+        with self._lock:
+            return sum(1 for k in keys if self._live(k) is not None)
+
+    def delete(self, *keys):
+        removed = 0
+        with self._lock:
+            for key in keys:
+                if self._live(key) is not None:
+                    del self._data[key]
+                    removed += 1
+        return removed
+
+    def sadd(self, key, *members):
+        with self._lock:
+            entry = self._live(key)
+            if entry is None:
+                entry = self._data[key] = [set(), None]
+            before = len(entry[0])
+            entry[0].update(self._b(m) for m in members)
+            return len(entry[0]) - before
+
+    def smembers(self, key):
+        with self._lock:
+            entry = self._live(key)
+            return set(entry[0]) if entry is not None else set()
+
+    def pexpire(self, key, ms):
+        with self._lock:
+            entry = self._live(key)
+            if entry is None:
+                return False
+            entry[1] = time.monotonic() + ms / 1000
+            return True
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = [s for s in self._subscribers if channel in s.channels]
+        for sub in subscribers:
+            sub.messages.put({"type": "message", "channel": channel.encode(), "data": self._b(message)})
+        return len(subscribers)
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        sub = _FakePubSub(self)
+        with self._lock:
+            self._subscribers.append(sub)
+        return sub
+
+    def pipeline(self, transaction=True):
+        return _FakePipeline(self)
+
+class _FakePubSub:
+    def __init__(self, redis):
+        self.redis = redis
+        self.channels = set()
+        self.messages = queue.Queue()
+
+    def subscribe(self, *channels):
+        self.channels.update(channels)
+
+    def get_message(self, timeout=0.0):
+        try:
+            return self.messages.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+class _FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    def __getattr__(self, name):
+        def queue_call(*args, **kwargs):
+            self.calls.append((getattr(self.redis, name), args, kwargs))
+            return self
+        return queue_call
+
+    def execute(self):
+        calls, self.calls = self.calls, []
+        return [fn(*args, **kwargs) for fn, args, kwargs in calls]
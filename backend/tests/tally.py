@@ -0,0 +1,14 @@
+# tally.py
+"""Metrics stand-in: records each inc(**labels) the code under test makes."""
+
+
+class Tally:
+    def __init__(self):
+        self.calls = []
+
+    def inc(self, **labels):
+        self.calls.append(labels)
+
+    def values(self, label):
+        """The given label of every call, in order."""
+        return [c[label] for c in self.calls]
@@ -0,0 +1,165 @@
+# test_admission.py
+import asyncio
+
+from admission import AdmissionController, AdmissionMiddleware
+from tally import Tally
+
+
+def controller(limit=2, waits=None, max_queue=4):
+    waits = waits if waits is not None else {}
+    # adjust_s keeps the limit where the test put it unless a test advances it
+    return AdmissionController(limit, 1, 0.05, lambda lane: waits.get(lane, 0.0), adjust_s=3600, max_queue=max_queue)
+
+
+def test_normal_requests_fill_the_limit_then_are_refused():
+    c = controller(limit=2)
+    assert c.try_admit("normal") and c.try_admit("normal")
+    assert not c.try_admit("normal")
+    c.release()
+    assert c.try_admit("normal")
+    assert c.in_flight == 2
+
+
+def test_low_priority_gets_a_share_and_backs_off_when_reporting_is_slow():
+    waits = {}
+    c = controller(limit=4, waits=waits)
+    assert c.try_admit("low") and c.try_admit("low")
+    assert not c.try_admit("low")       # 0.5 * 4
+    c.release()
+    waits["reporting"] = 2.0
+    assert not c.try_admit("low")
+    assert c.try_admit("normal")
+
+
+def test_limit_adapts_to_pool_wait():
+    waits = {"interactive": 0.1}
+    c = AdmissionController(64, 4, 0.05, lambda lane: waits.get(lane, 0.0), adjust_s=0)
+    c.try_admit("normal")
+    assert c.limit == 32        # 2x the target wait halves it
+    waits["interactive"] = 0.0
+    c.try_admit("normal")
+    assert c.limit == 33
+
+
+def test_queued_request_times_out():
+    async def run():
+        c = controller(limit=1)
+        assert await c.admit("normal", 0.05)
+        started = asyncio.get_running_loop().time()
+        admitted = await c.admit("normal", 0.05)
+        return admitted, asyncio.get_running_loop().time() - started, c
+
+    admitted, waited, c = asyncio.run(run())
+    assert not admitted
+    assert waited >= 0.05
+    assert c.in_flight == 1 and c.queued == 0
+
+
+def test_released_slot_goes_to_the_oldest_waiter():
+    async def run():
+        c = controller(limit=1)
+        await c.admit("normal")
+        first = asyncio.ensure_future(c.admit("normal", 1.0))
+        second = asyncio.ensure_future(c.admit("normal", 1.0))
+        await asyncio.sleep(0.01)
+        assert c.queued == 2
+        assert not c.try_admit("normal")    # newcomers do not overtake the queue
+        c.release()
+        await asyncio.sleep(0.01)
+        assert first.done() and first.result() is True
+        assert not second.done()
+        assert c.in_flight == 1
+        c.release()
+        assert await second is True
+        c.release()
+        return c
+
+    c = asyncio.run(run())
+    assert c.in_flight == 0 and c.queued == 0
+
+
+def test_full_queue_and_low_priority_are_refused_without_waiting():
+    async def run():
+        c = controller(limit=1, max_queue=1)
+        await c.admit("normal")
+        waiting = asyncio.ensure_future(c.admit("normal", 1.0))
+        await asyncio.sleep(0.01)
+        started = asyncio.get_running_loop().time()
+        refused = [await c.admit("normal", 1.0), await c.admit("low", 1.0)]
+        elapsed = asyncio.get_running_loop().time() - started
+        c.release()
+        return refused, elapsed, await waiting
+
+    refused, elapsed, waited = asyncio.run(run())
+    assert refused == [False, False]
+    assert elapsed < 0.5
+    assert waited is True
+
+
+def test_cancelled_waiter_does_not_leak_a_slot():
+    async def run():
+        c = controller(limit=1)
+        await c.admit("normal")
+        waiting = asyncio.ensure_future(c.admit("normal", 1.0))
+        await asyncio.sleep(0.01)
+        waiting.cancel()
+        await asyncio.sleep(0.01)
+        c.release()
+        return c
+
+    c = asyncio.run(run())
+    assert c.in_flight == 0
+
+
+def _request(middleware, method, path):
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    return middleware({"type": "http", "method": method, "path": path, "headers": []}, receive, send), sent
+
+
+def test_middleware_sheds_with_503_and_keeps_critical_routes_open():
+    gate = None
+
+    async def app(scope, receive, send):
+        await gate.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    shed = Tally()
+    c = controller(limit=1, max_queue=1)
+    middleware = AdmissionMiddleware(
+        app, c, critical={("POST", "/login")}, low_prefixes=("/reports/",), shed=shed, queue_timeout_s=0.05,
+    )
+
+    async def run():
+        nonlocal gate
+        gate = asyncio.Event()
+        busy, busy_sent = _request(middleware, "GET", "/issues")
+        busy = asyncio.ensure_future(busy)
+        await asyncio.sleep(0.01)
+        results = {}
+        for name, (method, path) in {"queued": ("GET", "/stats"), "low": ("GET", "/reports/download")}.items():
+            call, sent = _request(middleware, method, path)
+            await call
+            results[name] = sent
+        login, login_sent = _request(middleware, "POST", "/login")
+        login = asyncio.ensure_future(login)
+        gate.set()
+        await asyncio.gather(busy, login)
+        results["busy"], results["login"] = busy_sent, login_sent
+        return results
+
+    results = asyncio.run(run())
+    for name in ("queued", "low"):
+        start = results[name][0]
+        assert start["status"] == 503
+        assert (b"retry-after", b"5") in start["headers"]
+    assert results["busy"][0]["status"] == 200 and results["login"][0]["status"] == 200
+    assert shed.calls == [{"priority": "normal", "reason": "timeout"}, {"priority": "low", "reason": "limit"}]
+    assert c.in_flight == 0
@@ -0,0 +1,106 @@
+# test_cache.py
+"""RedisCache against FakeRedis: each RedisCache on one FakeRedis plays a worker."""
+import threading
+import time
+
+import pytest
+
+import main
+from fake_redis import FakeRedis
+
+
+def eventually(check, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if check():
+            return True
+        time.sleep(0.01)
+    return check()
+
+
+@pytest.fixture
+def redis():
+    return FakeRedis()
+
+
+def worker(redis):
+    cache = main.RedisCache(redis, prefix="test:", local_ttl=60)
+    cache._ensure_listener()
+    return cache
+
+
+def subscribed(redis, count):
+    # Invalidations published before a listener subscribes are lost
+    assert eventually(lambda: sum(1 for s in redis._subscribers if "test:invalidate" in s.channels) >= count)
+
+
+def test_invalidate_tags_drops_redis_keys_and_tag_sets(redis):
+    cache = worker(redis)
+    cache.set("issue:1", {"id": 1}, 60, tags=["issues", "issue:1"])
+    cache.set("issue:2", {"id": 2}, 60, tags=["issues"])
+    cache.set("user:1", {"id": 1}, 60, tags=["users"])
+
+    cache.invalidate_tags("issues")
+
+    assert cache.get("issue:1") is None
+    assert cache.get("issue:2") is None
+    assert cache.get("user:1") == {"id": 1}
+    assert not redis.exists("test:issue:1", "test:issue:2", "test:tag:issues")
+    assert redis.exists("test:user:1", "test:tag:users") == 2
+
+
+def test_tag_invalidation_reaches_other_workers_near_cache(redis):
+    a, b = worker(redis), worker(redis)
+    subscribed(redis, 2)
+    a.set("stats:hostel", {"open": 3}, 60, tags=["stats"])
+    assert b.get("stats:hostel") == {"open": 3}
+    assert b.local.get("stats:hostel") == {"open": 3}     # b now serves it locally
+
+    a.invalidate_tags("stats")
+
+    assert eventually(lambda: b.local.get("stats:hostel") is None)
+    assert b.get("stats:hostel") is None
+
+
+def test_delete_fans_out_to_every_worker(redis):
+    workers = [worker(redis) for _ in range(3)]
+    subscribed(redis, 3)
+    workers[0].set("principal:s1@x.com", {"id": 1}, 60)
+    for w in workers[1:]:
+        assert w.get("principal:s1@x.com") == {"id": 1}
+
+    workers[1].delete("principal:s1@x.com")
+
+    assert eventually(lambda: all(w.local.get("principal:s1@x.com") is None for w in workers))
+    assert all(w.get("principal:s1@x.com") is None for w in workers)
+
+
+def test_get_or_set_runs_the_loader_once_across_workers(redis):
+    workers = [worker(redis) for _ in range(2)]
+    calls, results = [], []
+    start = threading.Barrier(8)
+
+    def loader():
+        calls.append(1)
+        time.sleep(0.2)
+        return {"rows": 42}
+
+    def request(cache):
+        start.wait()
+        results.append(cache.get_or_set("report:weekly", loader, 60))
+
+    threads = [threading.Thread(target=request, args=(workers[n % 2],)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert results == [{"rows": 42}] * 8
+    assert not redis.exists("test:lock:report:weekly")
+
+
+def test_get_or_set_loads_again_when_the_lock_holder_stored_nothing(redis):
+    cache = worker(redis)
+    assert cache.get_or_set("principal:ghost", lambda: None, 60) is None
+    assert cache.get_or_set("principal:ghost", lambda: {"id": 7}, 60) == {"id": 7}
@@ -0,0 +1,188 @@
+# test_coalescing.py
+import asyncio
+
+import pytest
+
+from coalescing import CoalescingMiddleware, RequestCoalescer
+from tally import Tally
+
+ROUTES = {"/mess/analytics": "public", "/stats": "user"}
+
+
+class Route:
+    """Stand-in handler: held open on `gate`, answers `status` or raises `error` (once)."""
+
+    def __init__(self):
+        self.runs = 0
+        self.gate = None
+        self.status = 200
+        self.error = None
+
+    async def __call__(self, scope, receive, send):
+        self.runs += 1
+        run = self.runs
+        if self.gate is not None:
+            await self.gate.wait()
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+        await send({"type": "http.response.start", "status": self.status, "headers": [(b"x-run", str(run).encode())]})
+        await send({"type": "http.response.body", "body": f"run {run}".encode()})
+
+
+def make(route, **kwargs):
+    tally = Tally()
+    coalescer = RequestCoalescer(micro_ttl_s=60, max_entries=100, requests=tally)
+    middleware = CoalescingMiddleware(route, coalescer, ROUTES, caller=lambda scope: scope["caller"], **kwargs)
+    return middleware, coalescer, tally
+
+
+async def get(middleware, path="/mess/analytics", query=b"scope=week", caller="a", method="GET"):
+    scope = {"type": "http", "method": method, "path": path, "query_string": query, "headers": [], "caller": caller}
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    await middleware(scope, receive, send)
+    return sent[0]["status"], sent[1]["body"]
+
+
+async def leader_and_followers(middleware, route, followers=3, **kwargs):
+    route.gate = asyncio.Event()
+    leader = asyncio.ensure_future(get(middleware, **kwargs))
+    await asyncio.sleep(0.01)
+    waiting = [asyncio.ensure_future(get(middleware, **kwargs)) for _ in range(followers)]
+    await asyncio.sleep(0.01)
+    route.gate.set()
+    return leader, waiting
+
+
+def test_identical_concurrent_gets_run_once_then_hit_the_micro_cache():
+    route = Route()
+    middleware, coalescer, tally = make(route)
+
+    async def run():
+        leader, waiting = await leader_and_followers(middleware, route)
+        responses = [await leader] + [await w for w in waiting]
+        # Same query in another order is the same request
+        responses.append(await get(middleware, query=b"x=1&scope=week"))
+        responses.append(await get(middleware, query=b"scope=week&x=1"))
+        return responses
+
+    responses = asyncio.run(run())
+    assert route.runs == 2
+    assert responses[:4] == [(200, b"run 1")] * 4
+    assert responses[4:] == [(200, b"run 2")] * 2
+    assert tally.values("result") == ["leader", "coalesced", "coalesced", "coalesced", "leader", "micro_cache"]
+    assert coalescer.ratios() == [({"route": "/mess/analytics", "state": "shared"}, 4 / 6)]
+
+
+def test_leader_exception_reaches_the_leader_and_followers_run_themselves():
+    route = Route()
+    middleware, coalescer, tally = make(route)
+
+    async def run():
+        route.error = RuntimeError("db down")
+        leader, waiting = await leader_and_followers(middleware, route, followers=2)
+        with pytest.raises(RuntimeError):
+            await leader
+        return [await w for w in waiting]
+
+    followers = asyncio.run(run())
+    assert route.runs == 3
+    assert sorted(followers) == [(200, b"run 2"), (200, b"run 3")]
+    assert tally.values("result") == ["leader", "bypass", "bypass"]
+    assert coalescer.flight("/mess/analytics?scope=week|*") is None
+
+
+def test_leader_error_response_is_shared_but_not_cached():
+    route = Route()
+    middleware, coalescer, tally = make(route)
+
+    async def run():
+        route.status = 503
+        leader, waiting = await leader_and_followers(middleware, route, followers=2)
+        shared = [await leader] + [await w for w in waiting]
+        route.status = 200
+        return shared, await get(middleware)
+
+    shared, after = asyncio.run(run())
+    assert shared == [(503, b"run 1")] * 3
+    assert after == (200, b"run 2")
+    assert tally.values("result") == ["leader", "coalesced", "coalesced", "leader"]
+
+
+def test_cancelled_leader_releases_its_followers():
+    route = Route()
+    middleware, coalescer, tally = make(route)
+
+    async def run():
+        route.gate = asyncio.Event()
+        leader = asyncio.ensure_future(get(middleware))
+        await asyncio.sleep(0.01)
+        follower = asyncio.ensure_future(get(middleware))
+        await asyncio.sleep(0.01)
+        leader.cancel()     # client went away mid-request
+        await asyncio.sleep(0.01)
+        route.gate.set()
+        return await follower
+
+    assert asyncio.run(run()) == (200, b"run 2")
+    assert tally.values("result") == ["leader", "bypass"]
+
+
+def test_each_replay_gets_its_own_headers():
+    route = Route()
+
+    async def compress(scope, receive, send):
+        # Like CompressionMiddleware: edits the start message's headers in place
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                assert (b"content-encoding", b"gzip") not in message["headers"]
+                message["headers"].append((b"content-encoding", b"gzip"))
+            await send(message)
+
+        await inner(scope, receive, send_wrapper)
+
+    inner, _, _ = make(route)
+
+    async def run():
+        leader, waiting = await leader_and_followers(compress, route)
+        return [await leader] + [await w for w in waiting] + [await get(compress)]
+
+    assert asyncio.run(run()) == [(200, b"run 1")] * 5
+
+
+def test_user_routes_are_keyed_per_caller():
+    route = Route()
+    middleware, _, _ = make(route)
+
+    async def run():
+        return [await get(middleware, path="/stats", query=b"", caller=c) for c in ("a", "b", "a")]
+
+    assert asyncio.run(run()) == [(200, b"run 1"), (200, b"run 2"), (200, b"run 1")]
+
+
+def test_writers_and_pinned_requests_bypass():
+    route = Route()
+    pinned = [False]
+    middleware, _, tally = make(route, pinned=lambda: pinned[0])
+
+    async def run():
+        await get(middleware)
+        await get(middleware, method="POST", path="/mess/rate", caller="a")
+        after_write = await get(middleware, caller="a")
+        other = await get(middleware, caller="b")
+        pinned[0] = True
+        pinned_read = await get(middleware, caller="b")
+        return after_write, other, pinned_read
+
+    after_write, other, pinned_read = asyncio.run(run())
+    assert after_write == (200, b"run 3")       # the POST was run 2
+    assert other == (200, b"run 1")
+    assert pinned_read == (200, b"run 4")
+    assert tally.values("result") == ["leader", "bypass", "micro_cache", "bypass"]
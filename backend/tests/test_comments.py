@@ -0,0 +1,78 @@
+# test_comments.py
+"""
+Comment threads against a real database. Runs when DATABASE_URL points at a
+Postgres with the app's schema (start the app against it once); skipped
+otherwise.
+"""
+import asyncio
+import uuid
+
+import pytest
+from fastapi import BackgroundTasks, HTTPException
+from sqlalchemy.exc import SQLAlchemyError
+
+import main
+
+
+@pytest.fixture
+def db():
+    session = main.LANE_SESSIONS["interactive"]()
+    try:
+        session.query(main.Issue.id).limit(1).all()
+    except SQLAlchemyError:
+        session.close()
+        pytest.skip("no database with the app's schema at DATABASE_URL")
+    created = []
+    yield session, created
+    # The lane is AUTOCOMMIT: every flush above is already committed
+    for row in reversed(created):
+        session.query(type(row)).filter_by(id=row.id).delete()
+    session.close()
+
+
+def add(db, row):
+    session, created = db
+    session.add(row)
+    session.flush()
+    created.append(row)
+    return row
+
+
+def student(db, hostel):
+    tag = uuid.uuid4().hex[:12]
+    return add(db, main.User(full_name=f"Student {tag}", email=f"{tag}@test.invalid", role="student", hostel=hostel))
+
+
+def test_thread_is_only_visible_to_those_who_can_see_the_issue(db):
+    session, _ = db
+    owner, neighbour, outsider = student(db, "Hostel A"), student(db, "Hostel A"), student(db, "Hostel B")
+    issue = add(db, main.Issue(title="Leaking tap", category="Plumbing", sub_location="Hostel A", owner_id=owner.id))
+    add(db, main.Comment(text="Still leaking", issue_id=issue.id, user_id=owner.id))
+
+    for reader in (owner, neighbour):
+        page = main.list_comments(issue.id, cursor=None, limit=20, user=reader, db=session)
+        assert b"Still leaking" in page.body
+
+    with pytest.raises(HTTPException) as exc:
+        main.list_comments(issue.id, cursor=None, limit=20, user=outsider, db=session)
+    assert exc.value.status_code == 404
+
+
+def test_comment_and_count_land_together(db):
+    session, created = db
+    owner = student(db, "Hostel A")
+    issue = add(db, main.Issue(title="Broken fan", category="Electrical", sub_location="Hostel A", owner_id=owner.id))
+
+    asyncio.run(main.add_comment(issue.id, main.CommentCreate(text="Any news?"), BackgroundTasks(), user=owner, db=session))
+    created.extend(session.query(main.Comment).filter_by(issue_id=issue.id).all())
+
+    # The count UPDATE runs, then the comment INSERT fails its users FK at commit
+    ghost = main.User(id=-1, full_name="Ghost", role="student", hostel="Hostel A")
+    with pytest.raises(SQLAlchemyError):
+        asyncio.run(main.add_comment(issue.id, main.CommentCreate(text="Hello?"), BackgroundTasks(), user=ghost, db=session))
+    session.rollback()
+
+    comments = session.query(main.Comment.text).filter_by(issue_id=issue.id).all()
+    count = session.query(main.Issue.comment_count).filter_by(id=issue.id).scalar()
+    assert [t for (t,) in comments] == ["Any news?"]
+    assert count == 1
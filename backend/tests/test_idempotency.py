@@ -0,0 +1,186 @@
+# test_idempotency.py
+import asyncio
+import json
+import re
+
+import pytest
+
+from fake_redis import FakeRedis
+from idempotency import IdempotencyMiddleware, MemoryIdempotencyStore, RedisIdempotencyStore
+from tally import Tally
+
+ROUTES = [("POST", re.compile(r"^/issues$"))]
+
+
+class CreateIssue:
+    """Stand-in route: counts executions, can be held open or made to fail."""
+
+    def __init__(self, status=201):
+        self.status = status
+        self.runs = 0
+        self.gate = None
+
+    async def __call__(self, scope, receive, send):
+        message = await receive()
+        self.runs += 1
+        if self.gate is not None:
+            await self.gate.wait()
+        body = json.dumps({"id": self.runs, "echo": message["body"].decode()}).encode()
+        await send({"type": "http.response.start", "status": self.status,
+                    "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": body})
+
+
+def request(middleware, body=b'{"title": "leak"}', key="k1", path="/issues"):
+    scope = {"type": "http", "method": "POST", "path": path,
+             "headers": [(b"idempotency-key", key.encode())] if key is not None else []}
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    async def run():
+        await middleware(scope, receive, send)
+        headers = dict(sent[0]["headers"])
+        return sent[0]["status"], headers, b"".join(m.get("body", b"") for m in sent[1:])
+
+    return run()
+
+
+@pytest.fixture(params=["memory", "redis"])
+def store(request):
+    if request.param == "memory":
+        return MemoryIdempotencyStore(ttl=60, lock_ttl=60)
+    return RedisIdempotencyStore(FakeRedis(), ttl=60, lock_ttl=60, prefix="test:")
+
+
+def middleware_for(app, store, requests=None, wait_s=1.0):
+    return IdempotencyMiddleware(
+        app, store, ROUTES, caller=lambda scope: "s1@x.com", requests=requests or Tally(), errors=Tally(),
+        wait_s=wait_s, poll_s=0.01,
+    )
+
+
+def test_retry_replays_the_recorded_response(store):
+    app, requests = CreateIssue(), Tally()
+    middleware = middleware_for(app, store, requests)
+
+    async def run():
+        return await request(middleware), await request(middleware)
+
+    first, retry = asyncio.run(run())
+    assert app.runs == 1
+    assert first[0] == retry[0] == 201
+    assert retry[2] == first[2]
+    assert retry[1][b"content-type"] == b"application/json"
+    assert retry[1][b"idempotent-replayed"] == b"true"
+    assert b"idempotent-replayed" not in first[1]
+    assert requests.values("outcome") == ["executed", "replayed"]
+
+
+def test_concurrent_duplicate_waits_for_the_first_and_replays(store):
+    app = CreateIssue()
+    middleware = middleware_for(app, store)
+
+    async def run():
+        app.gate = asyncio.Event()
+        first = asyncio.ensure_future(request(middleware))
+        await asyncio.sleep(0.02)
+        second = asyncio.ensure_future(request(middleware))
+        await asyncio.sleep(0.05)
+        app.gate.set()
+        return await first, await second
+
+    first, second = asyncio.run(run())
+    assert app.runs == 1
+    assert second[2] == first[2]
+    assert second[1][b"idempotent-replayed"] == b"true"
+
+
+def test_duplicate_still_running_after_the_wait_gets_409(store):
+    app, requests = CreateIssue(), Tally()
+    middleware = middleware_for(app, store, requests, wait_s=0.05)
+
+    async def run():
+        app.gate = asyncio.Event()
+        first = asyncio.ensure_future(request(middleware))
+        await asyncio.sleep(0.02)
+        conflict = await request(middleware)
+        app.gate.set()
+        return conflict, await first
+
+    conflict, first = asyncio.run(run())
+    assert conflict[0] == 409 and conflict[1][b"retry-after"] == b"1"
+    assert first[0] == 201 and app.runs == 1
+    assert requests.values("outcome") == ["executed", "conflict"]
+
+
+def test_same_key_with_another_body_is_rejected(store):
+    app = CreateIssue()
+    middleware = middleware_for(app, store)
+
+    async def run():
+        return await request(middleware), await request(middleware, body=b'{"title": "other"}')
+
+    _, mismatch = asyncio.run(run())
+    assert mismatch[0] == 422 and app.runs == 1
+
+
+def test_failures_are_not_recorded(store):
+    app = CreateIssue(status=503)
+    middleware = middleware_for(app, store)
+
+    async def run():
+        failed = await request(middleware)
+        app.status = 201
+        return failed, await request(middleware)
+
+    failed, retry = asyncio.run(run())
+    assert failed[0] == 503 and retry[0] == 201
+    assert app.runs == 2
+
+
+def test_keys_only_apply_to_configured_routes(store):
+    app = CreateIssue()
+    middleware = middleware_for(app, store)
+
+    async def run():
+        for _ in range(2):
+            await request(middleware, path="/issues/1/status")
+        return await request(middleware, key="x" * 300)
+
+    invalid = asyncio.run(run())
+    assert app.runs == 2
+    assert invalid[0] == 400
+
+
+def test_store_outage_runs_the_request_unprotected():
+    class BrokenStore(MemoryIdempotencyStore):
+        def begin(self, key, fingerprint):
+            raise ConnectionError("down")
+
+    app, errors = CreateIssue(), Tally()
+    middleware = IdempotencyMiddleware(app, BrokenStore(60, 60), ROUTES, caller=lambda scope: "s1@x.com",
+                                       requests=Tally(), errors=errors)
+
+    async def run():
+        return await request(middleware), await request(middleware)
+
+    statuses = [r[0] for r in asyncio.run(run())]
+    assert statuses == [201, 201] and app.runs == 2
+    assert errors.calls == [{"op": "idempotency"}] * 2
+
+
+def test_memory_store_claim_expires_after_lock_ttl():
+    now = [0.0]
+    store = MemoryIdempotencyStore(ttl=60, lock_ttl=5, clock=lambda: now[0])
+    assert store.begin("k", "f") == ("new", None)
+    assert store.begin("k", "f") == ("running", None)
+    now[0] = 6.0    # the first attempt crashed without finishing
+    assert store.begin("k", "f") == ("new", None)
+    store.finish("k", "f", {"status": 201})
+    now[0] = 60.0
+    assert store.begin("k", "f") == ("done", {"status": 201})
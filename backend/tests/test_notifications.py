@@ -0,0 +1,34 @@
+# test_notifications.py
+import asyncio
+import logging
+
+import fastapi_mail
+
+import main
+
+
+def test_batch_sends_each_message_with_bounded_concurrency(monkeypatch, caplog):
+    sent, active, peak = [], 0, 0
+
+    async def send_message(self, message):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        if message.recipients[0] == "broken@x.com":
+            raise ConnectionError("SMTP down")
+        sent.append((message.recipients[0], message.subject))
+
+    monkeypatch.setattr(fastapi_mail.FastMail, "send_message", send_message)
+    monkeypatch.setattr(main, "EMAIL_BATCH_CONCURRENCY", 2)
+    messages = [(f"s{n}@x.com", f"Issue {n}", "body") for n in range(5)]
+    messages += [("broken@x.com", "Issue 5", "body"), (None, "Issue 6", "body")]
+
+    with caplog.at_level(logging.ERROR, logger="campusfix"):
+        asyncio.run(main.send_notifications_batch(messages))
+
+    assert sorted(sent) == [(f"s{n}@x.com", f"Issue {n}") for n in range(5)]
+    assert peak == 2
+    assert "Email to broken@x.com failed" in caplog.text
+    assert "1 of 6 emails failed" in caplog.text
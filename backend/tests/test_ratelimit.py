@@ -0,0 +1,109 @@
+# test_ratelimit.py
+import asyncio
+
+from ratelimit import MemoryRateLimiter, RateLimitMiddleware, rate_rule
+from tally import Tally
+
+RULES = {"user": rate_rule("10/10"), "ip": rate_rule("100/10")}     # 1 and 10 tokens/s
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_bucket_refills_at_its_rate_up_to_capacity():
+    clock = Clock()
+    limiter = MemoryRateLimiter(RULES, clock=clock)
+    bucket = [("user:a", 10.0, 1.0)]
+    for _ in range(5):
+        assert limiter.take(bucket, 2) == (0.0, -1)
+
+    wait, short = limiter.take(bucket, 2)
+    assert short == 0 and wait == 2.0       # empty: 2 tokens at 1 token/s
+
+    clock.now += 1.5
+    wait, short = limiter.take(bucket, 2)
+    assert short == 0 and wait == 0.5
+    clock.now += 0.5
+    assert limiter.take(bucket, 2) == (0.0, -1)
+
+    # A long idle period refills to capacity, never beyond it
+    clock.now += 3600
+    for _ in range(5):
+        assert limiter.take(bucket, 2) == (0.0, -1)
+    assert limiter.take(bucket, 2)[1] == 0
+
+
+def test_take_charges_all_buckets_or_none():
+    clock = Clock()
+    limiter = MemoryRateLimiter(RULES, clock=clock)
+    assert limiter.check([("user", "a"), ("ip", "1.2.3.4")], 10) == (0.0, None)
+
+    wait, scope = limiter.check([("user", "a"), ("ip", "1.2.3.4")], 10)
+    assert scope == "user" and wait == 10.0
+    # The refused request did not touch the IP bucket: 90 tokens are left
+    assert limiter.check([("user", "b"), ("ip", "1.2.3.4")], 10) == (0.0, None)
+    assert limiter._buckets["ip:1.2.3.4"][0] == 80.0
+
+
+def test_cost_above_capacity_needs_a_full_bucket():
+    limiter = MemoryRateLimiter(RULES, clock=Clock())
+    assert limiter.check([("user", "a")], 25) == (0.0, None)
+    assert limiter.check([("user", "a")], 25)[1] == "user"
+
+
+def test_sweep_drops_refilled_buckets_first():
+    clock = Clock()
+    limiter = MemoryRateLimiter(RULES, max_keys=3, clock=clock)
+    limiter.check([("user", "old")], 1)
+    clock.now += 20     # "old" has refilled (capacity / rate = 10 s)
+    limiter.check([("user", "b")], 1)
+    limiter.check([("user", "c")], 1)
+    limiter.check([("user", "d")], 1)
+    assert set(limiter._buckets) == {"user:b", "user:c", "user:d"}
+
+
+def _call(middleware, path, headers=()):
+    scope = {"type": "http", "method": "POST", "path": path, "headers": list(headers), "client": ("10.0.0.1", 5000)}
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(middleware(scope, receive, send))
+    return sent[0]["status"], dict(sent[0].get("headers", []))
+
+
+async def ok_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+def test_middleware_answers_429_with_retry_after():
+    rejected = Tally()
+    middleware = RateLimitMiddleware(
+        ok_app, MemoryRateLimiter(RULES), costs={("POST", "/chat"): 4},
+        client_ip=lambda scope: scope["client"][0], subject=lambda scope: "s1@x.com", rejected=rejected,
+    )
+    statuses = [_call(middleware, "/chat")[0] for _ in range(3)]
+    assert statuses == [200, 200, 429]
+    status, headers = _call(middleware, "/chat")
+    assert status == 429 and int(headers[b"retry-after"]) >= 1
+    assert rejected.calls[0] == {"route": "/chat", "scope": "user"}
+    # Routes without a cost are never charged
+    assert _call(middleware, "/issues")[0] == 200
+
+
+def test_middleware_disabled_lets_everything_through():
+    middleware = RateLimitMiddleware(
+        ok_app, MemoryRateLimiter(RULES), costs={("POST", "/chat"): 10},
+        client_ip=lambda scope: "ip", subject=lambda scope: None, rejected=Tally(), enabled=False,
+    )
+    assert [_call(middleware, "/chat")[0] for _ in range(20)] == [200] * 20
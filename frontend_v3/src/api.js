@@ -8,6 +8,29 @@ const CACHE_DURATION = 5 * 60 * 1000; // 5 minutes
 // persistent localStorage prefix
 const LS_PREFIX = 'api-cache:';
 
+// deadline (epoch seconds) the backend returns after a write; see ReadYourWritesMiddleware
+const READ_PRIMARY_KEY = 'read_primary_until';
+
+// writes the backend deduplicates by Idempotency-Key (see IdempotencyMiddleware)
+const IDEMPOTENT_WRITES = [
+  ['post', /\/issues$/],
+  ['post', /\/issues\/\d+\/comments$/],
+  ['patch', /\/issues\/\d+\/rate$/],
+  ['post', /\/mess\/rate$/],
+];
+
+// GETs that are never cached: one response per viewport, so they would only fill localStorage
+const UNCACHED_GETS = ['/issues/map'];
+
+function isUncachedGet(fullUrl) {
+  return !!fullUrl && UNCACHED_GETS.some((path) => fullUrl.includes(path));
+}
+
+function newIdempotencyKey() {
+  if (window.crypto && window.crypto.randomUUID) return window.crypto.randomUUID();
+  return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}-${Math.random().toString(36).slice(2)}`;
+}
+
 // ✅ Reliable Vite production flag
 const isProduction = import.meta.env.PROD === true;
 
@@ -136,6 +159,9 @@ function makeLiteIssue(issue, thumb) {
     review: issue.review ?? null,
     // keep image_data null to avoid large payloads
     image_data: null,
+    // uploaded images are referenced by URL, which is small enough to keep
+    image_url: issue.image_url || null,
+    thumb_url: issue.thumb_url || null,
     // tiny preview if available
     thumb: thumb || null
   };
@@ -155,6 +181,20 @@ api.interceptors.request.use(
       config.headers.Authorization = `Bearer ${token}`;
     }
 
+    // 🔁 One key per logical write: the retries below re-send this same config,
+    // so the backend replays the first response instead of writing twice
+    const method = (config.method || '').toLowerCase();
+    const path = (config.url || '').split('?')[0];
+    if (!config.headers['Idempotency-Key'] && IDEMPOTENT_WRITES.some(([m, re]) => m === method && re.test(path))) {
+      config.headers['Idempotency-Key'] = newIdempotencyKey();
+    }
+
+    // 📚 Read-your-writes: right after a write, ask the backend to read from the primary
+    const readPrimaryUntil = parseFloat(localStorage.getItem(READ_PRIMARY_KEY) || '0');
+    if (readPrimaryUntil * 1000 > Date.now()) {
+      config.headers['X-Read-Primary-Until'] = String(readPrimaryUntil);
+    }
+
     // compute stable full URL early
     let fullUrl;
     try {
@@ -173,7 +213,7 @@ api.interceptors.request.use(
     }
 
     // Only apply caching for GET requests
-    if ((config.method || '').toLowerCase() === 'get') {
+    if ((config.method || '').toLowerCase() === 'get' && !isUncachedGet(fullUrl)) {
       const cached = fullUrl ? cache.get(fullUrl) : null;
 
       // 1) If memory cache is fresh -> return it synchronously (no network)
@@ -248,12 +288,17 @@ api.interceptors.request.use(
  */
 api.interceptors.response.use(
   (response) => {
+    const readPrimaryUntil = response.headers && response.headers['x-read-primary-until'];
+    if (readPrimaryUntil) {
+      localStorage.setItem(READ_PRIMARY_KEY, readPrimaryUntil);
+    }
+
     try {
       if (response.config && (response.config.method || '').toLowerCase() === 'get' && response.status === 200) {
         const fullUrl = getFullUrl(response.config);
 
-        // 🚫 Do not cache file download responses (binary blobs)
-        if (fullUrl.includes('/reports/download')) {
+        // 🚫 Do not cache file download responses (binary blobs) or viewport queries
+        if (fullUrl.includes('/reports/download') || isUncachedGet(fullUrl)) {
           // Return as-is without touching cache/localStorage
           return response;
         }
@@ -366,4 +411,25 @@ api.interceptors.response.use(
   }
 );
 
+/**
+ * Upload a photo as multipart (no base64). The backend transcodes it and
+ * returns { id, url, thumb_url, ... }; send `id` as image_id.
+ */
+export async function uploadImage(file) {
+  const body = new FormData();
+  body.append('file', file);
+  const res = await api.post('/images', body, { timeout: 60000 });
+  return res.data;
+}
+
+/**
+ * Backend image paths ("/images/...") are relative to the API, not the app.
+ * Data URLs and absolute URLs are returned unchanged.
+ */
+export function resolveImageUrl(src) {
+  if (!src || !src.startsWith('/')) return src || null;
+  const base = (api.defaults.baseURL || '').replace(/\/$/, '');
+  return base + src;
+}
+
 export default api;
@@ -1,7 +1,8 @@
-import React from 'react';
-import { MapContainer, TileLayer, Marker, Popup } from 'react-leaflet';
+import React, { useCallback, useEffect, useRef, useState } from 'react';
+import { MapContainer, TileLayer, Marker, Popup, useMap, useMapEvents } from 'react-leaflet';
 import 'leaflet/dist/leaflet.css';
 import L from 'leaflet';
+import api from '../api';
 
 // --- FIX LEAFLET ICON BUG ---
 import icon from 'leaflet/dist/images/marker-icon.png';
@@ -19,6 +20,96 @@ L.Marker.prototype.options.icon = DefaultIcon;
 // NIT Agartala Coordinates
 const ARYABHATTA_COORDS = [23.8436, 91.4217]; 
 
+// Pins are clustered by the backend (GET /issues/map): we only ever receive
+// one marker per 64px square of the current view, whatever the issue count.
+const CATEGORY_COLORS = {
+  'Power Failure': '#dc2626', 'Short Circuit': '#b91c1c', 'Water Leakage': '#2563eb',
+  'Fire Safety': '#ea580c', 'Medical Emergency': '#db2777', 'LAN/WiFi Issue': '#7c3aed',
+  'Fan/Light Fault': '#ca8a04', 'Door/Window Broken': '#0d9488', 'Sanitation/Cleaning': '#16a34a',
+};
+const FALLBACK_COLOR = '#475569';
+
+const clusterIcons = new Map();
+function clusterIcon(count, category) {
+  const key = `${count}|${category}`;
+  if (!clusterIcons.has(key)) {
+    const size = count < 10 ? 30 : count < 100 ? 36 : count < 1000 ? 42 : 48;
+    const label = count < 1000 ? count : `${Math.floor(count / 1000)}k`;
+    clusterIcons.set(key, L.divIcon({
+      className: '',
+      iconSize: [size, size],
+      iconAnchor: [size / 2, size / 2],
+      html: `<div style="width:${size}px;height:${size}px;border-radius:50%;background:${CATEGORY_COLORS[category] || FALLBACK_COLOR};`
+        + `color:white;font-weight:bold;font-size:0.75rem;display:flex;align-items:center;justify-content:center;`
+        + `border:3px solid rgba(255,255,255,0.85);box-shadow:0 1px 4px rgba(0,0,0,0.3)">${label}</div>`,
+    }));
+  }
+  return clusterIcons.get(key);
+}
+
+function IssueClusters() {
+  const map = useMap();
+  const [clusters, setClusters] = useState([]);
+  const latest = useRef(0);
+  const timer = useRef(null);
+
+  const load = useCallback(() => {
+    const request = ++latest.current;
+    api.get('/issues/map', { params: { bbox: map.getBounds().toBBoxString(), zoom: map.getZoom() } })
+      .then((res) => {
+        // a slower answer for an older view must not overwrite a newer one
+        if (request === latest.current) setClusters(res.data.clusters || []);
+      })
+      .catch((err) => console.warn('⚠️ Map clusters failed', err && err.message ? err.message : err));
+  }, [map]);
+
+  // one request once panning / zooming settles
+  const schedule = useCallback(() => {
+    clearTimeout(timer.current);
+    timer.current = setTimeout(load, 250);
+  }, [load]);
+
+  useMapEvents({ moveend: schedule, zoomend: schedule });
+  useEffect(() => {
+    load();
+    return () => clearTimeout(timer.current);
+  }, [load]);
+
+  return clusters.map((c) => (
+    c.issue ? (
+      <Marker key={`i${c.issue.id}`} position={[c.lat, c.lng]}>
+        <Popup>
+          <div style={{ textAlign: 'center' }}>
+            <strong>{c.issue.title}</strong><br />
+            {c.dominant_category} · {c.issue.status}
+          </div>
+        </Popup>
+      </Marker>
+    ) : (
+      <Marker
+        key={`c${c.lat},${c.lng}`}
+        position={[c.lat, c.lng]}
+        icon={clusterIcon(c.count, c.dominant_category)}
+        eventHandlers={{
+          click: () => {
+            if (map.getZoom() < map.getMaxZoom()) map.setView([c.lat, c.lng], Math.min(map.getZoom() + 2, map.getMaxZoom()));
+          },
+        }}
+      >
+        <Popup>
+          <div>
+            <strong>{c.count} issues</strong>
+            {Object.entries(c.categories)
+              .sort((a, b) => b[1] - a[1])
+              .slice(0, 4)
+              .map(([category, n]) => <div key={category}>{category}: {n}</div>)}
+          </div>
+        </Popup>
+      </Marker>
+    )
+  ));
+}
+
 export default function CampusMap({ role, issueCount }) {
   return (
     <div className="glass-panel" style={{ padding: '0', overflow: 'hidden', height: '350px', width: '100%', borderRadius: '20px', marginBottom: '20px', position: 'relative', zIndex: 1 }}>
@@ -45,14 +136,7 @@ export default function CampusMap({ role, issueCount }) {
           attribution='&copy; <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors'
           url="https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png"
         />
-        <Marker position={ARYABHATTA_COORDS}>
-          <Popup>
-            <div style={{ textAlign: 'center' }}>
-                <strong>NIT Agartala</strong><br />
-                Aryabhatta Hostel
-            </div>
-          </Popup>
-        </Marker>
+        <IssueClusters />
       </MapContainer>
     </div>
   );
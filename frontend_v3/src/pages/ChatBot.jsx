@@ -108,7 +108,11 @@ export default function ChatBot() {
       setMessages(prev => [...prev, { role: 'assistant', content: res.data.reply }]);
     } catch (error) {
       console.error("Chat Error:", error); 
-      setMessages(prev => [...prev, { role: 'assistant', content: "⚠️ Brain freeze! My servers are busy. Please try again." }]);
+      const retryAfter = error.response?.status === 429 && error.response.headers?.['retry-after'];
+      const reply = retryAfter
+        ? `⏳ Whoa, slow down! You can ask me again in ${retryAfter}s.`
+        : "⚠️ Brain freeze! My servers are busy. Please try again.";
+      setMessages(prev => [...prev, { role: 'assistant', content: reply }]);
     } finally {
       setIsLoading(false);
     }
@@ -1,5 +1,5 @@
 import React, { useState, useEffect, useCallback } from 'react';
-import api from '../api';
+import api, { uploadImage, resolveImageUrl } from '../api';
 import { useAuth } from '../auth/AuthContext';
 import { Lock, X, Camera, RefreshCw, AlertTriangle, ShieldCheck } from 'lucide-react'; 
 
@@ -14,15 +14,18 @@ export default function Issues() {
   // Local UI State
   const [areaType, setAreaType] = useState('Hostel'); 
   const [commentText, setCommentText] = useState('');
+  const [comments, setComments] = useState([]);
+  const [commentsCursor, setCommentsCursor] = useState(null);
   const [ratingData, setRatingData] = useState({ rating: 5, review: '' });
   const [toast, setToast] = useState(null);
   const [previewImage, setPreviewImage] = useState(null);
+  const [uploading, setUploading] = useState(false);
 
 
   // Form State
   const [form, setForm] = useState({
     title: '', category: 'Power Failure', sub_location: '', specific_location: '', 
-    description: '', priority: 'High', image_data: ''
+    description: '', priority: 'High', image_data: '', image_id: ''
   });
 
 
@@ -128,6 +131,21 @@ useEffect(() => {
   };
 }, [selectedTicket?.id]); // 7. Only re-run if the ID changes
 
+  // 💬 Comments are fetched per ticket (the feed only carries comment_count)
+  const loadComments = useCallback(async (issueId, cursor = null) => {
+    const qs = cursor ? `?cursor=${cursor}` : '';
+    // Skip the GET cache: threads change while the modal is open
+    const res = await api.get(`/issues/${issueId}/comments${qs}`, { headers: { 'X-Background-Refresh': '1' } });
+    setComments(prev => cursor ? [...prev, ...res.data.items] : res.data.items);
+    setCommentsCursor(res.data.next_cursor);
+  }, []);
+
+  useEffect(() => {
+    setComments([]);
+    setCommentsCursor(null);
+    if (selectedTicket?.id) loadComments(selectedTicket.id).catch(() => {});
+  }, [selectedTicket?.id, loadComments]);
+
   const showToast = (type, msg) => {
     setToast({ type, msg });
     setTimeout(() => setToast(null), 3000);
@@ -147,21 +165,26 @@ useEffect(() => {
   };
 
 
-  const handleImage = (e) => {
+  const handleImage = async (e) => {
     const file = e.target.files[0];
-    if(file) {
-      const reader = new FileReader();
-      reader.onloadend = () => {
-        setForm({ ...form, image_data: reader.result });
-        setPreviewImage(reader.result);
-      };
-      reader.readAsDataURL(file);
+    if(!file) return;
+    // Multipart upload: the server resizes it and we only keep the id
+    setPreviewImage(URL.createObjectURL(file));
+    setUploading(true);
+    try {
+      const img = await uploadImage(file);
+      setForm(prev => ({ ...prev, image_data: '', image_id: img.id }));
+    } catch (err) {
+      setPreviewImage(null);
+      showToast('error', err?.response?.data?.detail || "Photo upload failed.");
+    } finally {
+      setUploading(false);
     }
   };
 
 
   const removeImage = () => {
-    setForm({ ...form, image_data: '' });
+    setForm({ ...form, image_data: '', image_id: '' });
     setPreviewImage(null);
   }
 
@@ -170,7 +193,8 @@ useEffect(() => {
     e.preventDefault();
     try {
       if(!form.sub_location) { showToast('error', "Please select a location"); return; }
-      if(!form.image_data) { showToast('error', "Please upload an image evidence."); return; }
+      if(uploading) { showToast('error', "Photo is still uploading..."); return; }
+      if(!form.image_data && !form.image_id) { showToast('error', "Please upload an image evidence."); return; }
 
 
       const finalForm = { ...form, priority: determinePriority(form.category) };
@@ -178,7 +202,7 @@ useEffect(() => {
       await api.post('/issues', finalForm);
       showToast('success', `Ticket Created! Priority: ${finalForm.priority}`);
       
-      setForm({ title: '', category: 'Power Failure', sub_location: '', specific_location: '', description: '', priority: 'High', image_data: '' });
+      setForm({ title: '', category: 'Power Failure', sub_location: '', specific_location: '', description: '', priority: 'High', image_data: '', image_id: '' });
       setPreviewImage(null);
       setActiveTab('track');
       loadIssues();
@@ -190,6 +214,7 @@ useEffect(() => {
     if(!commentText.trim()) return;
     await api.post(`/issues/${selectedTicket.id}/comments`, { text: commentText });
     setCommentText('');
+    loadComments(selectedTicket.id).catch(() => {});
     loadIssues();
   };
 
@@ -463,7 +488,7 @@ useEffect(() => {
             <div style={{ marginBottom: '20px' }}>
   <label className="label-text">Attached Evidence</label>
 
-  {!selectedTicket.image_data ? (
+  {!(selectedTicket.image_data || selectedTicket.image_url) ? (
     // Skeleton while background fetch is happening
     <div
       style={{
@@ -478,7 +503,7 @@ useEffect(() => {
   ) : (
     // Fade-in once image arrives
     <img
-      src={selectedTicket.image_data}
+      src={resolveImageUrl(selectedTicket.image_data || selectedTicket.image_url)}
       alt="Evidence"
       style={{
         width: '100%',
@@ -494,7 +519,8 @@ useEffect(() => {
             <div style={{ marginTop: '20px' }}>
               <h4 style={{ fontSize: '0.9rem', color: '#64748b', marginBottom: '10px' }}>💬 Discussion</h4>
               <div style={{ background: '#f1f5f9', padding: '10px', borderRadius: '12px', maxHeight: '150px', overflowY: 'auto' }}>
-                {selectedTicket.comments?.length > 0 ? selectedTicket.comments.map(c => (<div key={c.id} style={{ marginBottom: '8px', fontSize: '0.85rem' }}><span style={{ fontWeight: '700', color: '#4f46e5' }}>{c.user_name}: </span>{c.text}</div>)) : <span style={{ fontSize: '0.8rem', opacity: 0.6 }}>No comments yet.</span>}
+                {comments.length > 0 ? comments.map(c => (<div key={c.id} style={{ marginBottom: '8px', fontSize: '0.85rem' }}><span style={{ fontWeight: '700', color: '#4f46e5' }}>{c.user_name}: </span>{c.text}</div>)) : <span style={{ fontSize: '0.8rem', opacity: 0.6 }}>{selectedTicket.comment_count > 0 ? 'Loading comments...' : 'No comments yet.'}</span>}
+                {commentsCursor && (<button onClick={() => loadComments(selectedTicket.id, commentsCursor).catch(() => {})} className="btn-ghost" style={{ fontSize: '0.75rem', padding: '4px 10px' }}>Load more comments</button>)}
               </div>
               {selectedTicket.status !== 'Solved' && (<div style={{ display: 'flex', marginTop: '10px', gap: '5px' }}><input className="glass-input" placeholder="Type a comment..." value={commentText} onChange={e => setCommentText(e.target.value)} style={{ marginBottom: 0 }} /><button onClick={handleComment} className="btn-grad" style={{ padding: '0 20px' }}>Send</button></div>)}
             </div>
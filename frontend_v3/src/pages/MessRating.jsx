@@ -1,6 +1,6 @@
 // frontend_v3/src/pages/MessRating.jsx
 import React, { useState, useEffect, useRef, useCallback } from 'react';
-import api from '../api';
+import api, { uploadImage, resolveImageUrl } from '../api';
 import { useAuth } from '../auth/AuthContext';
 import { Star, TrendingUp, Camera, User, Lock, Clock, AlertCircle, CheckCircle, RefreshCw } from 'lucide-react';
 
@@ -30,6 +30,7 @@ export default function MessRating() {
   const [analytics, setAnalytics] = useState(null);
   const [selectedMess, setSelectedMess] = useState('1st Year Mess');
   const [preview, setPreview] = useState(null);
+  const [uploading, setUploading] = useState(false);
 
   // UI state
   const [showPopup, setShowPopup] = useState({ open: false, type: '', msg: '' });
@@ -56,7 +57,8 @@ export default function MessRating() {
     quality: 0,
     review: '',
     suggestions: '',
-    image_data: ''
+    image_data: '',
+    image_id: ''
   });
 
   const MESSES = ["1st Year Mess", "Veg Mess", "Eastern Mess", "Northern Mess", "Southern Mess"];
@@ -229,20 +231,30 @@ export default function MessRating() {
 }, [activeTab, selectedMess, user.role]);
 
   // ---------- image upload handlers ----------
-  const handleImage = (e) => {
+  const handleImage = async (e) => {
     const file = e.target.files?.[0];
     if (!file) return;
-    const reader = new FileReader();
-    reader.onloadend = () => {
-      setForm(prev => ({ ...prev, image_data: reader.result }));
-      setPreview(reader.result);
-    };
-    reader.readAsDataURL(file);
+    // Multipart upload: the server resizes it and we only keep the id
+    setPreview(URL.createObjectURL(file));
+    setUploading(true);
+    try {
+      const img = await uploadImage(file);
+      setForm(prev => ({ ...prev, image_data: '', image_id: img.id }));
+    } catch (err) {
+      setPreview(null);
+      setShowPopup({ open: true, type: 'error', msg: err?.response?.data?.detail || 'Photo upload failed' });
+    } finally {
+      setUploading(false);
+    }
   };
 
   // ---------- submit ----------
   const handleSubmit = async (e) => {
     e.preventDefault();
+    if (uploading) {
+      setShowPopup({ open: true, type: 'error', msg: "Photo is still uploading..." });
+      return;
+    }
     if (form.hygiene === 0 || form.taste === 0 || form.quality === 0) {
       setShowPopup({ open: true, type: 'error', msg: "Please rate all categories." });
       return;
@@ -252,7 +264,7 @@ export default function MessRating() {
       localStorage.setItem('lastMessSubmission', Date.now().toString());
       setIsLocked(true);
       setShowPopup({ open: true, type: 'success', msg: "Feedback submitted — locked until next week." });
-      setForm({ mess_name: '', hygiene: 0, taste: 0, quality: 0, review: '', suggestions: '', image_data: '' });
+      setForm({ mess_name: '', hygiene: 0, taste: 0, quality: 0, review: '', suggestions: '', image_data: '', image_id: '' });
       setPreview(null);
       // refresh analytics in background (force)
       loadAnalytics({ force: true, hadAny: !!analytics });
@@ -481,7 +493,7 @@ export default function MessRating() {
                     </div>
                     {r.review && <div className="review-text">"{r.review}"</div>}
                     {r.suggestion && <div className="suggestion-text">💡 {r.suggestion}</div>}
-                    {r.image && <ProgressiveImg key={r.image} src={r.image} alt="Proof" />}
+                    {r.image && <ProgressiveImg key={r.image} src={resolveImageUrl(r.image)} alt="Proof" />}
                   </div>
                 )) : (
                   <div className="empty-state">No detailed reviews yet.</div>
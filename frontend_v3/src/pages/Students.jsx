@@ -6,6 +6,8 @@ export default function Students() {
   const [students, setStudents] = useState([]);
   const [loading, setLoading] = useState(true);
   const [searchTerm, setSearchTerm] = useState("");
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [toast, setToast] = useState(null);
 
   // 🔒 Reset scroll position on mount
@@ -34,29 +36,60 @@ export default function Students() {
     };
   }, []);
 
-  // 1️⃣ Pure Fetch Function (Manual Refresh)
+  // Only the columns this page renders (no profile pics / secrets)
+  const DIRECTORY_FIELDS = 'id,full_name,email,credit_score,enrollment_no,hostel,room_no,requested_hostel';
+
+  const fetchPage = useCallback(async (term, cursor) => {
+    const params = new URLSearchParams({ fields: DIRECTORY_FIELDS, limit: '100' });
+    if (term) params.set('q', term);
+    if (cursor) params.set('cursor', String(cursor));
+    // Query string in the URL (not axios params) so api.js caches each page separately
+    const res = await api.get(`/users/directory?${params.toString()}`);
+    return res.data;
+  }, []);
+
+  // 1️⃣ Pure Fetch Function (Manual Refresh / New Search)
   const loadStudents = useCallback(async () => {
     setLoading(true);
     try {
-      const res = await api.get('/users/all');
-      setStudents(res.data);
+      const page = await fetchPage(searchTerm.trim(), null);
+      setStudents(page.items);
+      setNextCursor(page.next_cursor);
     } catch (err) {
       console.error("Database Fetch Error:", err);
       showToast('error', "Failed to connect to database");
     } finally {
       setLoading(false);
     }
-  }, [showToast]);
+  }, [fetchPage, searchTerm, showToast]);
+
+  const loadMore = useCallback(async () => {
+    if (!nextCursor || loadingMore) return;
+    setLoadingMore(true);
+    try {
+      const page = await fetchPage(searchTerm.trim(), nextCursor);
+      setStudents(prev => [...prev, ...page.items]);
+      setNextCursor(page.next_cursor);
+    } catch (err) {
+      console.error("Database Fetch Error:", err);
+      showToast('error', "Failed to load more students");
+    } finally {
+      setLoadingMore(false);
+    }
+  }, [fetchPage, nextCursor, loadingMore, searchTerm, showToast]);
 
-  // 2️⃣ Unmount-Safe Initial Load
+  // 2️⃣ Unmount-Safe Load (debounced server-side prefix search)
   useEffect(() => {
     let isMounted = true;
 
     const run = async () => {
       setLoading(true);
       try {
-        const res = await api.get('/users/all');
-        if (isMounted) setStudents(res.data);
+        const page = await fetchPage(searchTerm.trim(), null);
+        if (isMounted) {
+          setStudents(page.items);
+          setNextCursor(page.next_cursor);
+        }
       } catch (err) {
         if (isMounted) {
           console.error("Database Fetch Error:", err);
@@ -67,9 +100,9 @@ export default function Students() {
       }
     };
 
-    run();
-    return () => { isMounted = false; };
-  }, [showToast]);
+    const timer = setTimeout(run, searchTerm ? 300 : 0);
+    return () => { isMounted = false; clearTimeout(timer); };
+  }, [fetchPage, searchTerm, showToast]);
 
   // 🔍 Safe, Case-Insensitive Search
   const filteredStudents = useMemo(() => {
@@ -263,6 +296,20 @@ export default function Students() {
                     </div>
                   ))}
                 </div>
+
+                {/* ⬇️ Next page (keyset cursor) */}
+                {nextCursor && (
+                  <div style={{ textAlign: 'center', marginTop: '15px' }}>
+                    <button
+                      onClick={loadMore}
+                      className="btn-action"
+                      style={{ background: '#e0e7ff', color: '#4338ca', margin: '0 auto', opacity: loadingMore ? 0.7 : 1 }}
+                      disabled={loadingMore}
+                    >
+                      {loadingMore ? <RefreshCw size={16} className="spin" /> : null} Load more
+                    </button>
+                  </div>
+                )}
               </>
             )}
           </>